@@ -0,0 +1,110 @@
+# Gemini context caching for DOC_QA contexts reused across turns.
+#
+# Follow-up questions in a conversation often retrieve the same chunks, so
+# the same system instruction + Context Snippets prefix is billed in full on
+# every turn. With GEMINI_CONTEXT_CACHE=1, a context seen a second time within
+# GEMINI_CONTEXT_CACHE_TTL is uploaded once as a CachedContent; later turns
+# send only the recent chat and the question, and the cached tokens are billed
+# at the reduced cached-input rate. One-off contexts are never uploaded (cache
+# storage is billed per hour), nor are ones under the API's minimum size.
+
+import os
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from ..state.caches import StatsCache
+from .context_packer import estimate_tokens
+from . import gemini
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "0").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "600"))              # seconds
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024"))  # API minimum
+
+log = logging.getLogger(__name__)
+
+# fingerprint -> True once a context has been used (uncached) one time
+_seen = StatsCache("gemini_contexts_seen", maxsize=4096, ttl=CONTEXT_CACHE_TTL)
+# fingerprint -> GenerativeModel bound to the CachedContent, or False when creating
+# it failed. Expires a little before the server-side cache does.
+_models = StatsCache("gemini_contexts", maxsize=256, ttl=max(1, CONTEXT_CACHE_TTL - 30))
+# fingerprint -> creation in progress; concurrent requests for the same context
+# wait on it, requests for other contexts don't wait at all
+_creating: Dict[str, "asyncio.Future"] = {}
+
+def _fingerprint(model_name: str, system_instruction: str, namespace: str, context: str) -> str:
+    h = hashlib.sha256()
+    for part in (model_name, system_instruction, namespace, context):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+async def cached_model(
+    namespace: str,
+    context: str,
+    model_name: str,
+    system_instruction: str,
+    generation_config: Dict[str, Any],
+) -> Optional["genai.GenerativeModel"]:
+    """
+    A model serving `context` from a Gemini context cache, or None when the
+    prompt should be sent whole (caching off, context too small, first use,
+    or the cache couldn't be created).
+    """
+    if not CONTEXT_CACHE or estimate_tokens(context) < CONTEXT_CACHE_MIN_TOKENS:
+        return None
+    key = _fingerprint(model_name, system_instruction, namespace, context)
+    model = _models.lookup(key)
+    if model is not None:
+        return model or None
+    if _seen.lookup(key) is None:
+        _seen.store(key, True)
+        return None
+    pending = _creating.get(key)
+    if pending is not None:
+        # shielded: a waiter going away must not cancel the creation it shares
+        return (await asyncio.shield(pending)) or None
+    pending = _creating[key] = asyncio.get_running_loop().create_future()
+    model = None  # stays None if this request is cancelled: waiters send the whole prompt
+    try:
+        model = await _create(key, namespace, context, model_name, system_instruction, generation_config)
+    finally:
+        del _creating[key]
+        pending.set_result(model)
+    return model or None
+
+async def _create(
+    key: str,
+    namespace: str,
+    context: str,
+    model_name: str,
+    system_instruction: str,
+    generation_config: Dict[str, Any],
+):
+    """
+    Upload the context as a CachedContent; the bound model, or False on failure.
+    """
+    try:
+        genai = gemini.sdk()
+        cached = await asyncio.to_thread(
+            genai.caching.CachedContent.create,
+            model=model_name,
+            display_name=f"docqa-{namespace}"[:128],
+            system_instruction=system_instruction,
+            contents=[context],
+            ttl=timedelta(seconds=CONTEXT_CACHE_TTL),
+        )
+        model = genai.GenerativeModel.from_cached_content(cached, generation_config=generation_config)
+    except Exception as e:
+        log.warning("Gemini context cache not created for namespace %s: %s", namespace, e)
+        model = False
+    _models.store(key, model)
+    return model
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": CONTEXT_CACHE, "seen": _seen.stats(), "cached": _models.stats()}
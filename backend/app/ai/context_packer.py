@@ -0,0 +1,150 @@
+# Context packing for DOC_QA prompts.
+#
+# Retrieved chunks overlap (consecutive windows share 80 words) and often come
+# in runs from the same part of a file, so pasting them one by one sends the
+# same text to Gemini several times. The packer
+#   1. merges chunks of the same file whose char offsets overlap or touch into
+#      one span (page..page_end of the union), scored by its best chunk,
+#   2. drops sentences already present in a higher-ranked span,
+#   3. adds spans in score order until CONTEXT_TOKEN_BUDGET is used up; the
+#      span that doesn't fit is cut at a sentence boundary.
+# Older points without offsets are packed as-is (still deduplicated).
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CHARS_PER_TOKEN = 4.0       # Gemini tokenizer average on English prose
+MIN_SPAN_TOKENS = 48        # don't add a truncated tail shorter than this
+MIN_DEDUPE_CHARS = 24       # short sentences ("Yes.", "Table 1.") are never dropped
+
+_sentence_end = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token estimate without a count_tokens round trip.
+    """
+    return int(len(text) / CHARS_PER_TOKEN + 0.999)
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _sentence_end.split(text) if s]
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+class _Span:
+    __slots__ = ("key", "filename", "page", "page_end", "start", "end", "text", "score")
+
+    def __init__(self, pl: Dict[str, Any], score: float):
+        self.key = (pl.get("namespace"), pl.get("filename"))
+        self.filename = pl.get("filename")
+        self.page = pl.get("page")
+        self.page_end = pl.get("page_end") or self.page
+        self.start = pl.get("char_start")
+        self.end = pl.get("char_end")
+        self.text = pl.get("text", "") or ""
+        self.score = score
+
+    def absorb(self, other: "_Span"):
+        """
+        Extend with a later span of the same file (other.start <= end + 1).
+        Offsets index the file's normalized text, where words are single-space separated.
+        """
+        if other.end > self.end:
+            if other.start < self.end:
+                self.text += other.text[self.end - other.start:]
+            else:
+                self.text += " " * (other.start - self.end) + other.text
+            self.end = other.end
+        pages = [p for p in (self.page, other.page) if p is not None]
+        ends = [p for p in (self.page_end, other.page_end) if p is not None]
+        self.page = min(pages) if pages else None
+        self.page_end = max(ends) if ends else None
+        self.score = max(self.score, other.score)
+
+def merge_spans(fused: List[Tuple[Dict[str, Any], float]]) -> List[_Span]:
+    """
+    Merged spans in descending score order.
+    """
+    spans: List[_Span] = []
+    by_file: Dict[Any, List[_Span]] = {}
+    for pl, score in fused:
+        span = _Span(pl, score)
+        if span.start is None or span.end is None:
+            spans.append(span)
+        else:
+            by_file.setdefault(span.key, []).append(span)
+    for group in by_file.values():
+        group.sort(key=lambda s: s.start)
+        current = group[0]
+        for span in group[1:]:
+            if span.start <= current.end + 1:
+                current.absorb(span)
+            else:
+                spans.append(current)
+                current = span
+        spans.append(current)
+    spans.sort(key=lambda s: s.score, reverse=True)
+    return spans
+
+def _page_label(span: _Span) -> Optional[Any]:
+    if span.page is None or span.page_end in (None, span.page):
+        return span.page
+    return f"{span.page}-{span.page_end}"
+
+def pack_contexts(
+    fused: List[Tuple[Dict[str, Any], float]],
+    budget: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Prompt contexts ({"text", "filename", "page"}) from fused (payload, score)
+    results, within `budget` estimated tokens of snippet text (CONTEXT_TOKEN_BUDGET).
+    'page' is a number, or "first-last" for spans crossing pages.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    seen = set()
+    used = 0
+    contexts: List[Dict[str, Any]] = []
+    for span in merge_spans(fused):
+        kept: List[str] = []
+        for sentence in split_sentences(span.text):
+            key = _sentence_key(sentence)
+            if len(key) >= MIN_DEDUPE_CHARS:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(sentence)
+        if not kept:
+            continue
+        text = " ".join(kept)
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            room = budget - used
+            if room < MIN_SPAN_TOKENS:
+                break
+            text = _truncate(kept, room)
+            if not text:
+                break
+            cost = estimate_tokens(text)
+        contexts.append({"text": text, "filename": span.filename, "page": _page_label(span)})
+        used += cost
+        if used >= budget:
+            break
+    return contexts
+
+def _truncate(sentences: List[str], tokens: int) -> str:
+    """
+    Leading sentences that fit in `tokens`; a single overlong first sentence is cut at a word.
+    """
+    limit = int(tokens * CHARS_PER_TOKEN)
+    out: List[str] = []
+    size = -1
+    for sentence in sentences:
+        if size + 1 + len(sentence) > limit:
+            break
+        out.append(sentence)
+        size += 1 + len(sentence)
+    if not out:
+        return sentences[0][:limit].rsplit(" ", 1)[0]
+    return " ".join(out)
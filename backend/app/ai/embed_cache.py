@@ -0,0 +1,86 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .embeddings import EMBED_SPACE, embed_texts, _ensure_text
+from ..services.paths import DATA_ROOT
+from ..services.telemetry import count_lookup
+
+# One cache shared by every namespace and worker: identical chunk text embeds once.
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(DATA_ROOT, "embeddings.sqlite"))
+
+_local = threading.local()
+
+def _conn() -> sqlite3.Connection:
+    """
+    One SQLite connection per thread; WAL lets several workers read and write.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)"
+        )
+        _local.conn = conn
+    return conn
+
+def cache_key(text: str, model: str = EMBED_SPACE) -> str:
+    """
+    Content address of an embedding: sha256 of model name (and dimensionality,
+    when truncated) + cleaned text.
+    """
+    return hashlib.sha256(f"{model}\0{_ensure_text(text)}".encode("utf-8")).hexdigest()
+
+def get_many(keys: List[str]) -> Dict[str, List[float]]:
+    found: Dict[str, List[float]] = {}
+    conn = _conn()
+    for i in range(0, len(keys), 500):  # stay under SQLite's variable limit
+        part = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+        ).fetchall()
+        for key, blob in rows:
+            found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+    return found
+
+def put_many(items: Dict[str, List[float]]):
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)",
+            [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()],
+        )
+
+def embed_texts_cached(texts: List[str], stats: Optional[dict] = None) -> List[List[float]]:
+    """
+    Same contract as embed_texts, but only texts never seen before are sent
+    to Gemini. Optional `stats` dict gets 'embeddings_cached' / 'embeddings_computed'
+    counters added to it.
+    """
+    keys = [cache_key(t) for t in texts]
+    found = get_many(list(set(keys)))
+
+    # Embed each missing text once, even if it repeats inside the batch
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, text)
+    if missing:
+        vectors = embed_texts(list(missing.values()))
+        fresh = dict(zip(missing.keys(), vectors))
+        put_many(fresh)
+        found.update(fresh)
+
+    count_lookup("embeddings", True, len(texts) - len(missing))
+    count_lookup("embeddings", False, len(missing))
+    if stats is not None:
+        stats["embeddings_cached"] = stats.get("embeddings_cached", 0) + len(texts) - len(missing)
+        stats["embeddings_computed"] = stats.get("embeddings_computed", 0) + len(missing)
+    return [found[k] for k in keys]
@@ -1,38 +1,45 @@
 import os
-import google.generativeai as genai
-from tenacity import retry, wait_exponential, stop_after_attempt
+from tenacity import retry, retry_if_not_exception_type, wait_exponential, stop_after_attempt
+from ..services.telemetry import EMBED_BATCH_SIZE, count_retry
+from . import fake_backends, gemini
 
-# 1) Read API key from env and configure the SDK once.
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+# 1) The SDK is imported and configured with the API key on the first call (gemini.py).
 
 # 2) Choose the embeddings model (Gemini's current recommended one).
 EMBED_MODEL = "text-embedding-004"
 
+# "gemini", or "fake" for offline runs (see fake_backends.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "gemini")
+
+# Same setting as db/qdrant_client.EMBED_DIM: below the model's native 768,
+# the API returns the truncated (leading) dimensions of the embedding.
+NATIVE_EMBED_DIM = 768
+EMBED_DIM = int(os.getenv("EMBED_DIM", str(NATIVE_EMBED_DIM)))
+_OUTPUT_DIM = EMBED_DIM if EMBED_DIM < NATIVE_EMBED_DIM else None
+
+# Identifies the vectors this process produces, for cache keys
+if EMBED_BACKEND == "fake":
+    EMBED_SPACE = f"fake@{EMBED_DIM}"  # never mixed with real embeddings in the cache
+else:
+    EMBED_SPACE = EMBED_MODEL if _OUTPUT_DIM is None else f"{EMBED_MODEL}@{EMBED_DIM}"
+
+# Task types: chunks are embedded as documents, user questions as queries
+DOCUMENT_TASK = "retrieval_document"
+QUERY_TASK = "retrieval_query"
+
 def _ensure_text(x: str) -> str:
     """
     Small guard: make sure inputs are strings and trimmed.
     """
     return (x or "").strip()
 
-@retry(wait=wait_exponential(min=1, max=10), stop=stop_after_attempt(5))
-def embed_texts(texts: list[str]) -> list[list[float]]:
+def _to_vectors(resp) -> list[list[float]]:
     """
-    Create embeddings for a list of strings.
-    - We retry on transient errors (network, rate limit) using tenacity.
-    - Returns a list of 768-dim vectors (one per input).
+    Normalize the SDK response to a list of vectors.
     """
-    clean = [_ensure_text(t) for t in texts]
-    # The Gemini SDK supports batch embedding via embed_content with list inputs.
-    resp = genai.embed_content(
-        model=EMBED_MODEL,
-        content=clean,
-        task_type="retrieval_document"  # hint to the model about use-case
-    )
     # SDK returns dict with 'embedding' or list under 'embeddings'
-    # Normalize to a list of vectors.
     # Newer SDKs: resp['embedding'] when single, resp['embeddings'] when batch.
-# The response has an 'embedding' attribute containing the vectors
-# For batch requests, it's a list of dicts with 'values'
+    # For batch requests, it's a list of dicts with 'values'
     if hasattr(resp, 'embedding'):
         # Single embedding
         return [resp['embedding']]
@@ -44,4 +51,47 @@ def embed_texts(texts: list[str]) -> list[list[float]]:
         embeddings = resp.get('embedding') or resp.get('embeddings', [])
         if isinstance(embeddings, list):
             return [e['values'] if isinstance(e, dict) else e for e in embeddings]
-        return [embeddings]
\ No newline at end of file
+        return [embeddings]
+
+@retry(wait=wait_exponential(min=1, max=10), stop=stop_after_attempt(5),
+       retry=retry_if_not_exception_type(gemini.MissingApiKey),
+       before_sleep=count_retry("embed_texts"))
+def embed_texts(texts: list[str], task_type: str = DOCUMENT_TASK) -> list[list[float]]:
+    """
+    Create embeddings for a list of strings.
+    - We retry on transient errors (network, rate limit) using tenacity.
+    - task_type: DOCUMENT_TASK for indexed chunks, QUERY_TASK for questions.
+    - Returns a list of EMBED_DIM-dim vectors (one per input).
+    """
+    clean = [_ensure_text(t) for t in texts]
+    EMBED_BATCH_SIZE.labels(task_type).observe(len(clean))
+    if EMBED_BACKEND == "fake":
+        return fake_backends.embed(clean, EMBED_DIM)
+    # The Gemini SDK supports batch embedding via embed_content with list inputs.
+    resp = gemini.sdk().embed_content(
+        model=EMBED_MODEL,
+        content=clean,
+        task_type=task_type,  # hint to the model about use-case
+        output_dimensionality=_OUTPUT_DIM,
+    )
+    return _to_vectors(resp)
+
+@retry(wait=wait_exponential(min=1, max=10), stop=stop_after_attempt(5),
+       retry=retry_if_not_exception_type(gemini.MissingApiKey),
+       before_sleep=count_retry("aembed_texts"))
+async def aembed_texts(texts: list[str], task_type: str = DOCUMENT_TASK) -> list[list[float]]:
+    """
+    Async twin of embed_texts for the request path: awaits the Gemini call
+    instead of blocking a threadpool worker.
+    """
+    clean = [_ensure_text(t) for t in texts]
+    EMBED_BATCH_SIZE.labels(task_type).observe(len(clean))
+    if EMBED_BACKEND == "fake":
+        return await fake_backends.aembed(clean, EMBED_DIM)
+    resp = await gemini.sdk().embed_content_async(
+        model=EMBED_MODEL,
+        content=clean,
+        task_type=task_type,
+        output_dimensionality=_OUTPUT_DIM,
+    )
+    return _to_vectors(resp)
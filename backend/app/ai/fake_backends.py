@@ -0,0 +1,63 @@
+# Offline stand-ins for Gemini, for benchmarks and local runs without API keys.
+#
+#   EMBED_BACKEND=fake       deterministic embeddings: a feature-hashed bag of
+#                            words (crc32 of each word picks a dimension and a
+#                            sign), so texts sharing words get similar vectors
+#                            and dense search ranks sensibly
+#   GENERATION_BACKEND=fake  a canned answer citing the contexts, after
+#                            FAKE_GENERATION_LATENCY_MS (streamed: the first
+#                            token after a quarter of it)
+# Neither touches the network; FAKE_EMBED_LATENCY_MS adds a per-call delay to
+# embeddings to mimic the round trip.
+
+import os
+import time
+import asyncio
+import zlib
+from typing import AsyncIterator, Dict, List
+
+import numpy as np
+
+FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "0"))
+FAKE_GENERATION_LATENCY_MS = float(os.getenv("FAKE_GENERATION_LATENCY_MS", "800"))
+
+def _vector(text: str, dim: int) -> List[float]:
+    words = text.lower().split()
+    vec = np.zeros(dim, dtype=np.float32)
+    if words:
+        h = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+        np.add.at(vec, (h % dim).astype(np.intp), np.where((h >> 31) & 1, 1.0, -1.0).astype(np.float32))
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        vec[zlib.crc32(text.encode("utf-8")) % dim] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+def embed(texts: List[str], dim: int) -> List[List[float]]:
+    if FAKE_EMBED_LATENCY_MS:
+        time.sleep(FAKE_EMBED_LATENCY_MS / 1000)
+    return [_vector(t, dim) for t in texts]
+
+async def aembed(texts: List[str], dim: int) -> List[List[float]]:
+    if FAKE_EMBED_LATENCY_MS:
+        await asyncio.sleep(FAKE_EMBED_LATENCY_MS / 1000)
+    return [_vector(t, dim) for t in texts]
+
+def answer(user_text: str, contexts: List[Dict[str, str]] = ()) -> str:
+    cites = "\n".join(
+        f"- {c.get('filename', 'unknown')}" + (f" (page {c['page']})" if c.get("page") else "")
+        for c in contexts
+    )
+    return f"Answer:\n(offline answer to: {user_text})\n\nCitations:\n{cites or '- (none)'}"
+
+async def agenerate(user_text: str, contexts: List[Dict[str, str]] = ()) -> str:
+    await asyncio.sleep(FAKE_GENERATION_LATENCY_MS / 1000)
+    return answer(user_text, contexts)
+
+async def astream(user_text: str, contexts: List[Dict[str, str]] = ()) -> AsyncIterator[str]:
+    pieces = answer(user_text, contexts).split(" ")
+    await asyncio.sleep(FAKE_GENERATION_LATENCY_MS / 4000)
+    step = FAKE_GENERATION_LATENCY_MS * 0.75 / 1000 / max(1, len(pieces))
+    for i, piece in enumerate(pieces):
+        yield piece if i == 0 else " " + piece
+        await asyncio.sleep(step)
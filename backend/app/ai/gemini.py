@@ -0,0 +1,27 @@
+# The Gemini SDK, imported and configured on first use.
+#
+# google.generativeai takes most of a second to import, so nothing imports it
+# at module level: sdk() does on the first embedding or generation call, and
+# configures the API key once. A missing key is reported there, by the call
+# that needs it, instead of stopping the whole app from importing.
+
+import os
+from functools import lru_cache
+from types import ModuleType
+
+from ..services.lazy import import_module
+
+class MissingApiKey(RuntimeError):
+    pass
+
+@lru_cache(maxsize=None)
+def sdk() -> ModuleType:
+    """
+    The configured google.generativeai module.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise MissingApiKey("Missing Gemini API key.")
+    genai = import_module("google.generativeai")
+    genai.configure(api_key=api_key)
+    return genai
@@ -1,29 +1,126 @@
 import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
-from .prompts import build_small_talk_prompt, build_doc_qa_prompt
+from .prompts import (
+    SMALL_TALK_SYSTEM, DOC_QA_SYSTEM,
+    build_small_talk_prompt, build_doc_qa_prompt, build_doc_qa_context, build_doc_qa_question,
+)
+from . import context_cache, fake_backends, gemini
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise RuntimeError("Missing Gemini API key.")
-genai.configure(api_key=api_key)
+
+# "gemini", or "fake" for offline runs (see fake_backends.py)
+GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "gemini")
+FAKE = GENERATION_BACKEND == "fake"
+
+# The SDK is imported and configured with the API key on the first call
+# (gemini.py); a missing key fails that call, not the app's import.
 
 # Choose a fast, capable model. You can swap to 1.5 Pro if you prefer.
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
+def _generation_config() -> dict:
+    """
+    Generation settings from the environment; unset ones keep the model defaults.
+    (On 2.5 models max_output_tokens also covers thinking tokens.)
+    """
+    config = {}
+    for key, env, cast in (
+        ("temperature", "GEMINI_TEMPERATURE", float),
+        ("top_p", "GEMINI_TOP_P", float),
+        ("top_k", "GEMINI_TOP_K", int),
+        ("max_output_tokens", "GEMINI_MAX_OUTPUT_TOKENS", int),
+    ):
+        value = os.getenv(env)
+        if value:
+            config[key] = cast(value)
+    return config
+
+GENERATION_CONFIG = _generation_config()
+
+@lru_cache(maxsize=None)
+def _model(system_instruction: str) -> "genai.GenerativeModel":
+    """
+    One long-lived model per system instruction, shared by all requests:
+    the instruction travels as system_instruction instead of in every prompt.
+    """
+    return gemini.sdk().GenerativeModel(
+        MODEL_NAME, system_instruction=system_instruction, generation_config=GENERATION_CONFIG
+    )
+
+async def _doc_qa_call(history, user_text, contexts, namespace: Optional[str]):
+    """
+    (model, prompt) for a grounded answer. A context reused across turns comes
+    from a Gemini context cache (GEMINI_CONTEXT_CACHE), and then only the recent
+    chat and question are sent.
+    """
+    if namespace is not None:
+        context = build_doc_qa_context(contexts)
+        model = await context_cache.cached_model(
+            namespace, context, MODEL_NAME, DOC_QA_SYSTEM, GENERATION_CONFIG
+        )
+        if model is not None:
+            return model, build_doc_qa_question(history, user_text)
+    return _model(DOC_QA_SYSTEM), build_doc_qa_prompt(history, user_text, contexts)
+
 def generate_small_talk(history, user_text) -> str:
     """
     Returns a short natural reply for greetings / chit-chat.
     """
+    if FAKE:
+        return fake_backends.answer(user_text)
     prompt = build_small_talk_prompt(history, user_text)
-    resp = genai.GenerativeModel(MODEL_NAME).generate_content(prompt)
+    resp = _model(SMALL_TALK_SYSTEM).generate_content(prompt)
     return (resp.text or "").strip()
 
 def generate_doc_answer(history, user_text, contexts) -> str:
     """
     Returns a grounded answer with a 'Citations' section.
     """
+    if FAKE:
+        return fake_backends.answer(user_text, contexts)
     prompt = build_doc_qa_prompt(history, user_text, contexts)
-    resp = genai.GenerativeModel(MODEL_NAME).generate_content(prompt)
+    resp = _model(DOC_QA_SYSTEM).generate_content(prompt)
     return (resp.text or "").strip()
+
+async def agenerate_small_talk(history, user_text) -> str:
+    """
+    Async twin of generate_small_talk (does not block the event loop).
+    """
+    if FAKE:
+        return await fake_backends.agenerate(user_text)
+    prompt = build_small_talk_prompt(history, user_text)
+    resp = await _model(SMALL_TALK_SYSTEM).generate_content_async(prompt)
+    return (resp.text or "").strip()
+
+async def agenerate_doc_answer(history, user_text, contexts, namespace: Optional[str] = None) -> str:
+    """
+    Async twin of generate_doc_answer; pass the namespace to allow context caching.
+    """
+    if FAKE:
+        return await fake_backends.agenerate(user_text, contexts)
+    model, prompt = await _doc_qa_call(history, user_text, contexts, namespace)
+    resp = await model.generate_content_async(prompt)
+    return (resp.text or "").strip()
+
+async def astream_doc_answer(history, user_text, contexts, namespace: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Streams the grounded answer as Gemini produces it (text pieces, in order).
+    """
+    if FAKE:
+        async for piece in fake_backends.astream(user_text, contexts):
+            yield piece
+        return
+    model, prompt = await _doc_qa_call(history, user_text, contexts, namespace)
+    resp = await model.generate_content_async(prompt, stream=True)
+    async for chunk in resp:
+        try:
+            piece = chunk.text
+        except ValueError:  # chunk without text parts (e.g. safety/finish metadata)
+            continue
+        if piece:
+            yield piece
@@ -1,58 +1,71 @@
 from typing import List, Dict
 
-def build_small_talk_prompt(history: List[tuple], user_text: str) -> str:
-    """
-    Keep it friendly, concise, and avoid hallucinations.
-    """
+# Sent once per model as its system instruction (ai/generator.py), not
+# repeated in every prompt.
+SMALL_TALK_SYSTEM = "Reply naturally and briefly. Keep it friendly, concise, and avoid hallucinations."
+
+DOC_QA_SYSTEM = (
+    "You are a helpful assistant. Use ONLY the provided Context Snippets to answer the user."
+    " If the answer is not clearly contained in the snippets, say: \"I don't know.\""
+    " Always include a 'Citations' section listing the sources you used."
+    " Citations should be in the form: [filename (and page if available)].\n"
+    "Format your response as:\n"
+    "Answer:\n"
+    "<your concise grounded answer>\n\n"
+    "Citations:\n"
+    "- <filename (page X)>\n"
+    "- <filename>\n"
+)
+
+def _history_lines(history: List[tuple], header: str) -> List[str]:
     msgs = []
     if history:
-        msgs.append("Recent chat:")
+        msgs.append(header)
         for role, text in history[-4:]:
             who = "User" if role == "user" else "Assistant"
             msgs.append(f"{who}: {text}")
         msgs.append("---")
-    msgs.append("Instruction: Reply naturally and briefly.")
+    return msgs
+
+def build_small_talk_prompt(history: List[tuple], user_text: str) -> str:
+    """
+    Recent chat + the user's message (instructions: SMALL_TALK_SYSTEM).
+    """
+    msgs = _history_lines(history, "Recent chat:")
     msgs.append(f"User: {user_text}")
     return "\n".join(msgs)
 
-def build_doc_qa_prompt(
-    history: List[tuple],
-    user_text: str,
-    contexts: List[Dict[str, str]]
-) -> str:
+def build_doc_qa_context(contexts: List[Dict[str, str]]) -> str:
     """
-    Grounded answering template.
+    The Context Snippets block. It is the prompt's prefix, so a context reused
+    across turns can be served from a Gemini context cache.
     - contexts: list of dicts with keys: text, filename, page (optional)
+      (sized by ai/context_packer, so snippets are used whole)
     """
-    msgs = []
-    if history:
-        msgs.append("Recent chat (for context only; do NOT cite these):")
-        for role, text in history[-4:]:
-            who = "User" if role == "user" else "Assistant"
-            msgs.append(f"{who}: {text}")
-        msgs.append("---")
-
-    msgs.append(
-        "You are a helpful assistant. Use ONLY the provided Context Snippets to answer the user."
-        " If the answer is not clearly contained in the snippets, say: \"I don't know.\""
-        " Always include a 'Citations' section listing the sources you used."
-        " Citations should be in the form: [filename (and page if available)]."
-    )
-    msgs.append(f"User question: {user_text}\n")
-    msgs.append("Context Snippets:")
+    msgs = ["Context Snippets:"]
     for i, c in enumerate(contexts, 1):
         fn = c.get("filename", "unknown")
         pg = c.get("page")
         head = f"[{i}] {fn}" + (f" (page {pg})" if pg else "")
         msgs.append(head)
-        msgs.append(c.get("text", "")[:1200])  # limit each snippet length
+        msgs.append(c.get("text", ""))
         msgs.append("---")
-    msgs.append(
-        "Format your response as:\n"
-        "Answer:\n"
-        "<your concise grounded answer>\n\n"
-        "Citations:\n"
-        "- <filename (page X)>\n"
-        "- <filename>\n"
-    )
     return "\n".join(msgs)
+
+def build_doc_qa_question(history: List[tuple], user_text: str) -> str:
+    """
+    What follows the context: recent chat and the question.
+    """
+    msgs = _history_lines(history, "Recent chat (for context only; do NOT cite these):")
+    msgs.append(f"User question: {user_text}")
+    return "\n".join(msgs)
+
+def build_doc_qa_prompt(
+    history: List[tuple],
+    user_text: str,
+    contexts: List[Dict[str, str]]
+) -> str:
+    """
+    Grounded answering prompt (instructions: DOC_QA_SYSTEM).
+    """
+    return build_doc_qa_context(contexts) + "\n" + build_doc_qa_question(history, user_text)
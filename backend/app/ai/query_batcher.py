@@ -0,0 +1,125 @@
+# Cross-request micro-batching of query embeddings.
+#
+# Each /ask or /search needs exactly one query vector. Sent one by one, a busy
+# worker makes hundreds of single-item Gemini calls per second and runs into
+# rate limits. Instead, concurrent callers park their query here; the first one
+# opens a short window (QUERY_EMBED_WAIT_MS), and everything that arrives in it,
+# up to QUERY_EMBED_BATCH texts, goes out as one batched embed_content call.
+# Each caller then gets its own vector back (or the batch's error).
+
+import os
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from .embeddings import aembed_texts, _ensure_text, QUERY_TASK, EMBED_SPACE
+from ..state import caches
+from ..services.telemetry import span
+
+EMBED_API_BATCH = 100  # texts per embed_content call allowed by the API
+QUERY_EMBED_BATCH = max(1, min(EMBED_API_BATCH, int(os.getenv("QUERY_EMBED_BATCH", "32"))))
+QUERY_EMBED_WAIT_MS = float(os.getenv("QUERY_EMBED_WAIT_MS", "5"))
+
+class QueryEmbedBatcher:
+    def __init__(self, max_batch: int = QUERY_EMBED_BATCH, wait_ms: float = QUERY_EMBED_WAIT_MS):
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000.0
+        self._pending: Dict[str, List[asyncio.Future]] = {}  # text -> callers waiting for it
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sending: Set[asyncio.Task] = set()  # keep in-flight batches referenced
+        self.batches = 0
+        self.queries = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures are bound to a loop; start fresh if we're on a new one (tests, reload)
+            self._loop, self._pending, self._timer = loop, {}, None
+        fut = loop.create_future()
+        # Identical concurrent questions share one slot in the batch
+        self._pending.setdefault(_ensure_text(text), []).append(fut)
+        self.queries += 1
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.wait, self._dispatch)
+        return await fut
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = self._loop.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: Dict[str, List[asyncio.Future]]):
+        texts = list(batch)
+        self.batches += 1
+        try:
+            vectors = await aembed_texts(texts, task_type=QUERY_TASK)
+        except BaseException as e:
+            for futs in batch.values():
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_exception(e)
+            if isinstance(e, Exception):
+                return
+            raise  # cancelled (shutdown): callers got the error, propagate it
+        for text, vec in zip(texts, vectors):
+            for fut in batch[text]:
+                if not fut.done():  # caller may have been cancelled meanwhile
+                    fut.set_result(vec)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queries": self.queries,
+            "batches": self.batches,
+            "avg_batch": round(self.queries / self.batches, 2) if self.batches else 0.0,
+        }
+
+_batcher = QueryEmbedBatcher()
+
+async def embed_query(text: str) -> List[float]:
+    """
+    Embed one search query (task type retrieval_query), batched with other
+    queries arriving at about the same time. Repeated queries are served from
+    the query-vector cache.
+    """
+    key = (EMBED_SPACE, caches.normalize_query(text))
+    vec = caches.query_vectors.lookup(key)
+    if vec is None:
+        with span("embed_query"):  # includes the batching window
+            vec = await _batcher.embed(key[1])
+        caches.query_vectors.store(key, vec)
+    return vec
+
+async def embed_queries(texts: List[str]) -> List[List[float]]:
+    """
+    Embed many queries at once (batch search), in input order. Cached vectors
+    are reused; the rest go out in concurrent calls of up to EMBED_API_BATCH
+    texts, bypassing the micro-batcher (the batch is already formed).
+    """
+    keys = [(EMBED_SPACE, caches.normalize_query(t)) for t in texts]
+    vectors: Dict[tuple, List[float]] = {}
+    for key in dict.fromkeys(keys):
+        vec = caches.query_vectors.lookup(key)
+        if vec is not None:
+            vectors[key] = vec
+    missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+    if missing:
+        groups = [missing[i:i + EMBED_API_BATCH] for i in range(0, len(missing), EMBED_API_BATCH)]
+        with span("embed_query"):
+            results = await asyncio.gather(
+                *(aembed_texts([text for _space, text in group], task_type=QUERY_TASK) for group in groups)
+            )
+        for group, vecs in zip(groups, results):
+            for key, vec in zip(group, vecs):
+                vectors[key] = vec
+                caches.query_vectors.store(key, vec)
+    return [vectors[key] for key in keys]
+
+def batcher_stats() -> Dict[str, float]:
+    return _batcher.stats()
@@ -0,0 +1,83 @@
+# Local chunk-text store keyed by point ID.
+#
+# Qdrant payloads only keep what is filtered on or displayed as metadata
+# (namespace, filename, page, offsets, point_id). The ~600-word chunk texts
+# live here, and are fetched in bulk only for the final top-k after fusion
+# (hydrate), instead of travelling with every candidate of every search.
+
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+from ..services.paths import DATA_ROOT
+from .qdrant_client import get_client, COLLECTION_NAME
+
+STORE_PATH = os.getenv("CHUNK_STORE_PATH", os.path.join(DATA_ROOT, "chunks.sqlite"))
+
+_local = threading.local()
+
+def _conn() -> sqlite3.Connection:
+    """
+    One SQLite connection per thread; WAL lets several workers read and write.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(STORE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(STORE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (point_id TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+        _local.conn = conn
+    return conn
+
+def put_many(items: Iterable[Tuple[str, str]]):
+    """
+    (point_id, text) pairs; re-indexed points overwrite their text.
+    """
+    conn = _conn()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO chunks (point_id, text) VALUES (?, ?)", list(items))
+
+def get_many(ids: List[str]) -> Dict[str, str]:
+    found: Dict[str, str] = {}
+    conn = _conn()
+    for i in range(0, len(ids), 500):  # stay under SQLite's variable limit
+        part = ids[i:i + 500]
+        rows = conn.execute(
+            f"SELECT point_id, text FROM chunks WHERE point_id IN ({','.join('?' * len(part))})", part
+        ).fetchall()
+        found.update(rows)
+    return found
+
+def delete_many(ids: List[str]):
+    conn = _conn()
+    with conn:
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            conn.execute(f"DELETE FROM chunks WHERE point_id IN ({','.join('?' * len(part))})", part)
+
+def hydrate(results: List[Tuple[Dict[str, Any], float]]) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    Add 'text' to the payloads of final (payload, score) results, in one bulk
+    read. Payloads are copied, so cached/shared payload dicts stay slim.
+    Points indexed before the store existed still carry their text in Qdrant;
+    those are fetched from there.
+    """
+    ids = [pl.get("point_id") for pl, _ in results if pl.get("point_id") and "text" not in pl]
+    texts = get_many(ids) if ids else {}
+    missing = [pid for pid in ids if pid not in texts]
+    if missing:
+        texts.update(_texts_from_qdrant(missing))
+    out = []
+    for pl, score in results:
+        if "text" not in pl:
+            pl = {**pl, "text": texts.get(pl.get("point_id"), "")}
+        out.append((pl, score))
+    return out
+
+def _texts_from_qdrant(ids: List[str]) -> Dict[str, str]:
+    points = get_client().retrieve(collection_name=COLLECTION_NAME, ids=ids, with_payload=["text"])
+    return {str(p.id): (p.payload or {}).get("text", "") for p in points}
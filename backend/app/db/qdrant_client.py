@@ -1,23 +1,222 @@
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-from qdrant_client.http import models as rest
+import logging
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from ..services.lazy import LazyModule
+
+# Imported on first use: the client package is the slowest import of the app
+qdrant = LazyModule("qdrant_client")
+rest = LazyModule("qdrant_client.http.models")
 
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "docs")
-EMBED_DIM = int(os.getenv("EMBED_DIM", "768"))  # temp default; update later if needed
+# text-embedding-004 returns 768 dims; a lower EMBED_DIM stores the truncated
+# embedding (output_dimensionality, see ai/embeddings.py). Changing it needs a
+# new collection (COLLECTION_NAME) and a re-index.
+EMBED_DIM = int(os.getenv("EMBED_DIM", "768"))
+
+# Compact dense vectors: "scalar" keeps an int8 copy (4x smaller), "binary"
+# 1 bit per dimension (32x) in RAM; the float32 originals can go to disk and
+# are only read to rescore the oversampled candidates of each search.
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "0").lower() in ("1", "true", "yes")
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "1").lower() not in ("0", "false", "no")
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))  # candidates fetched per result
+
+# BM25 sparse vector stored next to the dense one (server-side hybrid search)
+SPARSE_VECTOR = "bm25"
+SPARSE_VECTORS = os.getenv("SPARSE_VECTORS", "1").lower() not in ("0", "false", "no")
+
+log = logging.getLogger(__name__)
+
+# Transport: gRPC (QDRANT_PREFER_GRPC=1) is more compact than REST/JSON for
+# vectors and payloads. Either way each client keeps its connection(s) open
+# and is shared by the whole process; keepalives stop idle channels from
+# being dropped by proxies between bursts of queries.
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "0").lower() in ("1", "true", "yes")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))  # seconds per request
+GRPC_OPTIONS = {
+    "grpc.keepalive_time_ms": 30_000,
+    "grpc.keepalive_timeout_ms": 10_000,
+    "grpc.keepalive_permit_without_calls": 1,
+    "grpc.http2.max_pings_without_data": 0,
+    "grpc.max_receive_message_length": 64 * 1024 * 1024,
+}
+
+def _client_kwargs() -> dict:
+    kwargs = dict(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=QDRANT_TIMEOUT)
+    if QDRANT_PREFER_GRPC:
+        kwargs.update(prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT, grpc_options=GRPC_OPTIONS)
+    return kwargs
+
+# Local mode, no server: QDRANT_URL=":memory:" keeps the collection in this
+# process (benchmarks, offline runs), QDRANT_PATH persists it to a directory.
+QDRANT_PATH = os.getenv("QDRANT_PATH")
+QDRANT_LOCAL = QDRANT_URL == ":memory:" or bool(QDRANT_PATH)
+
+class _LocalAsyncClient:
+    """
+    Async facade over the local client. A separate AsyncQdrantClient in local
+    mode would get its own storage, so awaiting a method runs the shared sync
+    one inline (local searches are in-process and short).
+    """
+
+    def __init__(self, sync_client: "qdrant.QdrantClient"):
+        self._client = sync_client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+# Both clients are created on first use and then shared by the process
+# (a remote client contacts the server as it is created; a second local one
+# would have its own storage, so creation is serialized).
+_clients: dict = {}
+_clients_lock = threading.RLock()
+
+def _shared(kind: str, make):
+    c = _clients.get(kind)
+    if c is None:
+        with _clients_lock:
+            c = _clients.get(kind)
+            if c is None:
+                c = _clients[kind] = make()
+    return c
+
+def _make_client():
+    if QDRANT_LOCAL:
+        if QDRANT_PATH:
+            return qdrant.QdrantClient(path=QDRANT_PATH)
+        return qdrant.QdrantClient(location=":memory:")
+    return qdrant.QdrantClient(**_client_kwargs())
+
+def get_client() -> "qdrant.QdrantClient":
+    return _shared("sync", _make_client)
+
+def get_aclient() -> "qdrant.AsyncQdrantClient":
+    """
+    Async twin used by the request path (/ask, /search) so queries don't block workers.
+    """
+    if QDRANT_LOCAL:
+        return _shared("async", lambda: _LocalAsyncClient(get_client()))
+    return _shared("async", lambda: qdrant.AsyncQdrantClient(**_client_kwargs()))
+
+@lru_cache(maxsize=None)
+def slim_payload() -> "rest.PayloadSelectorExclude":
+    """
+    Chunk texts live in the local chunk store (db/chunk_store.py); searches only
+    bring back metadata, also for older points that still carry their text.
+    """
+    return rest.PayloadSelectorExclude(exclude=["text"])
+
+_sparse_ready: Optional[bool] = None
+
+def quantization_config(mode: str = QDRANT_QUANTIZATION):
+    """
+    Collection quantization for a QUANTIZATION_MODES entry (None for "none").
+    """
+    if mode == "scalar":
+        return rest.ScalarQuantization(scalar=rest.ScalarQuantizationConfig(
+            type=rest.ScalarType.INT8, quantile=0.99, always_ram=True,
+        ))
+    if mode == "binary":
+        return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(always_ram=True))
+    if mode != "none":
+        raise ValueError(f"QDRANT_QUANTIZATION must be one of {QUANTIZATION_MODES}, got {mode!r}")
+    return None
+
+def search_params(
+    mode: str = QDRANT_QUANTIZATION,
+    rescore: bool = QDRANT_RESCORE,
+    oversampling: float = QDRANT_OVERSAMPLING,
+) -> Optional["rest.SearchParams"]:
+    """
+    Dense search params: on a quantized collection, fetch limit * oversampling
+    candidates with the compact vectors and rescore them with the originals.
+    """
+    if mode == "none":
+        return None
+    return rest.SearchParams(quantization=rest.QuantizationSearchParams(
+        rescore=rescore, oversampling=oversampling if rescore else None,
+    ))
+
+@lru_cache(maxsize=None)
+def dense_search_params() -> Optional["rest.SearchParams"]:
+    return search_params()
+
+def _sparse_config():
+    # IDF modifier: Qdrant applies IDF from collection stats; points store saturated tf
+    return {SPARSE_VECTOR: rest.SparseVectorParams(modifier=rest.Modifier.IDF)}
+
+def has_sparse_vectors() -> bool:
+    """
+    Whether points carry the BM25 sparse vector (enabled and declared on the collection).
+    """
+    global _sparse_ready
+    if _sparse_ready is None:
+        if not SPARSE_VECTORS:
+            _sparse_ready = False
+        else:
+            params = get_client().get_collection(COLLECTION_NAME).config.params
+            _sparse_ready = SPARSE_VECTOR in (params.sparse_vectors or {})
+    return _sparse_ready
 
-client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+def _ensure_quantization(current):
+    """
+    Align an existing collection's quantization with QDRANT_QUANTIZATION.
+    Qdrant rebuilds the compact vectors in the background; searches keep working.
+    """
+    wanted = quantization_config()
+    if wanted == current:
+        return
+    try:
+        get_client().update_collection(COLLECTION_NAME, quantization_config=wanted or rest.Disabled.DISABLED)
+    except Exception as e:
+        log.warning("Could not set quantization '%s' on collection %s (%s)",
+                    QDRANT_QUANTIZATION, COLLECTION_NAME, e)
 
 def ensure_collection():
     # create if missing; safe to call on startup
+    global _sparse_ready
+    client = get_client()
     collections = [c.name for c in client.get_collections().collections]
     if COLLECTION_NAME not in collections:
         client.recreate_collection(
             COLLECTION_NAME,
-            vectors_config=VectorParams(size=EMBED_DIM, distance=Distance.COSINE),
+            vectors_config=rest.VectorParams(
+                size=EMBED_DIM, distance=rest.Distance.COSINE, on_disk=QDRANT_VECTORS_ON_DISK or None,
+            ),
+            sparse_vectors_config=_sparse_config() if SPARSE_VECTORS else None,
+            quantization_config=quantization_config(),
         )
+    else:
+        config = client.get_collection(COLLECTION_NAME).config
+        params = config.params
+        size = getattr(params.vectors, "size", None)
+        if size is not None and size != EMBED_DIM:
+            raise RuntimeError(
+                f"Collection {COLLECTION_NAME} stores {size}-dim vectors but EMBED_DIM={EMBED_DIM}; "
+                "use a new COLLECTION_NAME (and re-index) to change the dimensionality."
+            )
+        _ensure_quantization(config.quantization_config)
+    if SPARSE_VECTORS:
+        params = client.get_collection(COLLECTION_NAME).config.params
+        if SPARSE_VECTOR not in (params.sparse_vectors or {}):
+            try:
+                client.update_collection(COLLECTION_NAME, sparse_vectors_config=_sparse_config())
+            except Exception as e:
+                # Older servers can't add vectors to a collection: keep local BM25 only
+                log.warning("Collection %s has no sparse vector '%s' (%s); server-side "
+                            "hybrid search disabled until it is recreated.", COLLECTION_NAME, SPARSE_VECTOR, e)
+    _sparse_ready = None  # re-read on next use
     # Ensure we can filter by namespace efficiently. Without this, Qdrant rejects
     # search filters that reference the field.
     payload_schema = (client.get_collection(COLLECTION_NAME).payload_schema) or {}
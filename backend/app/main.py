@@ -1,9 +1,12 @@
 from dotenv import load_dotenv
 load_dotenv()  # This loads the .env file
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .db.qdrant_client import ensure_collection, client, COLLECTION_NAME  # Add client and COLLECTION_NAME
-from .routes import upload, ingest_preview, index_route, search, ask
+from .db.qdrant_client import ensure_collection
+from .routes import upload, ingest_preview, index_route, search, ask, cache_route
+from .services import jobs, readiness, telemetry
+from .services.paths import InvalidNamespace
 
 app = FastAPI(title="Gemini RAG DocChat API")
 
@@ -13,22 +16,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],  # per-stage breakdown for the frontend
 )
+app.add_middleware(telemetry.TimingMiddleware)
 
 app.include_router(upload.router)
 app.include_router(ingest_preview.router)
 app.include_router(index_route.router)
 app.include_router(search.router)
 app.include_router(ask.router)
+app.include_router(cache_route.router)
+
+@app.exception_handler(InvalidNamespace)
+def invalid_namespace(request: Request, exc: InvalidNamespace):
+    # Namespaces name folders: anything that would leave UPLOADS_ROOT/DATA_ROOT is a bad request
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 @app.on_event("startup")
 def on_startup():
-    ensure_collection()
+    # Collection setup talks to Qdrant: done in the background (see /ready), then
+    # index jobs interrupted by a restart are continued
+    readiness.start(ensure_collection, on_ready=jobs.resume_pending)
 
 @app.get("/health")
 def health():
     return {"status": "ok", "message": "API is running"}
 
+@app.get("/ready")
+def ready(response: Response):
+    """
+    Readiness probe: 503 until the Qdrant collection has been checked (and
+    created if missing), with the last error while it can't be reached.
+    """
+    status = readiness.status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus metrics: stage timings, request latency, embed batch sizes,
+    Gemini retries, cache hits, indexing throughput and corpus sizes.
+    """
+    return Response(telemetry.render_metrics(), media_type=telemetry.METRICS_CONTENT_TYPE)
+
 @app.get("/qdrant")
 def qdrant_ping():
     return {"collection": "docs", "status": "ready"}
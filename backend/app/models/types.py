@@ -4,10 +4,13 @@ from typing import Optional
 class ChunkMetadata(BaseModel):
     filename: str
     namespace: str
-    page: Optional[int] = None         # for PDFs when known
+    page: Optional[int] = None         # for PDFs when known (page the chunk starts on)
+    page_end: Optional[int] = None     # page the chunk ends on; chunks may span a page break
     section: Optional[str] = None      # placeholder for future heading-aware chunking
     source: Optional[str] = None       # e.g., "uploads/<ns>/<file>"
     uploaded_at: Optional[str] = None  # ISO string if you want to include it later
+    char_start: Optional[int] = None   # offsets of the chunk in the file's normalized text
+    char_end: Optional[int] = None
 
 class Chunk(BaseModel):
     text: str
@@ -0,0 +1,192 @@
+# Vectorized BM25 scoring.
+#
+# The corpus is kept as a term-major CSR matrix W (terms x docs) whose entries
+# are the saturated term frequencies
+#     tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avgdl))
+# and the IDF as a dense vector. A query becomes a sparse row vector
+# q[t] = idf[t] * count(t in query), so scoring is one sparse product q @ W
+# that only touches the rows (postings) of the query terms. The k best docs
+# are then picked with argpartition instead of sorting the whole corpus.
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from ..services.lazy import LazyModule
+
+sparse = LazyModule("scipy.sparse")  # imported when the first index is built or loaded
+
+# Same defaults as rank_bm25.BM25Okapi so scores stay identical.
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+def index_dtype(nnz: int):
+    """Smallest index dtype scipy accepts for this many postings."""
+    return np.int32 if nnz < np.iinfo(np.int32).max else np.int64
+
+def compute_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """
+    BM25Okapi IDF: log((N - n + 0.5) / (n + 0.5)), with negative values
+    floored to EPSILON * average idf.
+    """
+    df = np.asarray(df, dtype=np.float64)
+    if not len(df):
+        return df
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    eps = EPSILON * (idf.sum() / len(idf))
+    idf[idf < 0] = eps
+    return idf
+
+def compute_weights(post_doc: np.ndarray, post_tf: np.ndarray, doc_len: np.ndarray) -> np.ndarray:
+    """
+    Saturated tf for every posting (the CSR data array).
+    """
+    doc_len = np.asarray(doc_len, dtype=np.float64)
+    if not len(doc_len):
+        return np.zeros(0)
+    avgdl = float(doc_len.sum()) / len(doc_len)
+    norm = K1 * (1 - B + B * doc_len / avgdl)
+    tf = np.asarray(post_tf, dtype=np.float64)
+    return tf * (K1 + 1) / (tf + norm[np.asarray(post_doc)])
+
+class BM25Engine:
+    """
+    Scores queries against one corpus. Build it from postings arrays
+    (from_postings) or straight from tokenized documents (from_corpus).
+    """
+
+    def __init__(self, vocab: Dict[str, int], matrix: "sparse.csr_matrix", idf: np.ndarray):
+        self.vocab = vocab
+        self.matrix = matrix  # terms x docs
+        self.idf = np.asarray(idf, dtype=np.float64)
+
+    @property
+    def n_docs(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def from_postings(
+        cls,
+        vocab: Dict[str, int],
+        term_ptr: np.ndarray,
+        post_doc: np.ndarray,
+        post_tf: np.ndarray,
+        doc_len: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        idf: Optional[np.ndarray] = None,
+    ) -> "BM25Engine":
+        """
+        Wrap term-major postings without copying them (works on memory maps).
+        weights/idf are derived when not precomputed.
+        """
+        n_docs = len(doc_len)
+        if weights is None:
+            weights = compute_weights(post_doc, post_tf, doc_len)
+        if idf is None:
+            idf = compute_idf(np.diff(term_ptr), n_docs)
+        matrix = sparse.csr_matrix(
+            (weights, post_doc, term_ptr),
+            shape=(len(term_ptr) - 1, n_docs),
+            copy=False,
+        )
+        return cls(vocab, matrix, idf)
+
+    @classmethod
+    def from_corpus(cls, corpus: Sequence[List[str]]) -> "BM25Engine":
+        """
+        Build from tokenized documents (used by benchmarks and tests of parity).
+        """
+        vocab: Dict[str, int] = {}
+        rows, cols, tfs = [], [], []
+        doc_len = np.zeros(len(corpus), dtype=np.int64)
+        for doc, tokens in enumerate(corpus):
+            doc_len[doc] = len(tokens)
+            for tok, tf in Counter(tokens).items():
+                rows.append(vocab.setdefault(tok, len(vocab)))
+                cols.append(doc)
+                tfs.append(tf)
+        coo = sparse.coo_matrix(
+            (np.array(tfs, dtype=np.float64), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+            shape=(len(vocab), len(corpus)),
+        )
+        tf_csr = coo.tocsr()
+        tf_csr.sort_indices()
+        return cls.from_postings(vocab, tf_csr.indptr, tf_csr.indices, tf_csr.data, doc_len)
+
+    def query_vector(self, query_tokens: Iterable[str]) -> "sparse.csr_matrix":
+        """
+        Sparse 1 x V row: idf[t] * (times t appears in the query).
+        Unknown terms are dropped (they score 0 in BM25Okapi too).
+        """
+        counts = Counter(self.vocab[t] for t in query_tokens if t in self.vocab)
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        vals = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[cols]
+        return sparse.csr_matrix(
+            (vals, cols, np.array([0, len(cols)])), shape=(1, self.matrix.shape[0])
+        )
+
+    def get_scores(self, query_tokens: Iterable[str]) -> np.ndarray:
+        """
+        BM25 score for every document (same values as BM25Okapi.get_scores).
+        """
+        scores = np.zeros(self.n_docs)
+        row = self.query_vector(query_tokens) @ self.matrix
+        scores[row.indices] = row.data
+        return scores
+
+    def query_matrix(self, queries: Sequence[Iterable[str]]) -> "sparse.csr_matrix":
+        """
+        Sparse Q x V matrix: one query_vector row per query.
+        """
+        rows = [self.query_vector(q) for q in queries]
+        if not rows:
+            return sparse.csr_matrix((0, self.matrix.shape[0]))
+        return sparse.vstack(rows, format="csr")
+
+    def get_scores_batch(self, queries: Sequence[Iterable[str]]) -> "sparse.csr_matrix":
+        """
+        Q x docs scores from one sparse matrix-matrix product. Row q only
+        stores the docs sharing a term with query q; every other doc scores 0.
+        """
+        scores = (self.query_matrix(queries) @ self.matrix).tocsr()
+        scores.sort_indices()
+        return scores
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, via a partial selection
+    (O(n) partition + O(k log k) sort of the winners). Ties go to the lower
+    index, also at the k-th place: same result as
+    np.argsort(-scores, kind="stable")[:k].
+    """
+    n = len(scores)
+    if k <= 0 or not n:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    # argpartition alone would pick an arbitrary member of a tie at the k-th score
+    kth = np.partition(-scores, k - 1)[k - 1]
+    above = np.flatnonzero(-scores < kth)
+    tied = np.flatnonzero(-scores == kth)[:k - len(above)]
+    idx = np.concatenate([above, tied])
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+def top_k_row(indices: np.ndarray, data: np.ndarray, n: int, k: int) -> np.ndarray:
+    """
+    top_k_indices of one sparse score row (sorted `indices`, positive `data`,
+    n docs) without densifying it, with the same tie-break: equal scores go
+    to the lower doc index. When fewer than k docs score, the rest are
+    zero-score docs (the lowest-numbered ones), as in the dense order.
+    """
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    order = top_k_indices(data, k)  # ties on equal scores -> lower position = lower doc index
+    best = np.asarray(indices, dtype=np.int64)[order]
+    if len(best) < k:
+        scored = np.zeros(n, dtype=bool)
+        scored[indices] = True
+        best = np.concatenate([best, np.flatnonzero(~scored)[:k - len(best)]])
+    return best
@@ -0,0 +1,404 @@
+# Persistent BM25 inverted index, one per namespace.
+#
+# Layout under data/<namespace>/bm25/:
+#   CURRENT             -> name of the live version folder (the version stamp)
+#   v000007/meta.json   -> vocab terms, point ids, payloads
+#   v000007/*.npy       -> postings arrays, BM25 weights and IDF, memory-mapped on load
+#
+# Writers build a complete new version folder and then atomically swap CURRENT,
+# so readers (possibly in other uvicorn workers) never see a half-written index.
+# Readers keep the loaded snapshot in memory and only re-open it when CURRENT
+# points at a newer version.
+
+import os
+import json
+import shutil
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import portalocker
+
+from ..services.paths import data_dir, data_path
+from .bm25_engine import (
+    B, EPSILON, K1, BM25Engine, compute_idf, compute_weights, index_dtype, top_k_indices, top_k_row,
+)
+
+# How many old version folders to keep around for readers that still map them.
+_KEEP_VERSIONS = 2
+
+def tokenize(text: str) -> List[str]:
+    """Simple whitespace tokens (same as the original BM25 corpus)."""
+    return text.split()
+
+def _index_dir(namespace: str, create: bool = False) -> str:
+    return data_dir(namespace, "bm25") if create else data_path(namespace, "bm25")
+
+def _read_current(base: str) -> Optional[str]:
+    try:
+        with open(os.path.join(base, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _version_number(name: Optional[str]) -> int:
+    return int(name[1:]) if name else 0
+
+# --- Read side ---
+
+class BM25Snapshot:
+    """
+    One immutable version of a namespace's index.
+    Postings are stored term-major: for term t, its (doc, tf) pairs live in
+    post_doc/post_tf[term_ptr[t]:term_ptr[t + 1]]. Scoring goes through a
+    BM25Engine that wraps the same arrays as a CSR matrix.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        vocab: Dict[str, int],
+        ids: List[str],
+        payloads: List[Dict[str, Any]],
+        term_ptr: np.ndarray,
+        post_doc: np.ndarray,
+        post_tf: np.ndarray,
+        doc_len: np.ndarray,
+        post_w: Optional[np.ndarray] = None,
+        idf: Optional[np.ndarray] = None,
+    ):
+        self.version = version
+        self.vocab = vocab
+        self.ids = ids
+        self.payloads = payloads
+        self.term_ptr = term_ptr
+        self.post_doc = post_doc
+        self.post_tf = post_tf
+        self.doc_len = doc_len
+        self.engine = BM25Engine.from_postings(
+            vocab, term_ptr, post_doc, post_tf, doc_len, weights=post_w, idf=idf
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get_scores(self, query_tokens: Iterable[str]) -> np.ndarray:
+        """
+        BM25 score for every document (one sparse product, see bm25_engine).
+        """
+        return self.engine.get_scores(query_tokens)
+
+    def get_scores_batch(self, queries: List[List[str]]):
+        """
+        Sparse Q x docs scores for tokenized queries (one matrix product).
+        """
+        return self.engine.get_scores_batch(queries)
+
+def _load_snapshot(base: str, name: str) -> BM25Snapshot:
+    folder = os.path.join(base, name)
+    with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    # Postings are required (a missing file means the folder was deleted
+    # under us); weights and IDF are derived when absent
+    arrays = {
+        key: np.load(os.path.join(folder, f"{key}.npy"), mmap_mode="r")
+        for key in _ARRAYS
+        if key not in _DERIVED or os.path.exists(os.path.join(folder, f"{key}.npy"))
+    }
+    vocab = {term: i for i, term in enumerate(meta["terms"])}
+    return BM25Snapshot(
+        version=meta["version"],
+        vocab=vocab,
+        ids=meta["ids"],
+        payloads=meta["payloads"],
+        **arrays,
+    )
+
+_ARRAYS = ("term_ptr", "post_doc", "post_tf", "doc_len", "post_w", "idf")
+_DERIVED = ("post_w", "idf")
+
+_cache: Dict[str, BM25Snapshot] = {}
+_cache_lock = threading.Lock()
+
+# Tries at opening the version CURRENT points at (see get_snapshot)
+_LOAD_ATTEMPTS = 3
+
+def current_version(namespace: str) -> int:
+    """
+    Version stamp of the namespace's index on disk (0 if it was never built).
+    """
+    return _version_number(_read_current(_index_dir(namespace)))
+
+def exists(namespace: str) -> bool:
+    return current_version(namespace) > 0
+
+def get_snapshot(namespace: str) -> Optional[BM25Snapshot]:
+    """
+    Returns the live index for a namespace, loading it lazily.
+    A cached copy is reused until a writer publishes a newer version.
+    Writers delete old versions: if the one CURRENT named is gone before it
+    could be opened, CURRENT is read again.
+    """
+    base = _index_dir(namespace)
+    for attempt in range(_LOAD_ATTEMPTS):
+        name = _read_current(base)
+        if name is None:
+            return None
+        version = _version_number(name)
+        cached = _cache.get(namespace)
+        if cached is not None and cached.version == version:
+            return cached
+        with _cache_lock:
+            cached = _cache.get(namespace)
+            if cached is not None and cached.version == version:
+                return cached
+            try:
+                cached = _load_snapshot(base, name)
+            except FileNotFoundError:
+                if attempt == _LOAD_ATTEMPTS - 1:
+                    raise
+                continue  # superseded and deleted meanwhile
+            _cache[namespace] = cached
+            return cached
+
+# --- Write side ---
+
+def _empty_snapshot() -> BM25Snapshot:
+    return BM25Snapshot(
+        version=0,
+        vocab={},
+        ids=[],
+        payloads=[],
+        term_ptr=np.zeros(1, dtype=np.int32),
+        post_doc=np.zeros(0, dtype=np.int32),
+        post_tf=np.zeros(0, dtype=np.int32),
+        doc_len=np.zeros(0, dtype=np.int32),
+    )
+
+def _apply(
+    snap: BM25Snapshot,
+    upserts: List[Tuple[str, str, Dict[str, Any]]],
+    delete_ids: Iterable[str],
+) -> Dict[str, Any]:
+    """
+    Build the arrays of the next version: drop deleted/replaced docs,
+    append new ones, then re-sort postings by (term, doc).
+    """
+    drop = set(delete_ids) | {pid for pid, _, _ in upserts}
+    keep = np.array([pid not in drop for pid in snap.ids], dtype=bool)
+    new_index = np.cumsum(keep) - 1  # old doc index -> new doc index
+
+    # Existing postings as (term, doc, tf) triplets, minus dropped docs
+    term_of = np.repeat(np.arange(len(snap.term_ptr) - 1), np.diff(snap.term_ptr))
+    doc_of = np.asarray(snap.post_doc)
+    live = keep[doc_of] if len(doc_of) else np.zeros(0, dtype=bool)
+    terms = [term_of[live]]
+    docs = [new_index[doc_of[live]]]
+    tfs = [np.asarray(snap.post_tf)[live]]
+
+    ids = [pid for pid, k in zip(snap.ids, keep) if k]
+    payloads = [pl for pl, k in zip(snap.payloads, keep) if k]
+    doc_len = [np.asarray(snap.doc_len)[keep]]
+
+    # New docs
+    vocab = dict(snap.vocab)
+    new_terms, new_docs, new_tfs, new_lens = [], [], [], []
+    for pid, text, payload in upserts:
+        tokens = tokenize(text)
+        doc = len(ids)
+        ids.append(pid)
+        payloads.append(payload)
+        new_lens.append(len(tokens))
+        for tok, tf in Counter(tokens).items():
+            new_terms.append(vocab.setdefault(tok, len(vocab)))
+            new_docs.append(doc)
+            new_tfs.append(tf)
+    terms.append(np.array(new_terms, dtype=np.int64))
+    docs.append(np.array(new_docs, dtype=np.int64))
+    tfs.append(np.array(new_tfs, dtype=np.int32))
+    doc_len.append(np.array(new_lens, dtype=np.int32))
+
+    term_arr = np.concatenate(terms)
+    doc_arr = np.concatenate(docs)
+    tf_arr = np.concatenate(tfs)
+
+    # Drop terms that no longer occur anywhere and compact term ids
+    df = np.bincount(term_arr, minlength=len(vocab))
+    alive = df > 0
+    remap = np.cumsum(alive) - 1
+    inv_vocab = [None] * len(vocab)
+    for tok, tid in vocab.items():
+        inv_vocab[tid] = tok
+    terms_out = [tok for tok, a in zip(inv_vocab, alive) if a]
+    term_arr = remap[term_arr]
+
+    order = np.lexsort((doc_arr, term_arr))
+    # indptr and indices share one dtype so scipy can wrap them without a copy
+    idx_t = index_dtype(len(order))
+    term_ptr = np.zeros(len(terms_out) + 1, dtype=idx_t)
+    np.cumsum(df[alive], out=term_ptr[1:])
+    post_doc = doc_arr[order].astype(idx_t)
+    post_tf = tf_arr[order].astype(np.int32)
+    lens = np.concatenate(doc_len).astype(np.int32)
+
+    return {
+        "terms": terms_out,
+        "ids": ids,
+        "payloads": payloads,
+        "term_ptr": term_ptr,
+        "post_doc": post_doc,
+        "post_tf": post_tf,
+        "doc_len": lens,
+        # Precomputed here so every reader just maps them
+        "post_w": compute_weights(post_doc, post_tf, lens),
+        "idf": compute_idf(np.diff(term_ptr), len(ids)),
+    }
+
+def _publish(base: str, version: int, built: Dict[str, Any]):
+    name = f"v{version:06d}"
+    folder = os.path.join(base, name)
+    tmp = folder + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for key in _ARRAYS:
+        np.save(os.path.join(tmp, f"{key}.npy"), built[key])
+    meta = {
+        "version": version,
+        "terms": built["terms"],
+        "ids": built["ids"],
+        "payloads": built["payloads"],
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, folder)
+
+    # Flip the version stamp atomically
+    cur_tmp = os.path.join(base, "CURRENT.tmp")
+    with open(cur_tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(cur_tmp, os.path.join(base, "CURRENT"))
+
+    # Clean up old versions (open memory maps stay valid on POSIX)
+    old = sorted(d for d in os.listdir(base) if d.startswith("v") and not d.endswith(".tmp"))
+    for d in old[:-_KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(base, d), ignore_errors=True)
+
+def update(
+    namespace: str,
+    upserts: Optional[List[Tuple[str, str, Dict[str, Any]]]] = None,
+    delete_ids: Optional[Iterable[str]] = None,
+) -> int:
+    """
+    Apply upserted (point_id, text, payload) docs and deleted point ids to the
+    namespace index and publish a new version. Returns the new version stamp.
+    """
+    upserts = [u for u in (upserts or []) if u[1]]
+    delete_ids = list(delete_ids or [])
+    base = _index_dir(namespace, create=True)
+    with portalocker.Lock(os.path.join(base, ".lock"), timeout=60):
+        name = _read_current(base)
+        snap = _load_snapshot(base, name) if name else _empty_snapshot()
+        if not upserts and not delete_ids and name:
+            return snap.version
+        version = _version_number(name) + 1
+        _publish(base, version, _apply(snap, upserts, delete_ids))
+    return version
+
+def upsert_documents(namespace: str, docs: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+    return update(namespace, upserts=docs)
+
+def delete_documents(namespace: str, ids: Iterable[str]) -> int:
+    return update(namespace, delete_ids=ids)
+
+def top_k(snap: BM25Snapshot, query: str, k: int) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    Score the query against a snapshot and return the k best (payload, score).
+    """
+    scores = snap.get_scores(tokenize(query))
+    return [(snap.payloads[i], float(scores[i])) for i in top_k_indices(scores, k)]
+
+def top_k_batch(snap: BM25Snapshot, queries: List[str], k: int) -> List[List[Tuple[Dict[str, Any], float]]]:
+    """
+    top_k for many queries against the same snapshot, all scored at once.
+    """
+    scores = snap.get_scores_batch([tokenize(q) for q in queries])
+    out = []
+    for row in range(len(queries)):
+        lo, hi = scores.indptr[row], scores.indptr[row + 1]
+        indices, data = scores.indices[lo:hi], scores.data[lo:hi]
+        best = top_k_row(indices, data, len(snap), k)
+        pos = np.minimum(np.searchsorted(indices, best), max(len(indices) - 1, 0))
+        hit = (pos < len(indices)) & (indices[pos] == best) if len(indices) else np.zeros(len(best), dtype=bool)
+        best_scores = np.where(hit, data[pos] if len(data) else 0.0, 0.0)
+        out.append([(snap.payloads[i], float(s)) for i, s in zip(best.tolist(), best_scores.tolist())])
+    return out
+
+class CorpusStats(NamedTuple):
+    """
+    BM25 statistics of several snapshots taken as one corpus.
+    """
+    n_docs: int
+    avgdl: float
+    df: Dict[str, int]  # document frequency of every term in the union
+    idf_floor: float    # EPSILON * mean idf over the union vocabulary
+
+    def idf(self, term: str) -> float:
+        df = self.df.get(term, 0)
+        idf = float(np.log(self.n_docs - df + 0.5) - np.log(df + 0.5))
+        return idf if idf >= 0 else self.idf_floor
+
+def corpus_stats(snaps: List[BM25Snapshot]) -> CorpusStats:
+    """
+    Document count, average length and document frequencies summed over the
+    snapshots: the statistics one index over all of them would have had.
+    """
+    df: Counter = Counter()
+    for snap in snaps:
+        counts = np.diff(np.asarray(snap.term_ptr)).tolist()
+        for term, t in snap.vocab.items():
+            df[term] += counts[t]
+    n_docs = sum(len(snap) for snap in snaps)
+    total_len = sum(float(np.asarray(snap.doc_len).sum()) for snap in snaps)
+    dfs = np.fromiter(df.values(), dtype=np.float64, count=len(df))
+    idf = np.log(n_docs - dfs + 0.5) - np.log(dfs + 0.5)  # unfloored, as compute_idf averages it
+    floor = EPSILON * float(idf.mean()) if len(idf) else 0.0
+    return CorpusStats(n_docs, total_len / n_docs if n_docs else 0.0, dict(df), floor)
+
+def top_k_global(
+    snap: BM25Snapshot, query: str, k: int, stats: CorpusStats
+) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    top_k scored with corpus-wide statistics (corpus_stats) instead of the
+    snapshot's own IDF and average length, so scores from different
+    snapshots are comparable. Walks the query terms' postings directly.
+    """
+    scores = np.zeros(len(snap))
+    if not stats.n_docs:
+        return []
+    for term, count in Counter(tokenize(query)).items():
+        t = snap.vocab.get(term)
+        if t is None:
+            continue
+        lo, hi = int(snap.term_ptr[t]), int(snap.term_ptr[t + 1])
+        docs = np.asarray(snap.post_doc[lo:hi])
+        tf = np.asarray(snap.post_tf[lo:hi], dtype=np.float64)
+        norm = K1 * (1 - B + B * np.asarray(snap.doc_len[docs], dtype=np.float64) / stats.avgdl)
+        scores[docs] += count * stats.idf(term) * tf * (K1 + 1) / (tf + norm)
+    return [(snap.payloads[i], float(scores[i])) for i in top_k_indices(scores, k)]
+
+def docs_from_points(points: Iterable[Any], texts: Optional[Dict[str, str]] = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Turn Qdrant points (id + payload) into index docs. The text comes from the
+    payload (points written before the chunk store) or from `texts` (point id -> text).
+    """
+    texts = texts or {}
+    docs = []
+    for p in points:
+        if not p.payload:
+            continue
+        text = p.payload.get("text") or texts.get(str(p.id))
+        if text:
+            payload = {k: v for k, v in p.payload.items() if k != "text"}
+            docs.append((str(p.id), text, payload))
+    return docs
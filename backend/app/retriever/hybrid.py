@@ -1,74 +1,210 @@
-from typing import List, Dict, Any, Tuple
-from qdrant_client.http import models as rest
-from ..db.qdrant_client import client, COLLECTION_NAME
-from rank_bm25 import BM25Okapi
+import os
+import heapq
+import asyncio
+import statistics
+from itertools import islice
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
+from ..db.qdrant_client import (
+    rest, get_client, get_aclient, COLLECTION_NAME, SPARSE_VECTOR, slim_payload, dense_search_params, has_sparse_vectors,
+)
+from ..db import chunk_store
+from ..ai.query_batcher import embed_query, embed_queries
+from ..services import corpus_version
+from ..services import telemetry
+from ..state import caches
+from . import bm25_index, sparse
+
+# Retrieval engines:
+#   local  - dense search in Qdrant + BM25 on the local index, fused in Python
+#   qdrant - dense + BM25 sparse vectors fused by Qdrant in one query
+ENGINES = ("local", "qdrant")
+FUSIONS = ("weighted", "rrf", "dbsf")
+DEFAULT_ENGINE = os.getenv("RETRIEVAL_ENGINE", "local")
+DEFAULT_FUSION = os.getenv("RETRIEVAL_FUSION", "weighted")
+
+# Server-side weighted fusion can't min-max normalize BM25 (no max over the
+# candidates), so it squashes it instead: bm25 / (bm25 + SPARSE_SCORE_SCALE)
+SPARSE_SCORE_SCALE = float(os.getenv("SPARSE_SCORE_SCALE", "10"))
+
+# Searches may span several namespaces: one name, or a sequence of names
+Namespaces = Union[str, Sequence[str]]
+
+def namespace_list(namespace: Namespaces) -> Tuple[str, ...]:
+    """
+    The namespaces of a search, deduplicated, in order.
+    """
+    if isinstance(namespace, str):
+        return (namespace,)
+    return tuple(dict.fromkeys(namespace))
 
 # --- Dense (Qdrant) ---
 
-def dense_search(query_vec: List[float], namespace: str, k: int = 20):
+def _namespace_filter(namespace: Namespaces) -> "rest.Filter":
+    namespaces = namespace_list(namespace)
+    if len(namespaces) == 1:
+        match = rest.MatchValue(value=namespaces[0])
+    else:
+        match = rest.MatchAny(any=list(namespaces))
+    return rest.Filter(must=[rest.FieldCondition(key="namespace", match=match)])
+
+@telemetry.timed("dense_search")
+def dense_search(query_vec: List[float], namespace: Namespaces, k: int = 20):
     """
-    Vector search in Qdrant, filtered by namespace.
+    Vector search in Qdrant, filtered by namespace, or by any of several
+    namespaces in the same query (quantized collections:
+    oversampled and rescored, see dense_search_params).
     Returns list of (payload, score).
     """
-    flt = rest.Filter(
-        must=[rest.FieldCondition(key="namespace", match=rest.MatchValue(value=namespace))]
-    )
-    hits = client.search(
+    flt = _namespace_filter(namespace)
+    hits = get_client().search(
         collection_name=COLLECTION_NAME,
         query_vector=query_vec,
         limit=k,
         query_filter=flt,
+        search_params=dense_search_params(),
+        with_payload=slim_payload(),
     )
     # Qdrant similarity score: higher = more similar.
     return [ (h.payload, float(h.score)) for h in hits ]
 
+@telemetry.timed("dense_search")
+async def adense_search(query_vec: List[float], namespace: Namespaces, k: int = 20):
+    """
+    Async twin of dense_search (AsyncQdrantClient).
+    """
+    hits = await get_aclient().search(
+        collection_name=COLLECTION_NAME,
+        query_vector=query_vec,
+        limit=k,
+        query_filter=_namespace_filter(namespace),
+        search_params=dense_search_params(),
+        with_payload=slim_payload(),
+    )
+    return [ (h.payload, float(h.score)) for h in hits ]
+
+@telemetry.timed("dense_search")
+async def adense_search_batch(query_vecs: List[List[float]], namespace: str, k: int = 20):
+    """
+    Many dense searches in one Qdrant request (query_batch_points).
+    Returns one list of (payload, score) per query vector.
+    """
+    flt = _namespace_filter(namespace)
+    requests = [
+        rest.QueryRequest(
+            query=vec, filter=flt, limit=k, params=dense_search_params(), with_payload=slim_payload(),
+        )
+        for vec in query_vecs
+    ]
+    responses = await get_aclient().query_batch_points(collection_name=COLLECTION_NAME, requests=requests)
+    return [[(p.payload, float(p.score)) for p in resp.points] for resp in responses]
+
 # --- BM25 (keyword) ---
 
-def _load_namespace_corpus(namespace: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+@telemetry.timed("bm25_bootstrap")
+def _load_namespace_corpus(namespace: str) -> List[Any]:
     """
-    Pull all texts + payloads for a namespace from Qdrant.
-    We'll use this as our BM25 corpus.
+    Pull all points (id + payload) for a namespace from Qdrant.
+    Only used once to bootstrap the local BM25 index of namespaces that were
+    indexed before it existed.
     """
-    texts, payloads = [], []
-    # Scroll all points in this namespace (small projects: ok)
+    points = []
     next_page = None
     while True:
-        resp = client.scroll(
+        resp = get_client().scroll(
             collection_name=COLLECTION_NAME,
-            scroll_filter=rest.Filter(
-                must=[rest.FieldCondition(key="namespace", match=rest.MatchValue(value=namespace))]
-            ),
+            scroll_filter=_namespace_filter(namespace),
             with_payload=True,
             limit=256,
             offset=next_page,
         )
-        points, next_page = resp[0], resp[1]
-        for p in points:
-            txt = p.payload.get("text", "")
-            if txt:
-                texts.append(txt)
-                payloads.append(p.payload)
+        batch, next_page = resp[0], resp[1]
+        points.extend(batch)
         if next_page is None:
             break
-    return texts, payloads
+    return points
 
+def ensure_bm25_index(namespace: str):
+    """
+    Returns the namespace's BM25 index snapshot, building it from Qdrant the
+    first time (namespaces indexed before the local index existed). None for
+    namespaces without points: nothing is written for them.
+    """
+    snap = bm25_index.get_snapshot(namespace)
+    if snap is None:
+        points = _load_namespace_corpus(namespace)
+        if not points:
+            return None
+        texts = chunk_store.get_many([str(p.id) for p in points if not (p.payload or {}).get("text")])
+        docs = bm25_index.docs_from_points(points, texts)
+        # Older points carry their text in Qdrant: copy it so hydration stays local
+        chunk_store.put_many((pid, text) for pid, text, _pl in docs if pid not in texts)
+        bm25_index.upsert_documents(namespace, docs)
+        snap = bm25_index.get_snapshot(namespace)
+    if snap is not None:
+        telemetry.CORPUS_CHUNKS.labels(namespace).set(len(snap))
+    return snap
+
+@telemetry.timed("bm25")
 def bm25_search(query: str, namespace: str, k: int = 20):
     """
     Keyword search with BM25 over the namespace corpus.
+    Uses the persistent per-namespace index (see bm25_index); it is kept up to
+    date by the indexer, so no corpus is pulled from Qdrant per query.
     Returns list of (payload, score).
     """
-    texts, payloads = _load_namespace_corpus(namespace)
-    if not texts:
+    snap = ensure_bm25_index(namespace)
+    if snap is None or not len(snap):
         return []
-    tokenized = [t.split() for t in texts]   # simple whitespace tokens (good enough to learn)
-    bm25 = BM25Okapi(tokenized)
-    scores = bm25.get_scores(query.split())
-    # Pair each payload with its score and take top-k
-    ranked = sorted(zip(payloads, scores), key=lambda x: x[1], reverse=True)[:k]
-    return [ (pl, float(s)) for pl, s in ranked ]
+    return bm25_index.top_k(snap, query, k)
+
+@telemetry.timed("bm25")
+def bm25_search_batch(queries: List[str], namespace: str, k: int = 20):
+    """
+    BM25 for many queries against one snapshot of the namespace corpus, all
+    scored in one sparse matrix product. Returns one list per query.
+    """
+    snap = ensure_bm25_index(namespace)
+    if snap is None or not len(snap):
+        return [[] for _ in queries]
+    return bm25_index.top_k_batch(snap, queries, k)
+
+def _corpus_stats(namespaces: Tuple[str, ...], snaps) -> "bm25_index.CorpusStats":
+    """
+    Merged BM25 statistics of the snapshots, cached until one of them changes.
+    """
+    key = tuple((ns, snap.version) for ns, snap in zip(namespaces, snaps))
+    stats = caches.bm25_stats.lookup(key)
+    if stats is None:
+        stats = bm25_index.corpus_stats(snaps)
+        caches.bm25_stats.store(key, stats)
+    return stats
+
+@telemetry.timed("bm25")
+async def abm25_search_many(query: str, namespaces: Sequence[str], k: int = 20):
+    """
+    BM25 over several namespaces as if they were one corpus. Each namespace
+    keeps its own index and is scored in its own thread, with the IDF and
+    average document length of all of them together (so the scores are
+    comparable across namespaces); the per-namespace top k lists are then
+    merged with a heap into the global top k. Returns list of (payload, score).
+    """
+    snaps = await asyncio.gather(*(asyncio.to_thread(ensure_bm25_index, ns) for ns in namespaces))
+    found = [(ns, snap) for ns, snap in zip(namespaces, snaps) if snap is not None and len(snap)]
+    if not found:
+        return []
+    names = tuple(ns for ns, _snap in found)
+    snaps = [snap for _ns, snap in found]
+    stats = await asyncio.to_thread(_corpus_stats, names, snaps)
+    ranked = await asyncio.gather(
+        *(asyncio.to_thread(bm25_index.top_k_global, snap, query, k, stats) for snap in snaps)
+    )
+    return list(islice(heapq.merge(*ranked, key=lambda hit: -hit[1]), k))
 
 # --- Score fusion ---
 
+def _key(pl):  # point ID; older points fall back to a lightweight identity
+    return pl.get("point_id") or (pl.get("filename"), pl.get("page"), (pl.get("text") or "")[:120])
+
 def fuse_results(
     dense: List[Tuple[Dict[str, Any], float]],
     bm25: List[Tuple[Dict[str, Any], float]],
@@ -76,13 +212,11 @@ def fuse_results(
     top_k: int = 8
 ):
     """
-    Merge by payload identity (filename + page + text hash if you add one later),
+    Merge by payload identity (point ID, or filename + page + text prefix),
     normalize each score list, then combine: alpha*dense + (1-alpha)*bm25.
     """
     # Build maps
-    def key(pl):  # lightweight identity
-        return (pl.get("filename"), pl.get("page"), pl.get("text")[:120])
-    from collections import defaultdict
+    key = _key
 
     # Gather raw scores
     d_map, b_map = {}, {}
@@ -112,3 +246,245 @@ def fuse_results(
 
     fused.sort(key=lambda x: x[1], reverse=True)
     return fused[:top_k]
+
+def rrf_fuse(*ranked: List[Tuple[Dict[str, Any], float]], top_k: int = 8, rrf_k: int = 60):
+    """
+    Reciprocal rank fusion: sum of 1 / (rrf_k + rank) over the lists (Qdrant's RRF).
+    """
+    scores: Dict[Any, List] = {}
+    for hits in ranked:
+        for rank, (pl, _s) in enumerate(hits):
+            entry = scores.setdefault(_key(pl), [pl, 0.0])
+            entry[1] += 1.0 / (rrf_k + rank + 1)
+    fused = sorted(((pl, s) for pl, s in scores.values()), key=lambda x: x[1], reverse=True)
+    return fused[:top_k]
+
+def dbsf_fuse(*ranked: List[Tuple[Dict[str, Any], float]], top_k: int = 8):
+    """
+    Distribution-based score fusion: each list is normalized with
+    mean +/- 3 standard deviations as its [0, 1] range, then summed (Qdrant's DBSF).
+    """
+    scores: Dict[Any, List] = {}
+    for hits in ranked:
+        if not hits:
+            continue
+        vals = [s for _, s in hits]
+        mean = statistics.fmean(vals)
+        std = statistics.pstdev(vals) if len(vals) > 1 else 0.0
+        lo, hi = mean - 3 * std, mean + 3 * std
+        span = (hi - lo) or 1.0
+        for pl, s in hits:
+            entry = scores.setdefault(_key(pl), [pl, 0.0])
+            entry[1] += min(1.0, max(0.0, (s - lo) / span))
+    fused = sorted(((pl, s) for pl, s in scores.values()), key=lambda x: x[1], reverse=True)
+    return fused[:top_k]
+
+def fuse(dense, bm25, fusion: str, alpha: float, top_k: int):
+    if fusion == "rrf":
+        return rrf_fuse(dense, bm25, top_k=top_k)
+    if fusion == "dbsf":
+        return dbsf_fuse(dense, bm25, top_k=top_k)
+    return fuse_results(dense, bm25, alpha=alpha, top_k=top_k)
+
+# --- Server-side hybrid (Qdrant sparse vectors + query API fusion) ---
+
+def _server_query(fusion: str, alpha: float):
+    if fusion == "rrf":
+        return rest.FusionQuery(fusion=rest.Fusion.RRF)
+    if fusion == "dbsf":
+        return rest.FusionQuery(fusion=rest.Fusion.DBSF)
+    # weighted: alpha * cosine + (1 - alpha) * bm25 / (bm25 + scale)
+    bm25 = "$score[1]"
+    squashed = rest.DivExpression(div=rest.DivParams(
+        left=bm25,
+        right=rest.SumExpression(sum=[bm25, SPARSE_SCORE_SCALE]),
+        by_zero_default=0.0,
+    ))
+    return rest.FormulaQuery(
+        formula=rest.SumExpression(sum=[
+            rest.MultExpression(mult=[alpha, "$score[0]"]),
+            rest.MultExpression(mult=[1 - alpha, squashed]),
+        ]),
+        # a point found by only one branch scores 0 on the other
+        defaults={"$score[0]": 0.0, "$score[1]": 0.0},
+    )
+
+def _server_request(query: str, qvec, flt, k: int, alpha: float, top_k: int, fusion: str) -> "rest.QueryRequest":
+    prefetch = [rest.Prefetch(query=qvec, limit=k, filter=flt, params=dense_search_params())]
+    svec = sparse.query_vector(query)
+    if svec is not None:
+        prefetch.append(rest.Prefetch(query=svec, using=SPARSE_VECTOR, limit=k, filter=flt))
+    return rest.QueryRequest(
+        prefetch=prefetch,
+        query=_server_query(fusion, alpha) if len(prefetch) > 1 else rest.FusionQuery(fusion=rest.Fusion.RRF),
+        limit=top_k,
+        with_payload=slim_payload(),
+    )
+
+@telemetry.timed("qdrant_hybrid")
+async def server_hybrid_search(
+    query: str,
+    namespace: Namespaces,
+    k: int = 20,
+    alpha: float = 0.6,
+    top_k: int = 8,
+    fusion: str = "weighted"
+):
+    """
+    One Qdrant query: dense and sparse (BM25) prefetches of k candidates each,
+    fused server-side into the top_k. Returns list of (payload, score).
+    """
+    qvec = await embed_query(query)
+    req = _server_request(query, qvec, _namespace_filter(namespace), k, alpha, top_k, fusion)
+    resp = await get_aclient().query_points(
+        collection_name=COLLECTION_NAME,
+        prefetch=req.prefetch,
+        query=req.query,
+        limit=req.limit,
+        with_payload=req.with_payload,
+    )
+    return [(p.payload, float(p.score)) for p in resp.points]
+
+@telemetry.timed("qdrant_hybrid")
+async def server_hybrid_search_batch(
+    queries: List[str],
+    query_vecs: List[List[float]],
+    namespace: str,
+    k: int = 20,
+    alpha: float = 0.6,
+    top_k: int = 8,
+    fusion: str = "weighted"
+):
+    """
+    server_hybrid_search for many (already embedded) queries in one Qdrant request.
+    """
+    flt = _namespace_filter(namespace)
+    requests = [
+        _server_request(query, qvec, flt, k, alpha, top_k, fusion) for query, qvec in zip(queries, query_vecs)
+    ]
+    responses = await get_aclient().query_batch_points(collection_name=COLLECTION_NAME, requests=requests)
+    return [[(p.payload, float(p.score)) for p in resp.points] for resp in responses]
+
+# --- Async request path ---
+
+async def hybrid_retrieve(
+    query: str,
+    namespace: Namespaces,
+    k: int = 20,
+    alpha: float = 0.6,
+    top_k: int = 8,
+    engine: Optional[str] = None,
+    fusion: Optional[str] = None
+):
+    """
+    engine='local': dense and BM25 retrieval run concurrently, then fused.
+    BM25 is local CPU work, so it runs in a thread while the query is embedded
+    and searched in Qdrant; latency is the slower of the two branches, not the sum.
+    engine='qdrant': both run inside Qdrant, one round trip (needs sparse vectors
+    on the collection; falls back to 'local' otherwise).
+    fusion: 'weighted' (alpha), 'rrf' or 'dbsf'.
+    Candidates carry slim payloads; only the final top_k get their text, in
+    one bulk read from the chunk store.
+    Fused results are cached per corpus version, so a re-index invalidates them.
+    namespace may be a list: the dense search is then one Qdrant query over
+    all of them (MatchAny), BM25 runs per namespace in parallel with shared
+    corpus statistics (abm25_search_many), and the results compete for one top_k.
+    With engine='qdrant' only the filter widens: Qdrant's BM25 IDF is already
+    collection-wide.
+    """
+    engine = engine or DEFAULT_ENGINE
+    fusion = fusion or DEFAULT_FUSION
+    if engine == "qdrant" and not has_sparse_vectors():
+        engine = "local"
+    query = caches.normalize_query(query)
+    namespaces = namespace_list(namespace)
+    if len(namespaces) == 1:
+        namespace = namespaces[0]
+        key = (namespace, query, k, alpha, top_k, engine, fusion, corpus_version.get_version(namespace))
+    else:
+        namespace = tuple(sorted(namespaces))
+        key = (namespace, query, k, alpha, top_k, engine, fusion, corpus_version.get_versions(namespace))
+    cached = caches.results.lookup(key)
+    if cached is not None:
+        return list(cached)
+
+    if engine == "qdrant":
+        fused = await server_hybrid_search(query, namespace, k=k, alpha=alpha, top_k=top_k, fusion=fusion)
+        with telemetry.span("hydrate"):
+            fused = await asyncio.to_thread(chunk_store.hydrate, fused)
+        caches.results.store(key, fused)
+        return list(fused)
+
+    async def dense_branch():
+        qvec = await embed_query(query)  # micro-batched with concurrent requests
+        return await adense_search(qvec, namespace=namespace, k=k)
+
+    if isinstance(namespace, str):
+        bm25_branch = asyncio.to_thread(bm25_search, query, namespace, k)
+    else:
+        bm25_branch = abm25_search_many(query, namespace, k)
+    dense, bm25 = await asyncio.gather(dense_branch(), bm25_branch)
+    with telemetry.span("fuse"):
+        fused = fuse(dense, bm25, fusion, alpha, top_k)
+    with telemetry.span("hydrate"):
+        fused = await asyncio.to_thread(chunk_store.hydrate, fused)
+    caches.results.store(key, fused)
+    return list(fused)
+
+async def hybrid_retrieve_batch(
+    queries: List[str],
+    namespace: str,
+    k: int = 20,
+    alpha: float = 0.6,
+    top_k: int = 8,
+    engine: Optional[str] = None,
+    fusion: Optional[str] = None
+):
+    """
+    hybrid_retrieve for many queries at once (POST /search/batch); same
+    results per query, in input order. Uncached queries share one batched
+    embedding call, one Qdrant request for all dense (or server-side hybrid)
+    searches, one BM25 pass over a single corpus snapshot (a sparse
+    matrix-matrix product) and one chunk-store read for hydration.
+    """
+    engine = engine or DEFAULT_ENGINE
+    fusion = fusion or DEFAULT_FUSION
+    if engine == "qdrant" and not has_sparse_vectors():
+        engine = "local"
+    queries = [caches.normalize_query(q) for q in queries]
+    version = corpus_version.get_version(namespace)
+
+    def key(query):
+        return (namespace, query, k, alpha, top_k, engine, fusion, version)
+
+    results: Dict[str, List] = {}
+    for query in dict.fromkeys(queries):
+        cached = caches.results.lookup(key(query))
+        if cached is not None:
+            results[query] = cached
+    todo = [query for query in dict.fromkeys(queries) if query not in results]
+
+    if todo:
+        if engine == "qdrant":
+            qvecs = await embed_queries(todo)
+            fused_lists = await server_hybrid_search_batch(
+                todo, qvecs, namespace, k=k, alpha=alpha, top_k=top_k, fusion=fusion
+            )
+        else:
+            async def dense_branch():
+                return await adense_search_batch(await embed_queries(todo), namespace, k=k)
+
+            dense, bm25 = await asyncio.gather(
+                dense_branch(),
+                asyncio.to_thread(bm25_search_batch, todo, namespace, k),
+            )
+            with telemetry.span("fuse"):
+                fused_lists = [fuse(d, b, fusion, alpha, top_k) for d, b in zip(dense, bm25)]
+        with telemetry.span("hydrate"):
+            hydrated = await asyncio.to_thread(chunk_store.hydrate, [hit for fused in fused_lists for hit in fused])
+        start = 0
+        for query, fused in zip(todo, fused_lists):
+            results[query] = hydrated[start:start + len(fused)]
+            start += len(fused)
+            caches.results.store(key(query), results[query])
+    return [list(results[query]) for query in queries]
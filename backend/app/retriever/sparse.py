@@ -0,0 +1,56 @@
+# BM25 as Qdrant sparse vectors.
+#
+# Each point gets, next to its dense embedding, a sparse vector named
+# SPARSE_VECTOR whose entries are the BM25-saturated term frequencies of the
+# chunk (same tokenizer and k1/b as the local index). The collection declares
+# the sparse vector with the IDF modifier, so Qdrant multiplies in the IDF from
+# its own statistics; a query vector is just 1 per distinct query term, and the
+# sparse search score is BM25. With both vectors on the point, dense + keyword
+# retrieval and their fusion run server-side in a single query.
+
+import os
+import hashlib
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+
+from ..db.qdrant_client import rest
+
+from .bm25_engine import K1, B
+from .bm25_index import tokenize
+
+# Documents are chunks of ~600 words; a fixed average keeps point vectors
+# independent of the rest of the corpus (no rewrite when the corpus changes).
+SPARSE_AVGDL = float(os.getenv("SPARSE_AVGDL", "600"))
+
+@lru_cache(maxsize=1 << 16)
+def term_index(token: str) -> int:
+    """
+    Stable 32-bit sparse index of a token (no shared vocabulary needed).
+    """
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+def _to_sparse(weights: dict) -> "rest.SparseVector":
+    indices, values = [], []
+    for idx, w in sorted(weights.items()):
+        indices.append(idx)
+        values.append(float(w))
+    return rest.SparseVector(indices=indices, values=values)
+
+def doc_vector(text: str) -> Optional["rest.SparseVector"]:
+    tokens = tokenize(text or "")
+    if not tokens:
+        return None
+    norm = K1 * (1 - B + B * len(tokens) / SPARSE_AVGDL)
+    weights: dict = {}
+    for tok, tf in Counter(tokens).items():
+        idx = term_index(tok)
+        # hash collisions (rare) just add up, like a shared term would
+        weights[idx] = weights.get(idx, 0.0) + tf * (K1 + 1) / (tf + norm)
+    return _to_sparse(weights)
+
+def query_vector(text: str) -> Optional["rest.SparseVector"]:
+    tokens = tokenize(text or "")
+    if not tokens:
+        return None
+    return _to_sparse(Counter(term_index(tok) for tok in tokens))
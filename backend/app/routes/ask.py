@@ -1,77 +1,219 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, AsyncIterator, Literal, Optional, Tuple, Union
 
-from ..state.memory import add_turn, get_recent
+from ..state.memory import aadd_turn, aget_recent
 from .intent import detect_intent
-from ..ai.generator import generate_small_talk, generate_doc_answer
-from ..ai.embeddings import embed_texts
-from ..retriever.hybrid import dense_search, bm25_search, fuse_results
+from .disconnect import cancel_on_disconnect
+from ..ai.generator import agenerate_small_talk, agenerate_doc_answer, astream_doc_answer
+from ..ai.query_batcher import embed_query
+from ..ai.context_packer import pack_contexts
+from ..retriever.hybrid import hybrid_retrieve, namespace_list
+from ..state.answer_cache import answers
+from ..services.paths import InvalidNamespace, check_namespace, scope_label
+from ..services.telemetry import span, request_timings
 
 router = APIRouter(prefix="/ask", tags=["Ask"])
 
 class AskReq(BaseModel):
-    namespace: str
+    namespace: Union[str, List[str]]  # several: retrieve from all of them as one corpus
     question: str
     top_k: int = 4
     alpha: float = 0.6  # dense weight for fusion (0..1)
+    use_cache: bool = False  # serve/store DOC_QA answers from the semantic answer cache
+    engine: Optional[Literal["local", "qdrant"]] = None  # retrieval engine (default: RETRIEVAL_ENGINE)
+    fusion: Optional[Literal["weighted", "rrf", "dbsf"]] = None  # default: RETRIEVAL_FUSION
+    session_id: Optional[str] = Field(None, max_length=128)  # chat history scope (default: whole namespace)
 
-@router.post("/")
-def ask(req: AskReq) -> Dict[str, Any]:
-    ns = (req.namespace or "").strip()
+# What a question is asked over: one namespace, or a sorted tuple of several
+Scope = Union[str, Tuple[str, ...]]
+
+def _validate(req: AskReq):
+    namespaces = [ns.strip() for ns in namespace_list(req.namespace or "") if ns.strip()]
     q = (req.question or "").strip()
-    if not ns or not q:
+    if not namespaces or not q:
         raise HTTPException(status_code=400, detail="namespace and question are required.")
+    try:
+        for name in namespaces:
+            check_namespace(name)
+    except InvalidNamespace as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ns = namespaces[0] if len(namespaces) == 1 else tuple(sorted(set(namespaces)))
+    return ns, q
+
+def _label(ns: Scope) -> str:
+    """
+    Chat history and Gemini context caches are keyed by one string (see paths.scope_label).
+    """
+    return ns if isinstance(ns, str) else scope_label(ns)
+
+def _build_contexts(fused) -> List[Dict[str, Any]]:
+    """
+    Context pack for the prompt from the fused retrieval results: overlapping
+    chunks merged, repeated sentences dropped, within CONTEXT_TOKEN_BUDGET.
+    """
+    with span("pack_context"):
+        return pack_contexts(fused)
+
+async def _retrieve(req: AskReq, ns: Scope, q: str):
+    with span("retrieve"):
+        return await hybrid_retrieve(
+            q, ns, k=max(req.top_k, 20), alpha=req.alpha, top_k=req.top_k,
+            engine=req.engine, fusion=req.fusion
+        )
+
+def _context_ids(fused) -> List[str]:
+    return [pl.get("point_id") for pl, _score in fused]
+
+async def _cached_answer(req: AskReq, ns: Scope, q: str, fused):
+    """
+    (query vector, cache hit or None) when the request opted in, else (None, None).
+    The query vector usually comes straight from the query-vector cache.
+    """
+    if not req.use_cache:
+        return None, None
+    with span("answer_cache"):
+        qvec = await embed_query(q)
+        return qvec, answers.lookup(ns, qvec, _context_ids(fused))
+
+def _citations(contexts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Naive citation extraction from our own contexts list
+    (since we instructed the model to cite [filename (page X)], but we'll
+    also output our structured citations derived from contexts)
+    """
+    citations = []
+    for c in contexts:
+        label = c["filename"] + (f" (page {c['page']})" if c.get("page") else "")
+        citations.append({"label": label})
+    return citations
+
+@router.post("/")
+async def ask(req: AskReq, request: Request) -> Dict[str, Any]:
+    """
+    Async end to end; the work is cancelled if the client goes away.
+    """
+    return await cancel_on_disconnect(request, _answer(req))
+
+async def _answer(req: AskReq) -> Dict[str, Any]:
+    ns, q = _validate(req)
 
     # 1) Save user turn
-    add_turn(ns, "user", q)
+    await aadd_turn(_label(ns), "user", q, session_id=req.session_id)
 
     # 2) Intent route
     intent = detect_intent(q)
 
     if intent == "SMALL_TALK":
-        history = get_recent(ns, max_turns=5)
-        text = generate_small_talk(history, q)
-        add_turn(ns, "assistant", text)
+        history = await aget_recent(_label(ns), max_turns=5, session_id=req.session_id)
+        with span("generate"):
+            text = await agenerate_small_talk(history, q)
+        await aadd_turn(_label(ns), "assistant", text, session_id=req.session_id)
         return {
             "mode": "SMALL_TALK",
             "answer": text,
-            "citations": []
+            "citations": [],
+            "cached": False
         }
 
     # 3) DOC_QA path: retrieve, then generate grounded answer
-    # 3a) embed query once for dense search
-    qvec = embed_texts([q])[0]
-
-    # 3b) run dense + bm25; fuse
-    dense = dense_search(qvec, namespace=ns, k=max(req.top_k, 20))
-    bm25  = bm25_search(q, namespace=ns, k=max(req.top_k, 20))
-    fused = fuse_results(dense, bm25, alpha=req.alpha, top_k=req.top_k)
+    # 3a+3b) embed + dense search and bm25 run concurrently; fuse
+    fused = await _retrieve(req, ns, q)
 
     # 3c) prepare context pack for the prompt
-    contexts = []
-    for pl, _score in fused:
-        contexts.append({
-            "text": pl.get("text", ""),
-            "filename": pl.get("filename"),
-            "page": pl.get("page")
-        })
-
-    # 3d) generate grounded answer
-    history = get_recent(ns, max_turns=5)
-    text = generate_doc_answer(history, q, contexts)
-
-    # 3e) naive citation extraction from our own contexts list
-    # (since we instructed the model to cite [filename (page X)], but we'll
-    # also output our structured citations derived from contexts)
-    citations = []
-    for c in contexts:
-        label = c["filename"] + (f" (page {c['page']})" if c.get("page") else "")
-        citations.append({"label": label})
+    contexts = _build_contexts(fused)
+
+    # 3d) same question (or a paraphrase) over the same context answered before?
+    qvec, hit = await _cached_answer(req, ns, q, fused)
+    if hit is not None:
+        await aadd_turn(_label(ns), "assistant", hit["answer"], session_id=req.session_id)
+        return {
+            "mode": "DOC_QA",
+            "answer": hit["answer"],
+            "citations": hit["citations"],
+            "cached": True
+        }
 
-    add_turn(ns, "assistant", text)
+    # 3e) generate grounded answer
+    history = await aget_recent(_label(ns), max_turns=5, session_id=req.session_id)
+    with span("generate"):
+        text = await agenerate_doc_answer(history, q, contexts, namespace=_label(ns))
+
+    # 3f) structured citations
+    citations = _citations(contexts)
+    if qvec is not None:
+        answers.store(ns, qvec, _context_ids(fused), text, citations)
+
+    await aadd_turn(_label(ns), "assistant", text, session_id=req.session_id)
     return {
         "mode": "DOC_QA",
         "answer": text,
-        "citations": citations
+        "citations": citations,
+        "cached": False
     }
+
+# --- Streaming (Server-Sent Events) ---
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _answer_events(req: AskReq, ns: Scope, q: str) -> AsyncIterator[str]:
+    """
+    Event order: 'citations' (as soon as retrieval is fused; flags 'cached'),
+    then one 'token' per generated piece, then 'done' with the full answer and
+    per-stage timings (ms). Errors after the stream started are reported as
+    an 'error' event.
+    """
+    await aadd_turn(_label(ns), "user", q, session_id=req.session_id)
+    parts: List[str] = []
+    try:
+        if detect_intent(q) == "SMALL_TALK":
+            history = await aget_recent(_label(ns), max_turns=5, session_id=req.session_id)
+            yield _sse("citations", {"mode": "SMALL_TALK", "citations": [], "cached": False})
+            with span("generate"):
+                text = await agenerate_small_talk(history, q)
+            parts.append(text)
+            yield _sse("token", {"text": text})
+        else:
+            fused = await _retrieve(req, ns, q)
+            contexts = _build_contexts(fused)
+            qvec, hit = await _cached_answer(req, ns, q, fused)
+            if hit is not None:
+                # Cached: original citations, whole answer as one token
+                yield _sse("citations", {"mode": "DOC_QA", "citations": hit["citations"], "cached": True})
+                parts.append(hit["answer"])
+                yield _sse("token", {"text": hit["answer"]})
+            else:
+                citations = _citations(contexts)
+                yield _sse("citations", {"mode": "DOC_QA", "citations": citations, "cached": False})
+
+                history = await aget_recent(_label(ns), max_turns=5, session_id=req.session_id)
+                with span("generate"):
+                    async for piece in astream_doc_answer(history, q, contexts, namespace=_label(ns)):
+                        parts.append(piece)
+                        yield _sse("token", {"text": piece})
+                if qvec is not None and parts:
+                    answers.store(ns, qvec, _context_ids(fused), "".join(parts).strip(), citations)
+        # Server-Timing went out with the headers; the stream reports its stages here
+        yield _sse("done", {"answer": "".join(parts).strip(), "timings": request_timings()})
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+    finally:
+        # Runs on normal end and when the client disconnects mid-stream
+        if parts:
+            await aadd_turn(_label(ns), "assistant", "".join(parts).strip(), session_id=req.session_id)
+
+@router.post("/stream")
+async def ask_stream(req: AskReq):
+    """
+    Same as POST /ask, streamed: citations first, then answer tokens as
+    Gemini produces them (text/event-stream).
+    """
+    ns, q = _validate(req)
+    return StreamingResponse(
+        _answer_events(req, ns, q),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, Query
+from ..state import caches
+from ..state.answer_cache import answers
+from ..ai.query_batcher import batcher_stats
+from ..ai import context_cache
+
+router = APIRouter(prefix="/cache", tags=["Cache"])
+
+@router.get("/")
+def cache_stats():
+    """
+    Hit rate, size, evictions and expirations of this worker's request caches,
+    the semantic answer cache, Gemini context caching, and how well query
+    embeddings are being batched.
+    """
+    return {
+        **caches.all_stats(),
+        "answers": answers.stats(),
+        "gemini_contexts": context_cache.stats(),
+        "query_batching": batcher_stats(),
+    }
+
+@router.delete("/")
+def clear_caches(namespace: Optional[str] = Query(None, description="Only drop this namespace's cached answers")):
+    if namespace:
+        answers.invalidate(namespace)
+        return {"cleared": True, "namespace": namespace}
+    caches.clear_all()
+    answers.reset()
+    return {"cleared": True}
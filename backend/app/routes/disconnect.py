@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Awaitable
+
+from fastapi import HTTPException, Request
+
+# How often we check whether the client is still there.
+POLL_SECONDS = 0.25
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Run `work`, but cancel it as soon as the client disconnects, so an abandoned
+    /ask does not keep embedding, searching and generating for nobody.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                # 499: nginx's "client closed request"; nobody will read it anyway
+                raise HTTPException(status_code=499, detail="Client disconnected.")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -1,11 +1,32 @@
 from fastapi import APIRouter, HTTPException, Query
-from ..services.indexer import index_namespace
+from ..services import jobs
 
 router = APIRouter(prefix="/index", tags=["Indexing"])
 
-@router.post("/")
+@router.post("/", status_code=202)
 def index_now(namespace: str = Query(..., description="Namespace to index")):
+    """
+    Queue a background index job (one at a time per namespace) and return it.
+    Poll GET /index/jobs/{id} for progress; the summary lands in job['summary'].
+    """
     if not namespace.strip():
         raise HTTPException(status_code=400, detail="Namespace required")
-    summary = index_namespace(namespace=namespace)
-    return summary
+    return jobs.submit(namespace)
+
+@router.get("/jobs")
+def list_index_jobs(namespace: str = Query(None, description="Only jobs of this namespace")):
+    return {"jobs": jobs.list_jobs(namespace)}
+
+@router.get("/jobs/{job_id}")
+def get_index_job(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.delete("/jobs/{job_id}")
+def cancel_index_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,7 +1,9 @@
 import os
+from itertools import islice
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
-from ..services.ingest import file_to_chunks
+from ..services.ingest import load_text, iter_chunks, count_chunks
+from ..services.paths import uploads_dir
 
 router = APIRouter(prefix="/ingest", tags=["Ingest"])
 
@@ -11,25 +13,27 @@ def preview_chunks(
     filename: str = Query(..., description="A file name inside the namespace folder"),
     limit: int = Query(3, ge=1, le=10)
 ):
-    folder = os.path.join("backend", "app", "uploads", namespace)
+    folder = uploads_dir(namespace)
     path = os.path.join(folder, filename)
 
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File not found in this namespace")
 
-    chunks = file_to_chunks(path, namespace)
+    # Parsed once per file content (text cache); afterwards only chunking runs,
+    # and only up to `limit` chunks
+    doc = load_text(path)
     # only return first few snippets to keep response small
     preview = [
         {
             "text": c.text[:240] + ("..." if len(c.text) > 240 else ""),
             "metadata": c.metadata.model_dump()
         }
-        for c in chunks[:limit]
+        for c in islice(iter_chunks(path, namespace, doc=doc), limit)
     ]
 
     return {
         "namespace": namespace,
         "filename": filename,
-        "total_chunks": len(chunks),
+        "total_chunks": count_chunks(doc),
         "preview": preview
     }
@@ -1,32 +1,20 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, Any
-from ..ai.embeddings import embed_texts
-from ..retriever.hybrid import dense_search, bm25_search, fuse_results
+import os
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, Any, List, Literal, Optional, Union
+from ..retriever.hybrid import hybrid_retrieve, hybrid_retrieve_batch, namespace_list
+from ..services.paths import check_namespace
+from .disconnect import cancel_on_disconnect
 
 router = APIRouter(prefix="/search", tags=["Search"])
 
-@router.get("/")
-def search(
-    namespace: str = Query(...),
-    q: str = Query(..., min_length=2),
-    k: int = Query(8, ge=1, le=20),
-    alpha: float = Query(0.6, ge=0.0, le=1.0)
-) -> Dict[str, Any]:
+# Most queries one POST /search/batch may carry
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "1000"))
+
+def _shape(query: str, namespace: Union[str, List[str]], alpha: float, fused) -> Dict[str, Any]:
     """
-    Returns fused retrieval results for a query.
-    - alpha controls weight: 1.0 = all dense, 0.0 = all BM25.
+    Response of one search (snippet previews of the fused results).
     """
-    # 1) Embed query once for dense search
-    qvec = embed_texts([q])[0]
-
-    # 2) Run both searches
-    d = dense_search(qvec, namespace=namespace, k=max(k, 20))
-    b = bm25_search(q, namespace=namespace, k=max(k, 20))
-
-    # 3) Fuse and trim
-    fused = fuse_results(d, b, alpha=alpha, top_k=k)
-
-    # 4) Shape response (snippet preview)
     items = []
     for pl, s in fused:
         snippet = pl.get("text", "")
@@ -39,8 +27,67 @@ def search(
         })
 
     return {
-        "query": q,
+        "query": query,
         "namespace": namespace,
         "alpha": alpha,
         "results": items
     }
+
+@router.get("/")
+async def search(
+    request: Request,
+    namespace: List[str] = Query(..., description="Repeat to search several namespaces at once"),
+    q: str = Query(..., min_length=2),
+    k: int = Query(8, ge=1, le=20),
+    alpha: float = Query(0.6, ge=0.0, le=1.0),
+    engine: Optional[Literal["local", "qdrant"]] = Query(None, description="Default: RETRIEVAL_ENGINE"),
+    fusion: Optional[Literal["weighted", "rrf", "dbsf"]] = Query(None, description="Default: RETRIEVAL_FUSION")
+) -> Dict[str, Any]:
+    """
+    Returns fused retrieval results for a query.
+    - alpha controls weight: 1.0 = all dense, 0.0 = all BM25 (fusion='weighted').
+    - engine='qdrant' runs dense + sparse BM25 and the fusion inside Qdrant.
+    - several namespaces (?namespace=a&namespace=b) are searched as one
+      corpus: one top k over all of them, each result names its namespace.
+    """
+    namespaces = [check_namespace(ns) for ns in namespace_list(namespace)]
+    target = namespaces[0] if len(namespaces) == 1 else namespaces
+
+    # 1-3) Embed + dense search and BM25 concurrently, then fuse and trim
+    fused = await cancel_on_disconnect(
+        request,
+        hybrid_retrieve(q, target, k=max(k, 20), alpha=alpha, top_k=k, engine=engine, fusion=fusion)
+    )
+
+    # 4) Shape response (snippet preview)
+    return _shape(q, target, alpha, fused)
+
+class SearchBatchReq(BaseModel):
+    namespace: str
+    queries: List[Annotated[str, Field(min_length=2)]] = Field(..., min_length=1)
+    k: int = Field(8, ge=1, le=20)
+    alpha: float = Field(0.6, ge=0.0, le=1.0)  # dense weight for fusion (0..1)
+    engine: Optional[Literal["local", "qdrant"]] = None  # default: RETRIEVAL_ENGINE
+    fusion: Optional[Literal["weighted", "rrf", "dbsf"]] = None  # default: RETRIEVAL_FUSION
+
+@router.post("/batch")
+async def search_batch(req: SearchBatchReq, request: Request) -> Dict[str, Any]:
+    """
+    Many searches over one namespace in one call (evaluation jobs,
+    integrations). The queries are embedded in one batched call and searched
+    in one Qdrant request; BM25 scores them all against the same corpus
+    snapshot. `results` holds one GET /search response per query, in order.
+    """
+    if len(req.queries) > SEARCH_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {SEARCH_BATCH_MAX} queries per batch.")
+    fused_lists = await cancel_on_disconnect(
+        request,
+        hybrid_retrieve_batch(
+            req.queries, req.namespace, k=max(req.k, 20), alpha=req.alpha, top_k=req.k,
+            engine=req.engine, fusion=req.fusion
+        )
+    )
+    return {
+        "namespace": req.namespace,
+        "results": [_shape(q, req.namespace, req.alpha, fused) for q, fused in zip(req.queries, fused_lists)]
+    }
@@ -1,43 +1,87 @@
 import os
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Request
+from ..services.paths import InvalidNamespace, check_namespace, uploads_dir
+from ..services.manifest import claim_upload
+from ..services.uploads import receive_upload, UploadTooLarge
+from ..services.telemetry import span
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
-@router.post("/")
-async def upload_files(
-    files: List[UploadFile] = File(...),
-    namespace: str = Form("default")
-):
-    if not files:
+# The body is parsed by hand (see services/uploads.py), so describe the form for the docs
+_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "namespace": {"type": "string", "default": "default"},
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    },
+                }
+            }
+        },
+    }
+}
+
+@router.post("/", openapi_extra=_FORM_SCHEMA)
+async def upload_files(request: Request):
+    """
+    Files are streamed to disk in fixed-size blocks and hashed while they are
+    written; content already present in the namespace is not stored twice.
+    """
+    try:
+        with span("upload_receive"):
+            form = await receive_upload(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    namespace = (form.fields.get("namespace") or "default").strip() or "default"
+    try:
+        check_namespace(namespace)
+    except InvalidNamespace as e:
+        form.discard()
+        raise HTTPException(status_code=400, detail=str(e))
+    if not form.files:
         raise HTTPException(status_code=400, detail="No files provided.")
 
     # Make directory for this namespace
-    folder = os.path.join("backend", "app", "uploads", namespace)
+    folder = uploads_dir(namespace)
     os.makedirs(folder, exist_ok=True)
 
-    saved_files = []
-    for file in files:
-        if not file.filename.lower().endswith((".pdf", ".txt", ".md", ".docx")):
-            continue  # skip unsupported types
-
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        filepath = os.path.join(folder, filename)
+    saved_files, skipped_files = [], []
+    try:
+        with span("upload_store"):  # dedupe + move into the namespace
+            for part in form.files:
+                if not part.allowed:
+                    continue  # skip unsupported types
 
-        with open(filepath, "wb") as f:
-            f.write(await file.read())
+                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{part.filename}"
+                existing = claim_upload(namespace, folder, part.sha256, filename)
+                if existing:
+                    part.discard()
+                    skipped_files.append({"filename": part.filename, "reason": "duplicate", "existing": existing})
+                    continue
 
-        saved_files.append({
-            "filename": filename,
-            "size_kb": round(os.path.getsize(filepath) / 1024, 2)
-        })
+                os.replace(part.path, os.path.join(folder, filename))
+                saved_files.append({
+                    "filename": filename,
+                    "size_kb": round(part.size / 1024, 2)
+                })
+    finally:
+        form.discard()  # whatever was not moved into the namespace
 
-    if not saved_files:
+    if not saved_files and not skipped_files:
         raise HTTPException(status_code=400, detail="No valid files uploaded (PDF, TXT, MD, docx only).")
 
     return {
         "namespace": namespace,
         "files_saved": saved_files,
+        "files_skipped": skipped_files,
         "count": len(saved_files)
     }
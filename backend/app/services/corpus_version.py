@@ -0,0 +1,39 @@
+# Per-namespace corpus version: a counter in data/<namespace>/corpus_version that
+# index_namespace bumps whenever it writes points (upserts, deletes, BM25
+# updates). Anything derived from a namespace's search results (result caches)
+# keys on it, so cached entries from before a write are simply never hit again.
+# It's a file so every uvicorn worker sees bumps made by the one indexing.
+
+import os
+from typing import Sequence, Tuple
+
+import portalocker
+
+from .paths import data_dir, data_path
+
+def _version_path(namespace: str) -> str:
+    # Read on every search: a path only, the folder is made by bump()
+    return data_path(namespace, "corpus_version")
+
+def get_version(namespace: str) -> int:
+    try:
+        with open(_version_path(namespace), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def get_versions(namespaces: Sequence[str]) -> Tuple[int, ...]:
+    """
+    Versions of several namespaces searched together (one changes -> the tuple changes).
+    """
+    return tuple(get_version(ns) for ns in namespaces)
+
+def bump(namespace: str) -> int:
+    path = os.path.join(data_dir(namespace), "corpus_version")
+    with portalocker.Lock(path + ".lock", timeout=10):
+        version = get_version(namespace) + 1
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(tmp, path)
+    return version
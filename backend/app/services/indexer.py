@@ -1,81 +1,218 @@
 import os
 import glob
-import uuid
-from typing import List
-from qdrant_client.models import PointStruct
-from ..db.qdrant_client import client, COLLECTION_NAME
-from ..ai.embeddings import embed_texts
-from .ingest import file_to_chunks
+import time
+import threading
+from typing import Callable, List, Optional
+from ..db.qdrant_client import rest, get_client, COLLECTION_NAME, SPARSE_VECTOR, has_sparse_vectors
+from ..db import chunk_store
+from .pipeline import IndexPipeline
+from .paths import uploads_dir, data_dir
+from .manifest import load_manifest, save_manifest, plan_changes, make_entry
+from . import corpus_version, telemetry
+from ..retriever import bm25_index, sparse
+from ..retriever.hybrid import ensure_bm25_index
+
+# How often a long run persists its finished files (see index_namespace)
+CHECKPOINT_SECONDS = float(os.getenv("INDEX_CHECKPOINT_SECONDS", "30"))
 
 def list_namespace_files(namespace: str) -> List[str]:
     """
     Returns absolute paths of files saved under uploads/<namespace>/...
     """
-    base = os.path.join("backend", "app", "uploads", namespace)
+    base = uploads_dir(namespace)
     if not os.path.isdir(base):
         return []
     return glob.glob(os.path.join(base, "*"))
 
-def chunks_to_points(texts: List[str], payloads: List[dict]) -> List[PointStruct]:
+def _delete_legacy_points(namespace: str) -> bool:
+    """
+    Points written before IDs were deterministic have no 'point_id' in their
+    payload; drop them so a re-index does not leave duplicates behind, along
+    with the texts ensure_bm25_index copied into the chunk store for them.
+    Returns whether the namespace had any (per its BM25 index).
     """
-    Convert a batch of texts into vectors + PointStructs for Qdrant.
+    get_client().delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=rest.FilterSelector(filter=rest.Filter(
+            must=[
+                rest.FieldCondition(key="namespace", match=rest.MatchValue(value=namespace)),
+                rest.IsEmptyCondition(is_empty=rest.PayloadField(key="point_id")),
+            ]
+        )),
+    )
+    snap = bm25_index.get_snapshot(namespace)
+    if snap is not None:
+        legacy = [pid for pid, pl in zip(snap.ids, snap.payloads) if not pl.get("point_id")]
+        if legacy:
+            bm25_index.delete_documents(namespace, legacy)
+            chunk_store.delete_many(legacy)
+            return True
+    return False
+
+def delete_points(namespace: str, ids: List[str], batch_size: int = 1000):
     """
-    vectors = embed_texts(texts)  # -> List[List[float]] (768-dim)
-    points: List[PointStruct] = []
-    for vec, pl in zip(vectors, payloads):
-        points.append(
-            PointStruct(
-                id=str(uuid.uuid4()),  # random stable-ish ID
-                vector=vec,
-                payload=pl
-            )
+    Bulk-delete points by ID from Qdrant and their texts from the chunk store
+    (the BM25 index is updated by the caller).
+    """
+    for i in range(0, len(ids), batch_size):
+        get_client().delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=rest.PointIdsList(points=ids[i:i + batch_size]),
         )
-    return points
+    chunk_store.delete_many(ids)
 
-def index_namespace(namespace: str, batch_size: int = 32) -> dict:
+def backfill_sparse_vectors(namespace: str, batch_size: int = 256) -> int:
     """
-    For every file in a namespace:
-      - build chunks with metadata
-      - embed in batches
-      - upsert into Qdrant
-    Returns a small summary (files, chunks, points).
+    Add BM25 sparse vectors to points indexed before the collection had them,
+    from the chunk texts we already have (no re-embedding). Runs once per
+    namespace (marker file); returns how many points were updated.
     """
+    marker = os.path.join(data_dir(namespace), "sparse_vectors")
+    if not has_sparse_vectors() or os.path.exists(marker):
+        return 0
+    snap = bm25_index.get_snapshot(namespace)
+    updated = 0
+    if snap is not None:
+        texts = chunk_store.get_many(list(snap.ids))
+        batch = []
+        for pid, pl in zip(snap.ids, snap.payloads):
+            svec = sparse.doc_vector(texts.get(pid) or pl.get("text", ""))
+            if svec is not None:
+                batch.append(rest.PointVectors(id=pid, vector={SPARSE_VECTOR: svec}))
+            if len(batch) >= batch_size:
+                get_client().update_vectors(collection_name=COLLECTION_NAME, points=batch)
+                updated += len(batch)
+                batch = []
+        if batch:
+            get_client().update_vectors(collection_name=COLLECTION_NAME, points=batch)
+            updated += len(batch)
+    open(marker, "w").close()
+    return updated
+
+def index_namespace(
+    namespace: str,
+    batch_size: int = 32,
+    progress: Optional[Callable[[dict], None]] = None,
+    should_cancel: Optional[Callable[[], bool]] = None
+) -> dict:
+    """
+    Incrementally index a namespace using its file manifest:
+      - new or changed files go through the staged pipeline (parallel
+        extraction, concurrent embedding, batched upserts; see pipeline.py)
+      - points a changed file no longer produces, and all points of removed
+        files, are bulk-deleted
+      - unchanged files are skipped without being re-read
+      - the local BM25 index gets upserts + deletes in as few updates as possible
+    Point IDs are deterministic and embeddings cached, so even a re-processed
+    file only pays for chunks whose text actually changed.
+
+    Finished files are checkpointed (Qdrant deletes, BM25 index, manifest)
+    every CHECKPOINT_SECONDS and when the run stops for any reason, so a
+    cancelled, failed or interrupted run resumes where it left off.
+    `progress(counters)` is called as work completes; `should_cancel()` is polled.
+    Returns a summary of files added/updated/skipped/deleted and work done.
+    """
+    started = time.monotonic()
     files = list_namespace_files(namespace)
-    total_chunks = 0
-    total_points = 0
-
-    for path in files:
-        # Build structured chunks (Story 3)
-        chunks = file_to_chunks(path, namespace)
-        if not chunks:
-            continue
-
-        # Batch by texts and payloads for efficient embedding/upsert
-        batch_texts, batch_payloads = [], []
-        for ch in chunks:
-            batch_texts.append(ch.text)
-            payload = ch.metadata.model_dump()
-            payload["text"] = ch.text  # store text for retrieval + snippets
-            batch_payloads.append(payload)
-
-            # When batch is full, embed + upsert
-            if len(batch_texts) >= batch_size:
-                pts = chunks_to_points(batch_texts, batch_payloads)
-                client.upsert(collection_name=COLLECTION_NAME, points=pts)
-                total_points += len(pts)
-                batch_texts, batch_payloads = [], []
-
-        # Flush any remainder
-        if batch_texts:
-            pts = chunks_to_points(batch_texts, batch_payloads)
-            client.upsert(collection_name=COLLECTION_NAME, points=pts)
-            total_points += len(pts)
-
-        total_chunks += len(chunks)
+    manifest = load_manifest(namespace)
+    plan = plan_changes(manifest, files)
+
+    if _delete_legacy_points(namespace):
+        corpus_version.bump(namespace)
+
+    lock = threading.RLock()
+    pending_deletes: List[str] = []
+    deleted_total = [0]
+    last_checkpoint = [time.monotonic()]
+    upserted_seen = [0]
+
+    # Removed files: drop everything they produced
+    for name in plan["deleted"]:
+        pending_deletes.extend(manifest.pop(name)["point_ids"])
+
+    todo = plan["added"] + plan["updated"]
+    file_stat = {name: stat for name, _path, stat in todo}
+
+    def counters() -> dict:
+        return {
+            "files_total": len(todo),
+            "files_done": pipe.files_done,
+            "chunks_total": pipe.total_chunks,   # extracted so far
+            "chunks_done": pipe.total_points,    # upserted so far
+            **pipe.stats
+        }
+
+    def checkpoint():
+        # Make Qdrant, the BM25 index and the manifest agree on everything finished so far
+        with lock, telemetry.span("index_checkpoint"):
+            dels, pending_deletes[:] = pending_deletes[:], []
+            docs, pipe.bm25_docs[:] = pipe.bm25_docs[:], []
+            delete_points(namespace, dels)
+            deleted_total[0] += len(dels)
+            # Each update bumps the version stamp so every worker reloads the index
+            if bm25_index.exists(namespace):
+                bm25_index.update(namespace, upserts=docs, delete_ids=dels)
+                snap = bm25_index.get_snapshot(namespace)
+                if snap is not None:
+                    telemetry.CORPUS_CHUNKS.labels(namespace).set(len(snap))
+            else:
+                ensure_bm25_index(namespace)  # first build pulls the whole namespace once
+            save_manifest(namespace, manifest)
+            if dels or docs:
+                corpus_version.bump(namespace)  # invalidates cached search results
+            last_checkpoint[0] = time.monotonic()
+
+    def file_done(name: str):
+        with lock:
+            new_ids = pipe.file_ids.get(name, [])
+            # A shrunk file leaves trailing chunk IDs behind
+            old_ids = manifest.get(name, {}).get("point_ids", [])
+            keep = set(new_ids)
+            pending_deletes.extend(pid for pid in old_ids if pid not in keep)
+            manifest[name] = make_entry(file_stat[name], new_ids)
+            if time.monotonic() - last_checkpoint[0] >= CHECKPOINT_SECONDS:
+                checkpoint()
+
+    def report():
+        # Called after every upsert flush: if Qdrant changed, results cached
+        # for the previous version must not be served anymore
+        if pipe.total_points != upserted_seen[0]:
+            upserted_seen[0] = pipe.total_points
+            corpus_version.bump(namespace)
+        if progress is not None:
+            progress(counters())
+
+    # Extract, embed and upsert the new/changed files concurrently
+    pipe = IndexPipeline(
+        namespace,
+        batch_size=batch_size,
+        on_file_done=file_done,
+        on_progress=report,
+        should_cancel=should_cancel,
+    )
+    try:
+        pipe.run([(name, path, stat[2]) for name, path, stat in todo])
+    except BaseException:
+        checkpoint()  # keep finished files so the next run skips them
+        raise
+    checkpoint()
+    if backfill_sparse_vectors(namespace):  # no-op once done
+        corpus_version.bump(namespace)
+    report()
+    if pipe.total_points:
+        telemetry.INDEX_CHUNKS_PER_SECOND.labels(namespace).set(
+            pipe.total_points / max(time.monotonic() - started, 1e-6)
+        )
 
     return {
         "namespace": namespace,
-        "files_indexed": len(files),
-        "chunks_processed": total_chunks,
-        "points_upserted": total_points
+        "files_indexed": len(todo),
+        "files_added": len(plan["added"]),
+        "files_updated": len(plan["updated"]),
+        "files_skipped": len(plan["skipped"]),
+        "files_deleted": len(plan["deleted"]),
+        "chunks_processed": pipe.total_chunks,
+        "points_upserted": pipe.total_points,
+        "points_deleted": deleted_total[0],
+        **pipe.stats
     }
@@ -1,20 +1,56 @@
 import os
-from typing import List, Iterable, Tuple
-from pypdf import PdfReader
-from . import text_utils
-from docx import Document
+import re
+import multiprocessing
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Iterable, Iterator, NamedTuple, Optional, Tuple
+from . import text_utils, text_cache
+from .manifest import hash_file
+from .lazy import LazyModule
 from ..models.types import Chunk, ChunkMetadata
 
+# Parsers are imported when the first PDF / DOCX is read
+pypdf = LazyModule("pypdf")
+docx = LazyModule("docx")
+
+# Large PDFs are split into page ranges parsed by separate processes
+PDF_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+
 # ---------- TEXT EXTRACTION ----------
 
-def extract_text_from_pdf(path: str) -> Iterable[Tuple[int, str]]:
+def _extract_pdf_range(path: str, start: int, stop: int) -> List[str]:
+    """
+    Worker: texts of pages [start, stop). Each worker opens its own reader.
+    """
+    reader = pypdf.PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+def extract_text_from_pdf(path: str, workers: int = PDF_WORKERS) -> Iterable[Tuple[int, str]]:
     """
-    Yields (page_index, page_text) for each page.
-    Using a generator avoids loading the whole file into RAM.
+    Yields (page_index, page_text) for each page, in order.
+    Small PDFs are read page by page in this process; from PDF_PARALLEL_MIN_PAGES
+    on, contiguous page ranges are extracted by a process pool (text extraction
+    is pure-Python and CPU bound, so threads would not help).
     """
-    reader = PdfReader(path)
-    for i, page in enumerate(reader.pages):
-        yield i, (page.extract_text() or "")
+    reader = pypdf.PdfReader(path)
+    n_pages = len(reader.pages)
+    if workers <= 1 or n_pages < PDF_PARALLEL_MIN_PAGES:
+        for i, page in enumerate(reader.pages):
+            yield i, (page.extract_text() or "")
+        return
+
+    # A few ranges per worker so one slow (image-heavy) range doesn't stall the rest
+    n_ranges = min(n_pages, workers * 4)
+    step = -(-n_pages // n_ranges)
+    ranges = [(s, min(s + step, n_pages)) for s in range(0, n_pages, step)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=ctx) as pool:
+        futures = [pool.submit(_extract_pdf_range, path, start, stop) for start, stop in ranges]
+        for (start, _stop), fut in zip(ranges, futures):
+            for offset, text in enumerate(fut.result()):
+                yield start + offset, text
 
 def extract_text_from_txt(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
@@ -28,87 +64,177 @@ def extract_text_from_docx(path: str) -> str:
     """
     Extracts all text from a DOCX file.
     """
-    doc = Document(path)
+    doc = docx.Document(path)
     paragraphs = [para.text for para in doc.paragraphs]
     return "\n".join(paragraphs)
 
+def extract_pages(path: str, sha: Optional[str] = None, pdf_workers: int = PDF_WORKERS) -> text_cache.Pages:
+    """
+    Whitespace-normalized, non-empty (page_index, text) pairs of a file; PDFs
+    have one entry per page, other types a single (None, text) entry.
+    Served from the extracted-text cache when this content was parsed before.
+    `sha` can be passed when the caller already hashed the file.
+    """
+    sha = sha or hash_file(path)
+    pages = text_cache.get(sha)
+    if pages is not None:
+        return pages
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        raw_pages = extract_text_from_pdf(path, workers=pdf_workers)
+    elif ext == ".txt":
+        raw_pages = [(None, extract_text_from_txt(path))]
+    elif ext == ".md":
+        raw_pages = [(None, extract_text_from_md(path))]
+    elif ext == ".docx":
+        raw_pages = [(None, extract_text_from_docx(path))]
+    else:
+        # Ignore unsupported types; your upload endpoint already filters types
+        return []
+
+    pages = []
+    for page_idx, page_text in raw_pages:
+        clean = text_utils.normalize_whitespace(page_text)
+        if clean:
+            pages.append((page_idx, clean))
+    text_cache.put(sha, pages)
+    return pages
+
+class DocumentText(NamedTuple):
+    """
+    A file's normalized text as one buffer: pages joined by a single space.
+    page_starts[i] is the offset where pages[i] (0-based PDF page index, or
+    None for non-PDF files) begins.
+    """
+    text: str
+    page_starts: List[int]
+    pages: List[Optional[int]]
+
+    def page_at(self, offset: int) -> Optional[int]:
+        if not self.pages:
+            return None
+        return self.pages[max(0, bisect_right(self.page_starts, offset) - 1)]
+
+def load_text(path: str, sha: Optional[str] = None, pdf_workers: int = PDF_WORKERS) -> DocumentText:
+    pages = extract_pages(path, sha=sha, pdf_workers=pdf_workers)
+    starts, pos = [], 0
+    for _idx, text in pages:
+        starts.append(pos)
+        pos += len(text) + 1
+    # A single page (TXT/MD/DOCX) is returned as-is by join: no copy
+    return DocumentText(" ".join(text for _idx, text in pages), starts, [idx for idx, _text in pages])
+
 # ---------- CHUNKING ----------
 
-def chunk_text(
+MAX_WORDS = 600
+OVERLAP_WORDS = 80
+
+@lru_cache(maxsize=16)
+def _skip_words(k: int):
+    # On single-space-separated text, matches k words with their trailing
+    # spaces: .end() is where word k starts. Runs in the regex engine (C),
+    # without a Python object per word.
+    return re.compile(r"(?:[^ ]+ ){%d}" % k)
+
+def iter_windows(
     text: str,
-    max_words: int = 600,
-    overlap_words: int = 80
-) -> List[str]:
+    max_words: int = MAX_WORDS,
+    overlap_words: int = OVERLAP_WORDS
+) -> Iterator[Tuple[int, int]]:
     """
-    Splits text into overlapping windows to preserve context across boundaries.
+    Yields (start, end) character offsets of overlapping word windows over a
+    whitespace-normalized buffer; text[start:end] is the chunk.
     - max_words: approx size per chunk
     - overlap_words: number of words repeated between chunks to avoid 'cut-off' loss
+    The last window ends at the end of the text (no trailing windows that are
+    already contained in the previous one).
     """
-    words = text_utils.to_words(text)
-    chunks = []
-    i = 0
-    while i < len(words):
-        window = words[i:i + max_words]
-        if not window:
+    # move forward by (max - overlap) so we keep overlap; the window end is
+    # found from there, so every character is scanned ~max/step times, not twice
+    step_re, tail_re = _skip_words(max_words - overlap_words), _skip_words(overlap_words)
+    pos, n = 0, len(text)
+    while pos < n:
+        step = step_re.match(text, pos)
+        tail = tail_re.match(text, step.end()) if step else None
+        if tail is None:
+            yield pos, n
             break
-        chunks.append(" ".join(window))
-        # move forward by (max - overlap) so we keep overlap
-        i += max_words - overlap_words
-    return chunks
+        yield pos, tail.end() - 1
+        pos = step.end()
 
-# ---------- HIGH-LEVEL: FILE -> CHUNKS ----------
+def chunk_text(
+    text: str,
+    max_words: int = MAX_WORDS,
+    overlap_words: int = OVERLAP_WORDS
+) -> List[str]:
+    """
+    Splits text into overlapping windows to preserve context across boundaries.
+    """
+    clean = text_utils.normalize_whitespace(text)
+    return [clean[s:e] for s, e in iter_windows(clean, max_words, overlap_words)]
 
-def file_to_chunks(path: str, namespace: str) -> List[Chunk]:
+def count_chunks(doc: DocumentText) -> int:
     """
-    Detects file type, extracts text, splits into chunks,
-    returns a list of Chunk(text + metadata).
+    Number of chunks iter_chunks() yields for this document, without building them.
     """
-    filename = os.path.basename(path).strip()
-    ext = os.path.splitext(filename)[1].lower()
-    source = path
+    return sum(1 for _ in iter_windows(doc.text))
 
-    all_chunks: List[Chunk] = []
+# ---------- HIGH-LEVEL: FILE -> CHUNKS ----------
 
-    if ext == ".pdf":
-        # Create chunks page-by-page so we can keep precise page metadata
-        for page_idx, page_text in extract_text_from_pdf(path):
-            # Clean page text a bit
-            clean = text_utils.normalize_whitespace(page_text)
-            if not clean.strip():
-                continue
-            for piece in chunk_text(clean):
-                all_chunks.append(Chunk(
-                    text=piece,
-                    metadata=ChunkMetadata(
-                        filename=filename,
-                        namespace=namespace,
-                        page=page_idx + 1,  # 1-based page number
-                        section=None,
-                        source=source
-                    )
-                ))
-    elif ext in (".txt", ".md", ".docx"):
-        if ext == ".txt":
-            raw = extract_text_from_txt(path)
-        elif ext == ".md":
-            raw = extract_text_from_md(path)
-        else:  # .docx
-            raw = extract_text_from_docx(path)
-        clean = text_utils.normalize_whitespace(raw)
-        if clean.strip():
-            for piece in chunk_text(clean):
-                all_chunks.append(Chunk(
-                    text=piece,
-                    metadata=ChunkMetadata(
-                        filename=filename,
-                        namespace=namespace,
-                        page=None,
-                        section=None,
-                        source=source
-                    )
-                ))
-    else:
-        # Ignore unsupported types; your upload endpoint already filters types
-        pass
+def make_chunk(doc: DocumentText, start: int, end: int, path: str, namespace: str) -> Chunk:
+    page, page_end = doc.page_at(start), doc.page_at(end - 1)
+    return Chunk(
+        text=doc.text[start:end],
+        metadata=ChunkMetadata(
+            filename=os.path.basename(path).strip(),
+            namespace=namespace,
+            page=page + 1 if page is not None else None,  # 1-based page number
+            page_end=page_end + 1 if page_end is not None else None,
+            section=None,
+            source=path,
+            char_start=start,
+            char_end=end
+        )
+    )
+
+def iter_chunks(
+    path: str,
+    namespace: str,
+    sha: Optional[str] = None,
+    pdf_workers: int = PDF_WORKERS,
+    doc: Optional[DocumentText] = None
+) -> Iterator[Chunk]:
+    """
+    Lazily yields Chunk(text + metadata) for a file. Windows run over the whole
+    document, so a chunk may span a PDF page break (page..page_end); callers
+    that only need the first few chunks stop early.
+    """
+    if doc is None:
+        doc = load_text(path, sha=sha, pdf_workers=pdf_workers)
+    for start, end in iter_windows(doc.text):
+        yield make_chunk(doc, start, end, path, namespace)
 
-    return all_chunks
+def file_windows(
+    path: str,
+    sha: Optional[str] = None,
+    pdf_workers: int = PDF_WORKERS
+) -> Tuple[DocumentText, List[Tuple[int, int]]]:
+    """
+    Compact form of a file's chunks: the text buffer plus window offsets.
+    This is what extraction workers send back; chunks are sliced on demand.
+    """
+    doc = load_text(path, sha=sha, pdf_workers=pdf_workers)
+    return doc, list(iter_windows(doc.text))
+
+def file_to_chunks(
+    path: str,
+    namespace: str,
+    sha: Optional[str] = None,
+    pdf_workers: int = PDF_WORKERS
+) -> List[Chunk]:
+    """
+    Detects file type, extracts text (or reads it from the text cache),
+    splits into chunks, returns a list of Chunk(text + metadata).
+    """
+    return list(iter_chunks(path, namespace, sha=sha, pdf_workers=pdf_workers))
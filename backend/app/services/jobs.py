@@ -0,0 +1,246 @@
+# Background indexing jobs.
+#
+# POST /index only records a job and hands it to a small local worker pool; the
+# HTTP request returns immediately. Job state lives in data/.jobs/<id>.json so
+# any uvicorn worker can report on it or cancel it, and so jobs that were
+# queued/running when the process died are resumed on the next startup.
+# A per-namespace file lock guarantees one running index job per namespace,
+# across workers. A job whose namespace is busy (another job still running or
+# winding down after a cancel) stays queued and waits for the lock, for at most
+# INDEX_JOB_LOCK_WAIT_SECONDS.
+
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import portalocker
+
+from .paths import DATA_ROOT, data_dir
+from .indexer import index_namespace
+from .pipeline import IndexCancelled
+
+JOB_WORKERS = int(os.getenv("INDEX_JOB_WORKERS", "2"))
+JOB_LOCK_WAIT_SECONDS = float(os.getenv("INDEX_JOB_LOCK_WAIT_SECONDS", "3600"))
+JOBS_DIR = os.path.join(DATA_ROOT, ".jobs")
+
+ACTIVE = ("queued", "running")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_submit_lock = threading.Lock()
+_cancel_events: Dict[str, threading.Event] = {}
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="index-job")
+        return _executor
+
+# --- Persistence ---
+
+def _job_path(job_id: str) -> str:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_job_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write(job: Dict[str, Any]):
+    path = _job_path(job["id"])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    os.replace(tmp, path)
+
+def _update(job_id: str, **changes) -> Dict[str, Any]:
+    """
+    Read-modify-write under a file lock, so a cancel request from another
+    worker is never lost under a progress update.
+    """
+    with portalocker.Lock(_job_path(job_id) + ".lock", timeout=10):
+        job = get_job(job_id) or {"id": job_id}
+        job.update(changes)
+        _write(job)
+    return job
+
+def list_jobs(namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    jobs = []
+    for fn in os.listdir(JOBS_DIR):
+        if fn.endswith(".json"):
+            job = get_job(fn[:-5])
+            if job and (namespace is None or job.get("namespace") == namespace):
+                jobs.append(job)
+    return sorted(jobs, key=lambda j: j.get("created_at", 0), reverse=True)
+
+# --- Running ---
+
+def _run_lock(namespace: str) -> portalocker.Lock:
+    return portalocker.Lock(
+        os.path.join(data_dir(namespace), "index.lock"),
+        timeout=0,
+        fail_when_locked=True,
+    )
+
+def _is_running_somewhere(namespace: str) -> bool:
+    try:
+        with _run_lock(namespace):
+            return False
+    except portalocker.exceptions.LockException:
+        return True
+
+def _progress_fields(started: float, counters: dict) -> Dict[str, Any]:
+    """
+    Throughput and a rough ETA from the counters reported by index_namespace.
+    Chunks of files not extracted yet are estimated from the average so far.
+    """
+    elapsed = max(time.time() - started, 1e-6)
+    files_total, files_done = counters["files_total"], counters["files_done"]
+    chunks_done = counters["chunks_done"]
+    chunks_total = counters["chunks_total"]
+    if files_done and files_total > files_done:
+        chunks_total = max(chunks_total, round(chunks_done / files_done * files_total))
+    rate = chunks_done / elapsed
+    eta = (chunks_total - chunks_done) / rate if rate > 0 else None
+    return {
+        "progress": counters,
+        "chunks_per_second": round(rate, 2),
+        "embeddings_per_second": round(counters.get("embeddings_computed", 0) / elapsed, 2),
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+    }
+
+def _acquire_run_lock(job_id: str) -> Optional[portalocker.Lock]:
+    """
+    The namespace's run lock for this job, waiting while another job holds it.
+    None when the job no longer needs to run: finished meanwhile (another
+    worker ran this same job), cancelled while queued, or the wait timed out
+    (the job is then marked failed).
+    """
+    deadline = time.monotonic() + JOB_LOCK_WAIT_SECONDS
+    while True:
+        job = get_job(job_id)
+        if job is None or job.get("status") not in ACTIVE:
+            return None
+        if job.get("status") == "queued" and job.get("cancel_requested"):
+            _update(job_id, status="cancelled", finished_at=time.time())
+            return None
+        lock = _run_lock(job["namespace"])
+        try:
+            lock.acquire()
+            return lock
+        except portalocker.exceptions.LockException:
+            pass
+        if time.monotonic() >= deadline:
+            _update(job_id, status="failed", error="Timed out waiting for the namespace's running index job.",
+                    finished_at=time.time())
+            return None
+        time.sleep(0.5)
+
+def _run(job_id: str):
+    lock = _acquire_run_lock(job_id)
+    if lock is None:
+        return
+    job = get_job(job_id)
+    if job is None or job.get("status") not in ACTIVE:
+        lock.release()
+        return  # finished by another worker just before we got the lock
+    namespace = job["namespace"]
+
+    event = _cancel_events.setdefault(job_id, threading.Event())
+    started = time.time()
+    last = {"write": 0.0, "poll": 0.0}
+
+    def should_cancel() -> bool:
+        # Local flag first; the job file (set by other workers) at most once a second
+        if event.is_set():
+            return True
+        now = time.monotonic()
+        if now - last["poll"] >= 1.0:
+            last["poll"] = now
+            if (get_job(job_id) or {}).get("cancel_requested"):
+                event.set()
+        return event.is_set()
+
+    def progress(counters: dict):
+        now = time.monotonic()
+        if now - last["write"] >= 1.0:
+            last["write"] = now
+            _update(job_id, **_progress_fields(started, counters))
+
+    try:
+        _update(job_id, status="running", started_at=started, attempts=job.get("attempts", 0) + 1)
+        summary = index_namespace(namespace, progress=progress, should_cancel=should_cancel)
+        _update(job_id, status="completed", summary=summary, eta_seconds=0, finished_at=time.time())
+    except IndexCancelled:
+        _update(job_id, status="cancelled", finished_at=time.time())
+    except Exception as e:
+        _update(job_id, status="failed", error=str(e), finished_at=time.time())
+    finally:
+        lock.release()
+        _cancel_events.pop(job_id, None)
+
+def submit(namespace: str) -> Dict[str, Any]:
+    """
+    Queue an index job for a namespace. If one is already queued/running,
+    that job is returned instead of starting a second one. A job that is
+    still winding down after a cancel doesn't count: the new job waits for it.
+    The check runs under a per-namespace file lock, so two workers can't both
+    create a job.
+    """
+    submit_lock = portalocker.Lock(os.path.join(data_dir(namespace), "submit.lock"), timeout=10)
+    with _submit_lock, submit_lock:
+        for job in list_jobs(namespace):
+            if job.get("status") in ACTIVE and not job.get("cancel_requested"):
+                # A job left 'running' by a dead process has no lock holder: resume it
+                if not _is_running_somewhere(namespace):
+                    _pool().submit(_run, job["id"])
+                return job
+        job = {
+            "id": uuid.uuid4().hex,
+            "namespace": namespace,
+            "status": "queued",
+            "created_at": time.time(),
+            "cancel_requested": False,
+            "attempts": 0,
+        }
+        _write(job)
+        _pool().submit(_run, job["id"])
+        return job
+
+def cancel(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Ask a job to stop. Finished files stay indexed; the rest is left for the next run.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    if job.get("status") not in ACTIVE:
+        return job
+    if job_id in _cancel_events:
+        _cancel_events[job_id].set()
+    if job.get("status") == "queued" and not _is_running_somewhere(job["namespace"]):
+        return _update(job_id, status="cancelled", cancel_requested=True, finished_at=time.time())
+    return _update(job_id, cancel_requested=True)
+
+def resume_pending():
+    """
+    On startup: re-queue jobs that were queued or running when the process stopped.
+    Thanks to the manifest checkpoints they continue instead of starting over.
+    """
+    for job in list_jobs():
+        if job.get("status") not in ACTIVE:
+            continue
+        if job.get("cancel_requested"):
+            if not _is_running_somewhere(job["namespace"]):
+                _update(job["id"], status="cancelled", finished_at=time.time())
+            continue
+        _pool().submit(_run, job["id"])
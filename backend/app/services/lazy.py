@@ -0,0 +1,45 @@
+# Deferred imports for heavy dependencies.
+#
+# The Qdrant client, the Gemini SDK and scipy take most of the time it takes
+# to import the app. Modules refer to them through a LazyModule instead, so
+# the import happens on the first attribute access (the first search, upload
+# or Gemini call), not when uvicorn boots a worker. Annotations that name
+# their types are strings, so defining a function doesn't trigger the import.
+#
+# All deferred imports take one process-wide lock: two threads importing
+# overlapping packages at once (qdrant_client has import cycles) can
+# otherwise see each other's half-initialized modules.
+
+import importlib
+import threading
+from types import ModuleType
+
+_import_lock = threading.RLock()
+
+def import_module(name: str) -> ModuleType:
+    """
+    importlib.import_module, serialized with every other deferred import.
+    """
+    with _import_lock:
+        return importlib.import_module(name)
+
+class LazyModule:
+    """
+    Stands in for `import <name>` until an attribute is first used.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
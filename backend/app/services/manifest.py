@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import portalocker
+
+from .paths import data_dir
+
+# Per-namespace record of what has been indexed:
+# { "<filename>": {"size": int, "mtime_ns": int, "sha256": str, "point_ids": [...]}, ... }
+Manifest = Dict[str, Dict]
+
+def _manifest_path(namespace: str) -> str:
+    return os.path.join(data_dir(namespace), "manifest.json")
+
+def load_manifest(namespace: str) -> Manifest:
+    try:
+        with open(_manifest_path(namespace), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(namespace: str, manifest: Manifest):
+    """
+    Write via a temp file + rename so a crash never leaves a torn manifest.
+    """
+    path = _manifest_path(namespace)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    sha256 of a file, read in fixed-size blocks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def plan_changes(manifest: Manifest, files: List[str]) -> Dict[str, List]:
+    """
+    Compare the files on disk with the manifest.
+    Returns {"added": [(name, path, stat)], "updated": [...], "skipped": [name],
+             "deleted": [name]}. Files whose size+mtime match are skipped without
+    hashing; touched-but-identical files are skipped after hashing (and their
+    manifest entry refreshed in place).
+    """
+    plan = {"added": [], "updated": [], "skipped": [], "deleted": []}
+    on_disk = {os.path.basename(p): p for p in files}
+
+    for name, path in sorted(on_disk.items()):
+        st = os.stat(path)
+        entry = manifest.get(name)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            plan["skipped"].append(name)
+            continue
+        sha = hash_file(path)
+        if entry and entry["sha256"] == sha:
+            entry["size"], entry["mtime_ns"] = st.st_size, st.st_mtime_ns
+            plan["skipped"].append(name)
+            continue
+        stat = (st.st_size, st.st_mtime_ns, sha)
+        plan["updated" if entry else "added"].append((name, path, stat))
+
+    plan["deleted"] = sorted(name for name in manifest if name not in on_disk)
+    return plan
+
+def make_entry(stat: Tuple[int, int, str], point_ids: List[str]) -> Dict:
+    size, mtime_ns, sha = stat
+    return {"size": size, "mtime_ns": mtime_ns, "sha256": sha, "point_ids": point_ids}
+
+# --- Content hashes of uploads (dedup before indexing) ---
+
+def _uploads_registry_path(namespace: str) -> str:
+    return os.path.join(data_dir(namespace), "uploads.json")
+
+def _known_hashes(namespace: str, folder: str) -> Dict[str, str]:
+    """
+    sha256 -> filename for every file of the namespace we know the content of:
+    indexed files (manifest) plus uploads not indexed yet. Entries whose file
+    is gone from `folder` are ignored.
+    """
+    hashes: Dict[str, str] = {}
+    try:
+        with open(_uploads_registry_path(namespace), "r", encoding="utf-8") as f:
+            hashes.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    for name, entry in load_manifest(namespace).items():
+        hashes[entry["sha256"]] = name
+    return {sha: name for sha, name in hashes.items() if os.path.exists(os.path.join(folder, name))}
+
+def claim_upload(namespace: str, folder: str, sha: str, filename: str) -> Optional[str]:
+    """
+    Register `filename` as the namespace's copy of content `sha`.
+    If identical content already exists, returns that file's name instead
+    (check + register happen under one lock, so concurrent uploads agree).
+    """
+    path = _uploads_registry_path(namespace)
+    with portalocker.Lock(path + ".lock", timeout=10):
+        known = _known_hashes(namespace, folder)
+        if sha in known:
+            return known[sha]
+        known[sha] = filename
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(known, f)
+        os.replace(tmp, path)
+    return None
@@ -0,0 +1,56 @@
+import os
+import re
+from typing import Sequence
+
+# Where uploaded files live (one folder per namespace).
+UPLOADS_ROOT = os.getenv("UPLOADS_DIR", os.path.join("backend", "app", "uploads"))
+
+# Where derived, rebuildable state lives (search indexes, caches, manifests).
+DATA_ROOT = os.getenv("DATA_DIR", os.path.join("backend", "app", "data"))
+
+# Namespaces name folders directly under UPLOADS_ROOT and DATA_ROOT, next to
+# shared state (chunks.sqlite, .jobs, .text_cache, .incoming, ...). Every such
+# entry has a dot in its name and a namespace can't, so the two never collide;
+# no separators or dots also means no path escapes, and no "," (multi-namespace
+# scopes are labelled "a,b").
+NAMESPACE_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+class InvalidNamespace(ValueError):
+    pass
+
+def check_namespace(namespace: str) -> str:
+    """
+    The namespace, if it is 1-64 letters, digits, "_" or "-".
+    """
+    if not NAMESPACE_PATTERN.fullmatch(namespace or ""):
+        raise InvalidNamespace(f"Invalid namespace: {namespace!r} (use 1-64 letters, digits, '_' or '-')")
+    return namespace
+
+def scope_label(namespaces: Sequence[str]) -> str:
+    """
+    One string for several namespaces searched together: "a,b". Can't equal
+    a namespace, or another set's label, since namespaces have no ",".
+    """
+    return ",".join(check_namespace(ns) for ns in namespaces)
+
+def uploads_dir(namespace: str) -> str:
+    """
+    Folder holding the raw uploads of a namespace: uploads/<namespace>
+    """
+    return os.path.join(UPLOADS_ROOT, check_namespace(namespace))
+
+def data_path(namespace: str, *parts: str) -> str:
+    """
+    Path of derived per-namespace state: data/<namespace>/<parts...>
+    Not created: for readers, which must not leave folders behind.
+    """
+    return os.path.join(DATA_ROOT, check_namespace(namespace), *parts)
+
+def data_dir(namespace: str, *parts: str) -> str:
+    """
+    Folder for derived per-namespace state: data/<namespace>/<parts...>
+    Created on first use.
+    """
+    path = data_path(namespace, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,278 @@
+# Staged indexing pipeline.
+#
+#   files --(process pool: extract + chunk)--> batches --(thread pool: embed)-->
+#   points --(bounded queue)--> upserter thread --(batched upserts)--> Qdrant
+#
+# Every hand-off is bounded, so a fast stage blocks instead of piling up work
+# in memory, and the stages overlap: while Qdrant ingests one batch, Gemini is
+# embedding the next few and other cores are parsing the next files. Throughput
+# ends up limited by the slowest stage rather than by the sum of all of them.
+
+import os
+import time
+import uuid
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..db.qdrant_client import rest, get_client, COLLECTION_NAME, SPARSE_VECTOR, has_sparse_vectors
+from ..db import chunk_store
+from ..ai.embed_cache import embed_texts_cached
+from ..retriever import sparse
+from .ingest import DocumentText, file_windows, make_chunk
+from . import telemetry
+
+# Tunables (env so they can differ per deployment size)
+EXTRACT_WORKERS = int(os.getenv("INDEX_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_CONCURRENCY = int(os.getenv("INDEX_EMBED_CONCURRENCY", "4"))
+UPSERT_BATCH = int(os.getenv("INDEX_UPSERT_BATCH", "128"))
+QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "8"))
+
+# Fixed namespace for uuid5 so the same chunk always maps to the same point ID
+_POINT_ID_NS = uuid.UUID("6f1c1c3e-8d2a-4d8e-9a57-2b1f0f4a9c11")
+
+def point_id(namespace: str, filename: str, position: int) -> str:
+    """
+    Deterministic point ID for the chunk at `position` of a file, so
+    re-indexing overwrites points instead of adding duplicates.
+    """
+    return str(uuid.uuid5(_POINT_ID_NS, f"{namespace}/{filename}/{position}"))
+
+def chunks_to_points(
+    texts: List[str],
+    payloads: List[dict],
+    ids: List[str],
+    stats: Optional[dict] = None
+) -> List["rest.PointStruct"]:
+    """
+    Convert a batch of texts into vectors + PointStructs for Qdrant.
+    Embeddings come from the content-addressed cache when the text was seen before.
+    When the collection has it, the chunk's BM25 sparse vector is stored alongside.
+    """
+    vectors = embed_texts_cached(texts, stats=stats)  # -> List[List[float]] (768-dim)
+    with_sparse = has_sparse_vectors()
+    points: List["rest.PointStruct"] = []
+    for pid, vec, pl, text in zip(ids, vectors, payloads, texts):
+        svec = sparse.doc_vector(text) if with_sparse else None
+        points.append(
+            rest.PointStruct(
+                id=pid,
+                vector={"": vec, SPARSE_VECTOR: svec} if svec is not None else vec,
+                payload=pl
+            )
+        )
+    return points
+
+def _extract(path: str, sha: Optional[str], pdf_workers: int):
+    """
+    file_windows in an extraction process, timed there (metrics live in the parent).
+    """
+    t0 = time.perf_counter()
+    doc, windows = file_windows(path, sha, pdf_workers)
+    return doc, windows, time.perf_counter() - t0
+
+_DONE = object()
+
+class IndexCancelled(Exception):
+    """Raised out of IndexPipeline.run() when should_cancel() turned true."""
+
+class IndexPipeline:
+    """
+    Runs extraction, embedding and upserts for a set of files concurrently.
+    After run(): file_ids maps filename -> point IDs it produced, bm25_docs holds
+    the upserted (point_id, text, payload) docs for the local BM25 index, and
+    stats/total_* hold counters.
+    Hooks: on_file_done(name) once all of a file's points are in Qdrant,
+    on_progress() after every upsert, should_cancel() polled between batches.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        batch_size: int = 32,
+        extract_workers: int = EXTRACT_WORKERS,
+        embed_concurrency: int = EMBED_CONCURRENCY,
+        upsert_batch: int = UPSERT_BATCH,
+        queue_size: int = QUEUE_SIZE,
+        on_file_done: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+    ):
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.extract_workers = max(1, extract_workers)
+        self.embed_concurrency = max(1, embed_concurrency)
+        self.upsert_batch = max(1, upsert_batch)
+        self.queue_size = max(1, queue_size)
+        self.on_file_done = on_file_done
+        self.on_progress = on_progress
+        self.should_cancel = should_cancel
+
+        self.file_ids: Dict[str, List[str]] = {}
+        self.bm25_docs: List[Tuple[str, str, dict]] = []
+        self.stats = {"embeddings_cached": 0, "embeddings_computed": 0}
+        self.total_chunks = 0
+        self.total_points = 0
+        self.files_done = 0
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}  # filename -> batches not yet upserted
+        self._error: Optional[BaseException] = None
+
+    # --- stage 2: embed (thread pool) ---
+
+    def _check_cancel(self):
+        if self._error is None and self.should_cancel is not None and self.should_cancel():
+            self._error = IndexCancelled()
+
+    def _file_done(self, name: str):
+        with self._lock:
+            self.files_done += 1
+        if self.on_file_done is not None:
+            self.on_file_done(name)
+
+    def _embed(self, name: str, texts: List[str], payloads: List[dict], ids: List[str], points_q: queue.Queue):
+        self._check_cancel()
+        if self._error is not None:
+            return
+        local_stats: dict = {}
+        with telemetry.span("index_embed"):
+            pts = chunks_to_points(texts, payloads, ids, local_stats)
+        with self._lock:
+            for key, val in local_stats.items():
+                self.stats[key] = self.stats.get(key, 0) + val
+        points_q.put((name, pts, texts))  # blocks while the upserter is behind
+
+    # --- stage 3: upsert (single thread, batched) ---
+
+    def _upsert_loop(self, points_q: queue.Queue):
+        buffer: List["rest.PointStruct"] = []
+        buffer_texts: List[str] = []
+        done_files: List[str] = []
+
+        def flush():
+            if buffer:
+                with telemetry.span("index_upsert"):
+                    # Texts first: a point visible in Qdrant can always be hydrated
+                    chunk_store.put_many((str(p.id), t) for p, t in zip(buffer, buffer_texts))
+                    get_client().upsert(collection_name=COLLECTION_NAME, points=buffer)
+                telemetry.CHUNKS_INDEXED.labels(self.namespace).inc(len(buffer))
+                self.bm25_docs.extend((str(p.id), t, p.payload) for p, t in zip(buffer, buffer_texts))
+                self.total_points += len(buffer)
+                buffer.clear()
+                buffer_texts.clear()
+            for name in done_files:
+                self._file_done(name)
+            done_files.clear()
+            if self.on_progress is not None:
+                self.on_progress()
+
+        while True:
+            item = points_q.get()
+            if item is _DONE:
+                break
+            if self._error is not None:
+                continue  # keep draining so producers never block forever
+            name, pts, texts = item
+            try:
+                buffer.extend(pts)
+                buffer_texts.extend(texts)
+                with self._lock:
+                    self._pending[name] -= 1
+                    if self._pending[name] == 0:
+                        done_files.append(name)
+                # Batch under load; don't sit on points when nothing else is coming
+                if len(buffer) >= self.upsert_batch or points_q.empty():
+                    flush()
+            except BaseException as e:  # surface in run()
+                self._error = e
+        if self._error is None:
+            try:
+                flush()
+            except BaseException as e:
+                self._error = e
+
+    # --- stage 1: extract (process pool) + batching (caller thread) ---
+
+    def _batches(self, name: str, path: str, doc: DocumentText, windows: List[Tuple[int, int]]):
+        """
+        Yields (texts, payloads, ids) batches; chunk strings and payloads are
+        only built when the batch is about to be embedded.
+        """
+        for first in range(0, len(windows), self.batch_size):
+            texts, payloads, ids = [], [], []
+            for pos in range(first, min(first + self.batch_size, len(windows))):
+                ch = make_chunk(doc, *windows[pos], path, self.namespace)
+                pid = point_id(self.namespace, ch.metadata.filename, pos)
+                payload = ch.metadata.model_dump()
+                payload["point_id"] = pid  # identity for fusion/dedup (text goes to the chunk store)
+                texts.append(ch.text)
+                payloads.append(payload)
+                ids.append(pid)
+            yield texts, payloads, ids
+
+    def run(self, files: List[Tuple[str, str]]):
+        """
+        files: (filename, path) or (filename, path, sha256) tuples to (re)index;
+        a known hash saves re-hashing the file for the extracted-text cache.
+        """
+        if not files:
+            return self
+        points_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        upserter = threading.Thread(target=self._upsert_loop, args=(points_q,), daemon=True)
+        upserter.start()
+
+        # Bound batches waiting for / inside the embed pool
+        embed_slots = threading.BoundedSemaphore(self.embed_concurrency + self.queue_size)
+
+        def release(fut):
+            embed_slots.release()
+            if fut.exception() is not None and self._error is None:
+                self._error = fut.exception()  # stop feeding more work
+
+        # spawn: the parent holds gRPC/HTTP client threads that must not be forked
+        ctx = multiprocessing.get_context("spawn")
+        workers = min(self.extract_workers, len(files))
+        # Cores not used for file-level parallelism go to page ranges of large PDFs
+        pdf_workers = max(1, (os.cpu_count() or 1) // workers)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as extract_pool, \
+                 ThreadPoolExecutor(max_workers=self.embed_concurrency) as embed_pool:
+                todo = list(files)
+                in_flight = {}
+                while (todo or in_flight) and self._error is None:
+                    self._check_cancel()
+                    if self._error is not None:
+                        break
+                    # Keep at most 2 files per extractor in flight
+                    while todo and len(in_flight) < workers * 2:
+                        name, path, *sha = todo.pop(0)
+                        fut = extract_pool.submit(_extract, path, sha[0] if sha else None, pdf_workers)
+                        in_flight[fut] = (name, path)
+                    done, _ = wait(list(in_flight), timeout=1.0, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        name, path = in_flight.pop(fut)
+                        doc, windows, seconds = fut.result()
+                        telemetry.STAGE_SECONDS.labels("index_extract").observe(seconds)
+                        self.total_chunks += len(windows)
+                        filename = os.path.basename(path).strip()  # as in the chunk metadata
+                        self.file_ids[name] = [point_id(self.namespace, filename, pos) for pos in range(len(windows))]
+                        if not windows:
+                            self._file_done(name)
+                            continue
+                        with self._lock:
+                            self._pending[name] = -(-len(windows) // self.batch_size)
+                        for texts, payloads, ids in self._batches(name, path, doc, windows):
+                            if self._error is not None:
+                                break
+                            embed_slots.acquire()
+                            f = embed_pool.submit(self._embed, name, texts, payloads, ids, points_q)
+                            f.add_done_callback(release)
+        finally:
+            points_q.put(_DONE)
+            upserter.join()
+        if self._error is not None:
+            raise self._error
+        return self
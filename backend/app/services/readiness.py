@@ -0,0 +1,58 @@
+# Qdrant readiness, checked in the background.
+#
+# Startup used to run ensure_collection() (several round trips to Qdrant, and
+# a hang while it is unreachable) before uvicorn accepted connections. Now a
+# daemon thread runs it, retrying every READINESS_RETRY_SECONDS until it
+# succeeds, and then resumes interrupted index jobs. /health answers as soon
+# as the process is up; /ready returns 503 until the collection is usable, so
+# probes only send traffic to workers that can serve it.
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+READINESS_RETRY_SECONDS = float(os.getenv("READINESS_RETRY_SECONDS", "5"))
+
+log = logging.getLogger(__name__)
+
+_state: Dict[str, Any] = {"ready": False, "attempts": 0, "error": None, "seconds": None}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+def _run(check: Callable[[], None], on_ready: Optional[Callable[[], None]]):
+    started = time.monotonic()
+    while True:
+        with _lock:
+            _state["attempts"] += 1
+        try:
+            check()
+            break
+        except Exception as e:
+            with _lock:
+                _state["error"] = f"{type(e).__name__}: {e}"
+            log.warning("Qdrant not ready (%s); retrying in %.0fs", e, READINESS_RETRY_SECONDS)
+            time.sleep(READINESS_RETRY_SECONDS)
+    with _lock:
+        _state.update(ready=True, error=None, seconds=round(time.monotonic() - started, 3))
+    if on_ready is not None:
+        try:
+            on_ready()
+        except Exception:
+            log.exception("Post-readiness startup task failed")
+
+def start(check: Callable[[], None], on_ready: Optional[Callable[[], None]] = None):
+    """
+    Run `check` in the background until it succeeds, then `on_ready`. Once per process.
+    """
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, args=(check, on_ready), name="readiness", daemon=True)
+        _thread.start()
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return dict(_state)
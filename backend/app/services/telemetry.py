@@ -0,0 +1,147 @@
+# Timing spans, Prometheus metrics and the Server-Timing header.
+#
+# span("stage") times a block of work and observes it in the
+# rag_stage_seconds histogram. Inside an HTTP request the span is also added
+# to that request's timings (summed per stage), which TimingMiddleware sends
+# back as a Server-Timing header, so a slow /ask can be pinned on embedding,
+# Qdrant, BM25, fusion or Gemini. Streamed answers report their timings in
+# the final SSE event instead (headers are sent before generation starts).
+#
+# GET /metrics renders everything. With several uvicorn workers, point
+# PROMETHEUS_MULTIPROC_DIR at an empty directory so all workers are aggregated.
+
+import os
+import asyncio
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from starlette.datastructures import MutableHeaders
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Duration of request and indexing stages", ["stage"],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+HTTP_SECONDS = Histogram(
+    "rag_http_request_seconds", "HTTP request duration", ["method", "route", "status"],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+EMBED_BATCH_SIZE = Histogram(
+    "rag_embed_batch_size", "Texts per Gemini embed_content call", ["task"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 100),
+)
+GEMINI_RETRIES = Counter("rag_gemini_retries_total", "Gemini calls retried by tenacity", ["call"])
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Cache lookups by result", ["cache", "result"])
+CHUNKS_INDEXED = Counter("rag_chunks_indexed_total", "Chunks upserted into Qdrant", ["namespace"])
+INDEX_CHUNKS_PER_SECOND = Gauge(
+    "rag_index_chunks_per_second", "Upsert throughput of the last index run", ["namespace"],
+    multiprocess_mode="mostrecent",
+)
+CORPUS_CHUNKS = Gauge(
+    "rag_corpus_chunks", "Chunks in a namespace's corpus", ["namespace"],
+    multiprocess_mode="mostrecent",
+)
+
+# stage -> seconds, for the request being served (None outside requests)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def span(stage: str):
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - t0
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def timed(stage: str):
+    """
+    Decorator form of span() for plain and async functions.
+    """
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def count_retry(call: str):
+    """
+    tenacity before_sleep hook: counts each retry of `call`.
+    """
+    def before_sleep(_retry_state):
+        GEMINI_RETRIES.labels(call).inc()
+    return before_sleep
+
+def count_lookup(cache: str, hit: bool, n: int = 1):
+    if n:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(n)
+
+def request_timings() -> Dict[str, float]:
+    """
+    Stage durations (ms) recorded so far in the current request.
+    """
+    return {stage: round(sec * 1000, 2) for stage, sec in (_timings.get() or {}).items()}
+
+def _server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={sec * 1000:.1f}" for stage, sec in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware (doesn't buffer streaming responses): collects the
+    request's spans, adds Server-Timing to the response and observes
+    rag_http_request_seconds by route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        t0 = perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", _server_timing(timings, perf_counter() - t0))
+                headers.append("Timing-Allow-Origin", "*")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.labels(scope["method"], route, str(status[0])).observe(perf_counter() - t0)
+
+def render_metrics() -> bytes:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -0,0 +1,44 @@
+# Extracted-text cache.
+#
+# Parsing a PDF is by far the most expensive step before embedding, and the
+# same bytes used to be parsed again by every index run and every preview.
+# Extracted page texts are stored once per file *content* (sha256), gzip'd JSON
+# under data/.text_cache/<sha[:2]>/<sha>.json.gz, and shared by the indexer,
+# the preview endpoint and every namespace holding the same file.
+
+import os
+import gzip
+import json
+from typing import List, Optional, Tuple
+
+from .paths import DATA_ROOT
+
+CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join(DATA_ROOT, ".text_cache"))
+
+# Bump when extraction changes, so stale entries are ignored instead of reused
+EXTRACT_VERSION = 1
+
+# (page_index or None, page_text); non-PDF files are a single (None, text) page
+Pages = List[Tuple[Optional[int], str]]
+
+def _entry_path(sha: str) -> str:
+    return os.path.join(CACHE_DIR, sha[:2], f"{sha}.v{EXTRACT_VERSION}.json.gz")
+
+def get(sha: str) -> Optional[Pages]:
+    try:
+        with gzip.open(_entry_path(sha), "rt", encoding="utf-8") as f:
+            return [tuple(p) for p in json.load(f)]
+    except (FileNotFoundError, EOFError, OSError, json.JSONDecodeError):
+        return None  # missing or torn entry: re-extract
+
+def put(sha: str, pages: Pages):
+    """
+    Write via a temp file + rename; concurrent writers of the same content
+    produce identical entries, so last-rename-wins is fine.
+    """
+    path = _entry_path(sha)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(pages, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
@@ -2,9 +2,29 @@ import re
 
 _ws_re = re.compile(r"\s+")
 
+# Large texts are normalized in blocks of this many characters, so the
+# temporary word list never holds more than one block
+_BLOCK_CHARS = 1 << 20
+
 def normalize_whitespace(s: str) -> str:
     """Collapse weird whitespace/newlines into single spaces."""
-    return _ws_re.sub(" ", s).strip()
+    if len(s) <= _BLOCK_CHARS:
+        return " ".join(s.split())
+    parts = []
+    pos, n = 0, len(s)
+    while pos < n:
+        end = pos + _BLOCK_CHARS
+        if end < n:
+            # cut at whitespace so no word is split across blocks
+            m = _ws_re.search(s, end)
+            end = m.start() if m else n
+        else:
+            end = n
+        piece = " ".join(s[pos:end].split())
+        if piece:
+            parts.append(piece)
+        pos = end
+    return " ".join(parts)
 
 def to_words(s: str):
     """Very simple tokenizer by whitespace (enough for learning)."""
@@ -0,0 +1,163 @@
+# Streaming multipart uploads.
+#
+# Instead of letting the framework buffer the whole form and then copying each
+# file with `await file.read()`, the request body is parsed as it arrives: every
+# file part is written to a staging file in fixed-size blocks and hashed on the
+# fly. Memory per upload stays around UPLOAD_CHUNK_BYTES whatever the file size,
+# and size limits abort the request as soon as they are crossed.
+
+import os
+import uuid
+import hashlib
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+
+from .paths import UPLOADS_ROOT
+
+MB = 1024 * 1024
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(MB)))
+MAX_FILE_BYTES = int(float(os.getenv("UPLOAD_MAX_FILE_MB", "50")) * MB)
+MAX_REQUEST_BYTES = int(float(os.getenv("UPLOAD_MAX_REQUEST_MB", "200")) * MB)
+MAX_FIELD_BYTES = 64 * 1024  # plain form fields (namespace) are tiny
+
+ALLOWED_EXTENSIONS = (".pdf", ".txt", ".md", ".docx")
+
+# Parts are staged here, then renamed into the namespace folder (same filesystem)
+STAGING_DIR = os.path.join(UPLOADS_ROOT, ".incoming")
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadedPart:
+    """One file part of the request, already on disk in STAGING_DIR."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.allowed = filename.lower().endswith(ALLOWED_EXTENSIONS)
+        self.size = 0
+        self.sha256 = ""
+        self.path: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._buf = bytearray()
+        self._fh = None
+        if self.allowed:
+            os.makedirs(STAGING_DIR, exist_ok=True)
+            self.path = os.path.join(STAGING_DIR, f"{uuid.uuid4().hex}.part")
+            self._fh = open(self.path, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > MAX_FILE_BYTES:
+            raise UploadTooLarge(
+                f"{self.filename} exceeds the per-file limit of {MAX_FILE_BYTES / MB:g} MB."
+            )
+        if self._fh is None:
+            return  # unsupported type: counted, not stored
+        self._hash.update(data)
+        self._buf += data
+        if len(self._buf) >= UPLOAD_CHUNK_BYTES:
+            self._fh.write(self._buf)
+            self._buf.clear()
+
+    def close(self):
+        if self._fh is not None:
+            if self._buf:
+                self._fh.write(self._buf)
+                self._buf.clear()
+            self._fh.close()
+            self._fh = None
+        self.sha256 = self._hash.hexdigest()
+
+    def discard(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class StreamedForm:
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.files: List[UploadedPart] = []
+
+    def discard(self):
+        for part in self.files:
+            part.discard()
+
+async def receive_upload(request: Request) -> StreamedForm:
+    """
+    Parse a multipart/form-data body chunk by chunk.
+    Raises UploadTooLarge (nothing is left behind) or ValueError for a bad body.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_REQUEST_BYTES:
+        raise UploadTooLarge(f"Request exceeds the limit of {MAX_REQUEST_BYTES / MB:g} MB.")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("Expected a multipart/form-data body.")
+
+    form = StreamedForm()
+    state = {"header_field": b"", "headers": {}, "part": None, "field": None, "value": bytearray()}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        key = state["header_field"].lower()
+        state["headers"][key] = state["headers"].get(key, b"") + data[start:end]
+
+    def on_header_end():
+        state["header_field"] = b""
+
+    def on_headers_finished():
+        _, disp = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disp.get(b"name", b"").decode("utf-8", "replace")
+        filename = disp.get(b"filename")
+        if filename is not None:
+            part = UploadedPart(os.path.basename(filename.decode("utf-8", "replace")))
+            form.files.append(part)
+            state["part"] = part
+        else:
+            state["field"] = name
+            state["value"] = bytearray()
+
+    def on_part_data(data, start, end):
+        if state["part"] is not None:
+            state["part"].write(data[start:end])
+        else:
+            state["value"] += data[start:end]
+            if len(state["value"]) > MAX_FIELD_BYTES:
+                raise UploadTooLarge("Form field too large.")
+
+    def on_part_end():
+        if state["part"] is not None:
+            state["part"].close()
+        elif state["field"] is not None:
+            form.fields[state["field"]] = state["value"].decode("utf-8", "replace")
+        state.update(headers={}, part=None, field=None, value=bytearray())
+
+    parser = MultipartParser(params[b"boundary"], callbacks={
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_REQUEST_BYTES:
+                raise UploadTooLarge(f"Request exceeds the limit of {MAX_REQUEST_BYTES / MB:g} MB.")
+            parser.write(chunk)
+        parser.finalize()
+    except BaseException:
+        form.discard()
+        raise
+    return form
@@ -0,0 +1,188 @@
+# Semantic answer cache for DOC_QA (opt-in per request).
+#
+# Paraphrases of a question usually retrieve the same chunks and get the same
+# answer, yet each one pays for a full Gemini generation. Entries store the
+# question's embedding, the point IDs of the fused context, the answer and its
+# citations. A lookup is a hit only if
+#   - cosine(question, cached question) >= ANSWER_CACHE_THRESHOLD, and
+#   - the current fused context has exactly the same point IDs, and
+#   - the namespace's corpus version hasn't changed since the answer was made
+# (point IDs are positional, so after a re-index the same ID can hold new text).
+# Entries of a namespace are dropped as soon as its corpus version moves on.
+# Questions asked over several namespaces are scoped to the tuple of them, and
+# depend on all of their versions.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..services import corpus_version
+from ..services.telemetry import count_lookup
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))          # entries, all namespaces
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))         # seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+
+# A namespace, or a tuple of namespaces searched together
+Scope = Union[str, Tuple[str, ...]]
+
+def _version(scope: Scope):
+    if isinstance(scope, str):
+        return corpus_version.get_version(scope)
+    return corpus_version.get_versions(scope)
+
+class _Entry:
+    __slots__ = ("namespace", "vec", "context_ids", "answer", "citations", "version", "created")
+
+    def __init__(self, namespace, vec, context_ids, answer, citations, version):
+        self.namespace = namespace
+        self.vec = vec
+        self.context_ids = context_ids
+        self.answer = answer
+        self.citations = citations
+        self.version = version
+        self.created = time.monotonic()
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # LRU order, oldest first
+        self._by_ns: Dict[Scope, List[int]] = {}
+        self._matrix: Dict[Scope, Tuple[List[int], np.ndarray]] = {}  # stacked vectors per namespace
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    # --- internals (lock held) ---
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._by_ns[entry.namespace].remove(entry_id)
+        if not self._by_ns[entry.namespace]:
+            del self._by_ns[entry.namespace]
+        self._matrix.pop(entry.namespace, None)
+
+    def _prune_namespace(self, namespace: Scope, version):
+        now = time.monotonic()
+        for entry_id in list(self._by_ns.get(namespace, [])):
+            entry = self._entries[entry_id]
+            if entry.version != version:
+                self._remove(entry_id)
+                self.invalidations += 1
+            elif now - entry.created > self.ttl:
+                self._remove(entry_id)
+                self.evictions += 1
+
+    def _namespace_matrix(self, namespace: Scope) -> Tuple[List[int], np.ndarray]:
+        cached = self._matrix.get(namespace)
+        if cached is None:
+            ids = list(self._by_ns.get(namespace, []))
+            mat = np.stack([self._entries[i].vec for i in ids]) if ids else np.empty((0, 0), np.float32)
+            cached = self._matrix[namespace] = (ids, mat)
+        return cached
+
+    # --- API ---
+
+    @staticmethod
+    def _unit(vec: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def lookup(self, namespace: Scope, query_vec: Sequence[float], context_ids: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"answer", "citations", "similarity"} for a hit, else None.
+        """
+        if self.maxsize <= 0:
+            return None
+        version = _version(namespace)
+        q = self._unit(query_vec)
+        ids_key = tuple(context_ids)
+        with self._lock:
+            self._prune_namespace(namespace, version)
+            entry_ids, mat = self._namespace_matrix(namespace)
+            if entry_ids and mat.shape[1] == q.shape[0]:
+                sims = mat @ q
+                for i in np.argsort(-sims):
+                    if sims[i] < self.threshold:
+                        break
+                    entry = self._entries[entry_ids[i]]
+                    if entry.context_ids == ids_key:
+                        self._entries.move_to_end(entry_ids[i])
+                        self.hits += 1
+                        count_lookup("answers", True)
+                        return {
+                            "answer": entry.answer,
+                            "citations": entry.citations,
+                            "similarity": round(float(sims[i]), 4),
+                        }
+            self.misses += 1
+        count_lookup("answers", False)
+        return None
+
+    def store(
+        self,
+        namespace: Scope,
+        query_vec: Sequence[float],
+        context_ids: Sequence[str],
+        answer: str,
+        citations: List[Dict[str, Any]],
+    ):
+        if self.maxsize <= 0 or not context_ids or not all(context_ids):
+            return  # legacy points without IDs can't be matched reliably
+        version = _version(namespace)
+        entry = _Entry(namespace, self._unit(query_vec), tuple(context_ids), answer, citations, version)
+        with self._lock:
+            while len(self._entries) >= self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._entries[entry_id] = entry
+            self._by_ns.setdefault(namespace, []).append(entry_id)
+            self._matrix.pop(namespace, None)
+
+    def invalidate(self, namespace: str):
+        """
+        Drop the namespace's entries, including those of multi-namespace questions.
+        """
+        with self._lock:
+            scopes = [s for s in self._by_ns if s == namespace or (isinstance(s, tuple) and namespace in s)]
+            for scope in scopes:
+                for entry_id in list(self._by_ns.get(scope, [])):
+                    self._remove(entry_id)
+                    self.invalidations += 1
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_ns.clear()
+            self._matrix.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+answers = SemanticAnswerCache()
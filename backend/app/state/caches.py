@@ -0,0 +1,109 @@
+# In-process request caches (per uvicorn worker).
+#
+#   query_vectors  normalized query text -> query embedding
+#   results        (namespace(s), query, k, alpha, top_k, corpus version(s)) -> fused hits
+#   bm25_stats     ((namespace, BM25 index version), ...) -> merged corpus statistics
+#                  for searches over several namespaces at once
+#
+# All are bounded LRU caches with a TTL. Result entries don't need explicit
+# invalidation: the corpus version in the key changes whenever the namespace is
+# re-indexed, and the stale entries age out or get evicted.
+
+import os
+import threading
+from typing import Any, Dict, Hashable
+
+from cachetools import TTLCache
+
+from ..services.telemetry import count_lookup
+
+class StatsCache(TTLCache):
+    """
+    TTLCache (LRU eviction when full) that counts hits, misses, evictions and
+    expirations. Thread-safe through a lock around every access.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.name = name
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._lock = threading.RLock()
+
+    def popitem(self):
+        # Called by cachetools only to make room: that's an eviction
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+    def lookup(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        count_lookup(self.name, value is not None)
+        return value
+
+    def store(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return  # cache disabled
+        with self._lock:
+            self[key] = value
+
+    def reset(self):
+        with self._lock:
+            self.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self.expire()
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+def normalize_query(text: str) -> str:
+    """
+    Collapse whitespace only: case and punctuation change BM25 tokens, so they
+    stay part of the key.
+    """
+    return " ".join((text or "").split())
+
+query_vectors = StatsCache(
+    "query_vectors",
+    maxsize=int(os.getenv("QUERY_VECTOR_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("QUERY_VECTOR_CACHE_TTL", "3600")),
+)
+
+results = StatsCache(
+    "results",
+    maxsize=int(os.getenv("RESULT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "600")),
+)
+
+bm25_stats = StatsCache(
+    "bm25_stats",
+    maxsize=int(os.getenv("BM25_STATS_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("BM25_STATS_CACHE_TTL", "3600")),
+)
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    return {c.name: c.stats() for c in (query_vectors, results, bm25_stats)}
+
+def clear_all():
+    for c in (query_vectors, results, bm25_stats):
+        c.reset()
@@ -1,13 +1,186 @@
-from collections import defaultdict, deque
-from typing import Deque, Dict, List, Tuple
+# Conversation history, per chat session within a namespace.
+#
+# Backends (CONVERSATION_STORE):
+#   sqlite  - DATA_ROOT/conversations.sqlite in WAL mode, shared by every
+#             uvicorn worker, so a chat's history doesn't depend on which
+#             worker serves the request (default)
+#   memory  - process-local, for single-worker setups
+# Both keep the last CONVERSATION_MAX_TURNS turns of a session, expire
+# sessions idle for CONVERSATION_TTL seconds, and evict the least recently
+# used sessions beyond CONVERSATION_MAX_SESSIONS. Requests without a
+# session_id share the namespace's DEFAULT_SESSION, as before.
+# Async handlers use aadd_turn/aget_recent: sqlite calls can wait up to 30 s on
+# another worker's write lock, so they run in a thread, off the event loop.
 
-# Namespace -> deque of (role, text)
-_HISTORY: Dict[str, Deque[Tuple[str, str]]] = defaultdict(lambda: deque(maxlen=10))
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
 
-def add_turn(namespace: str, role: str, text: str):
-    _HISTORY[namespace].append((role, text))
+from ..services.paths import DATA_ROOT
 
-def get_recent(namespace: str, max_turns: int = 5) -> List[Tuple[str, str]]:
-    hist = _HISTORY.get(namespace, deque())
-    # Return only the last `max_turns` messages
-    return list(hist)[-max_turns:]
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "sqlite")
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", os.path.join(DATA_ROOT, "conversations.sqlite"))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "10"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "86400"))  # seconds since last turn
+
+DEFAULT_SESSION = "default"
+
+Turn = Tuple[str, str]  # (role, text)
+
+class MemoryConversationStore:
+    def __init__(self, max_turns: int, max_sessions: int, ttl: float):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # (namespace, session) -> [turns, last_used]; LRU order, oldest first
+        self._sessions: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._sessions:
+            key, (_turns, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._sessions[key]
+
+    def add_turn(self, namespace: str, session_id: str, role: str, text: str):
+        now = time.monotonic()
+        key = (namespace, session_id)
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(key)
+            if entry is None:
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                entry = self._sessions[key] = [deque(maxlen=self.max_turns), now]
+            else:
+                self._sessions.move_to_end(key)
+            turns: Deque[Turn] = entry[0]
+            turns.append((role, text))
+            entry[1] = now
+
+    def get_recent(self, namespace: str, session_id: str, max_turns: int) -> List[Turn]:
+        with self._lock:
+            entry = self._sessions.get((namespace, session_id))
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                return []
+            turns = entry[0]
+            n = min(max_turns, len(turns))
+            return [turns[i] for i in range(len(turns) - n, len(turns))]
+
+class SQLiteConversationStore:
+    """
+    sessions(id, namespace, session_id, last_used) + turns(id, session, role, text).
+    Reads walk the (session, id) index backwards: O(max_turns), however long
+    the chat. Expired and excess sessions are dropped when a session starts.
+    """
+
+    def __init__(self, path: str, max_turns: int, max_sessions: int, ttl: float):
+        self.path = path
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        One SQLite connection per thread; WAL lets several workers read and write.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    UNIQUE (namespace, session_id)
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used);
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY,
+                    session INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                    role TEXT NOT NULL,
+                    text TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS turns_session ON turns (session, id);
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.ttl,))
+        # make room for the session about to be created
+        excess = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions + 1
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def add_turn(self, namespace: str, session_id: str, role: str, text: str):
+        now = time.time()  # wall clock: shared across processes
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT id FROM sessions WHERE namespace = ? AND session_id = ?", (namespace, session_id)
+            ).fetchone()
+            if row is None:
+                self._prune(conn, now)
+                sid = conn.execute(
+                    "INSERT INTO sessions (namespace, session_id, last_used) VALUES (?, ?, ?)",
+                    (namespace, session_id, now),
+                ).lastrowid
+            else:
+                sid = row[0]
+                conn.execute("UPDATE sessions SET last_used = ? WHERE id = ?", (now, sid))
+            conn.execute("INSERT INTO turns (session, role, text) VALUES (?, ?, ?)", (sid, role, text))
+            # keep the last max_turns turns
+            conn.execute(
+                "DELETE FROM turns WHERE session = ? AND id <= "
+                "(SELECT id FROM turns WHERE session = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (sid, sid, self.max_turns),
+            )
+
+    def get_recent(self, namespace: str, session_id: str, max_turns: int) -> List[Turn]:
+        rows = self._conn().execute(
+            "SELECT t.role, t.text FROM sessions s JOIN turns t ON t.session = s.id "
+            "WHERE s.namespace = ? AND s.session_id = ? AND s.last_used >= ? "
+            "ORDER BY t.id DESC LIMIT ?",
+            (namespace, session_id, time.time() - self.ttl, max_turns),
+        ).fetchall()
+        return [(role, text) for role, text in reversed(rows)]
+
+def _make_store():
+    if CONVERSATION_STORE == "memory":
+        return MemoryConversationStore(CONVERSATION_MAX_TURNS, CONVERSATION_MAX_SESSIONS, CONVERSATION_TTL)
+    if CONVERSATION_STORE == "sqlite":
+        return SQLiteConversationStore(
+            CONVERSATION_DB_PATH, CONVERSATION_MAX_TURNS, CONVERSATION_MAX_SESSIONS, CONVERSATION_TTL
+        )
+    raise ValueError(f"CONVERSATION_STORE must be 'sqlite' or 'memory', got {CONVERSATION_STORE!r}")
+
+store = _make_store()
+
+def add_turn(namespace: str, role: str, text: str, session_id: Optional[str] = None):
+    store.add_turn(namespace, session_id or DEFAULT_SESSION, role, text)
+
+def get_recent(namespace: str, max_turns: int = 5, session_id: Optional[str] = None) -> List[Turn]:
+    # Only the last `max_turns` messages, oldest first
+    return store.get_recent(namespace, session_id or DEFAULT_SESSION, max_turns)
+
+async def aadd_turn(namespace: str, role: str, text: str, session_id: Optional[str] = None):
+    await asyncio.to_thread(add_turn, namespace, role, text, session_id)
+
+async def aget_recent(namespace: str, max_turns: int = 5, session_id: Optional[str] = None) -> List[Turn]:
+    return await asyncio.to_thread(get_recent, namespace, max_turns, session_id)
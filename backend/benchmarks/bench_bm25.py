@@ -0,0 +1,116 @@
+"""
+BM25 scoring benchmark: sparse-matrix engine vs rank_bm25.BM25Okapi.
+
+Run from backend/:
+    python -m benchmarks.bench_bm25
+    python -m benchmarks.bench_bm25 --sizes 1000 10000 100000 1000000 --doc-len 100
+
+For every corpus size it reports the engine's build time, per-query latency
+(score + argpartition top-k) and, for sizes up to --okapi-max, the old path
+(BM25Okapi.get_scores + full sort) plus the max score difference between them.
+"top-k diff" counts queries whose top_k_indices, or top_k_row of the batched
+sparse scores, differ from a stable full sort (ties must go to the lower doc
+index); it should always be 0.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from app.retriever.bm25_engine import BM25Engine, top_k_indices, top_k_row
+
+def synthetic_postings(n_docs: int, doc_len: int, vocab_size: int, seed: int = 0):
+    """
+    Zipf-like corpus as (term ids, doc ids) token pairs; no strings needed.
+    """
+    rng = np.random.default_rng(seed)
+    ranks = np.arange(1, vocab_size + 1)
+    p = 1.0 / ranks
+    p /= p.sum()
+    lens = rng.integers(doc_len // 2, doc_len * 3 // 2 + 1, size=n_docs)
+    terms = rng.choice(vocab_size, size=int(lens.sum()), p=p)
+    docs = np.repeat(np.arange(n_docs), lens)
+    return terms, docs, lens
+
+def build_engine(terms, docs, lens, vocab_size: int) -> BM25Engine:
+    tf = sparse.coo_matrix(
+        (np.ones(len(terms)), (terms, docs)), shape=(vocab_size, len(lens))
+    ).tocsr()  # duplicates are summed -> term frequencies
+    tf.sort_indices()
+    vocab = {f"t{i}": i for i in range(vocab_size)}
+    return BM25Engine.from_postings(vocab, tf.indptr, tf.indices, tf.data, lens)
+
+def make_queries(n: int, vocab_size: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    # Mid-frequency terms, like real keyword queries
+    lo, hi = 50, min(vocab_size, 20000)
+    return [[f"t{t}" for t in rng.integers(lo, hi, size=rng.integers(2, 7))] for _ in range(n)]
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) / repeat, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    ap.add_argument("--doc-len", type=int, default=100, help="mean tokens per chunk")
+    ap.add_argument("--vocab", type=int, default=50_000)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--okapi-max", type=int, default=20_000, help="largest size to also run BM25Okapi on")
+    args = ap.parse_args()
+
+    queries = make_queries(args.queries, args.vocab)
+    # Scores that are all tied: the top k must be the lowest doc indices
+    no_match = [["unknown-term"]]
+    print(f"{'docs':>9} {'build s':>8} {'engine ms/q':>12} {'okapi ms/q':>11} {'speedup':>8} {'max |diff|':>11}"
+          f" {'top-k diff':>10}")
+    for n in args.sizes:
+        terms, docs, lens = synthetic_postings(n, args.doc_len, args.vocab)
+        t0 = time.perf_counter()
+        engine = build_engine(terms, docs, lens, args.vocab)
+        build_s = time.perf_counter() - t0
+
+        def run_engine():
+            for q in queries:
+                scores = engine.get_scores(q)
+                top_k_indices(scores, args.k)
+        engine_s, _ = timed(run_engine, 3)
+        engine_ms = engine_s / len(queries) * 1000
+        topk_diff = 0
+        batch = engine.get_scores_batch(queries + no_match)
+        for row, q in enumerate(queries + no_match):
+            scores = engine.get_scores(q)
+            expected = np.argsort(-scores, kind="stable")[:args.k]
+            lo, hi = batch.indptr[row], batch.indptr[row + 1]
+            from_row = top_k_row(batch.indices[lo:hi], batch.data[lo:hi], n, args.k)
+            topk_diff += not (np.array_equal(top_k_indices(scores, args.k), expected)
+                              and np.array_equal(from_row, expected))
+
+        okapi_ms, diff = float("nan"), float("nan")
+        if n <= args.okapi_max:
+            from rank_bm25 import BM25Okapi
+
+            order = np.argsort(docs, kind="stable")
+            split = np.cumsum(lens)[:-1]
+            corpus = [[f"t{t}" for t in d] for d in np.split(terms[order], split)]
+            okapi = BM25Okapi(corpus)
+
+            def run_okapi():
+                for q in queries:
+                    scores = okapi.get_scores(q)
+                    sorted(enumerate(scores), key=lambda x: x[1], reverse=True)[:args.k]
+            okapi_s, _ = timed(run_okapi, 1)
+            okapi_ms = okapi_s / len(queries) * 1000
+            diff = max(float(np.abs(engine.get_scores(q) - okapi.get_scores(q)).max()) for q in queries)
+
+        speedup = okapi_ms / engine_ms if okapi_ms == okapi_ms else float("nan")
+        print(f"{n:>9} {build_s:>8.2f} {engine_ms:>12.3f} {okapi_ms:>11.3f} {speedup:>8.1f} {diff:>11.2e}"
+              f" {topk_diff:>10}")
+
+if __name__ == "__main__":
+    main()
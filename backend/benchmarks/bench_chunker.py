@@ -0,0 +1,97 @@
+"""
+Chunker benchmark: offset-based window generator vs the previous word-list chunker.
+
+Run from backend/:
+    python -m benchmarks.bench_chunker
+    python -m benchmarks.bench_chunker --sizes-mb 1 10 50 --max-words 600 --overlap 80
+
+For every text size it reports throughput (MB of input per second, consuming
+every chunk once, as the indexer does) and peak Python memory above the input
+text itself (tracemalloc, measured in a separate pass so it doesn't skew timing).
+"""
+
+import argparse
+import gc
+import random
+import re
+import time
+import tracemalloc
+
+from app.services import text_utils
+from app.services.ingest import iter_windows
+
+_ws_re = re.compile(r"\s+")
+
+def legacy_chunk_text(text: str, max_words: int, overlap_words: int):
+    """
+    The chunker before offsets: regex-normalize, split into a word list,
+    re-join every window.
+    """
+    words = _ws_re.sub(" ", text).strip().split(" ")
+    chunks = []
+    i = 0
+    while i < len(words):
+        window = words[i:i + max_words]
+        if not window:
+            break
+        chunks.append(" ".join(window))
+        i += max_words - overlap_words
+    return chunks
+
+def offset_chunks(text: str, max_words: int, overlap_words: int):
+    clean = text_utils.normalize_whitespace(text)
+    for start, end in iter_windows(clean, max_words, overlap_words):
+        yield clean[start:end]
+
+def synthetic_text(size_bytes: int, seed: int = 0) -> str:
+    """
+    Words of 2-12 letters with the odd newline/double space, like extracted text.
+    """
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 12)))
+             for _ in range(20000)]
+    seps = [" "] * 30 + ["\n", "  ", " \n"]
+    parts, total = [], 0
+    while total < size_bytes:
+        w = rng.choice(vocab) + rng.choice(seps)
+        parts.append(w)
+        total += len(w)
+    return "".join(parts)
+
+def consume(chunks) -> int:
+    n = 0
+    for c in chunks:
+        n += len(c)  # touch every chunk, drop it (the pipeline embeds then forgets)
+    return n
+
+def measure(fn, text: str, max_words: int, overlap: int):
+    gc.collect()
+    t0 = time.perf_counter()
+    consume(fn(text, max_words, overlap))
+    elapsed = time.perf_counter() - t0
+
+    gc.collect()
+    tracemalloc.start()
+    consume(fn(text, max_words, overlap))
+    _cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50])
+    ap.add_argument("--max-words", type=int, default=600)
+    ap.add_argument("--overlap", type=int, default=80)
+    args = ap.parse_args()
+
+    print(f"{'size':>8} {'impl':>8} {'MB/s':>9} {'peak MB':>9} {'peak/input':>11}")
+    for size_mb in args.sizes_mb:
+        text = synthetic_text(int(size_mb * 1024 * 1024))
+        for label, fn in (("legacy", legacy_chunk_text), ("offsets", offset_chunks)):
+            elapsed, peak = measure(fn, text, args.max_words, args.overlap)
+            mb = len(text) / (1024 * 1024)
+            print(f"{size_mb:>6g}MB {label:>8} {mb / elapsed:>9.1f} "
+                  f"{peak / (1024 * 1024):>9.1f} {peak / len(text):>10.2f}x")
+
+if __name__ == "__main__":
+    main()
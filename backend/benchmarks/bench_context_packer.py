@@ -0,0 +1,146 @@
+"""
+Context packing benchmark: DOC_QA prompt size before and after the packer.
+
+Run from backend/:
+    python -m benchmarks.bench_context_packer
+    python -m benchmarks.bench_context_packer --queries 200 --top-k 8 --budget 4000
+    GEMINI_API_KEY=... python -m benchmarks.bench_context_packer --gemini   # exact counts
+
+A synthetic multi-page document is chunked with the real chunker (600-word
+windows, 80 words of overlap). Each simulated retrieval returns top_k chunks
+the way hybrid search tends to: a run of neighbouring windows around the best
+hit plus a few from elsewhere, with repeated boilerplate sentences in the text.
+For every retrieval it builds the prompt three ways:
+    cut       previous behaviour, every chunk cut at 1200 characters
+    whole     every chunk in full, as retrieved
+    packed    ai/context_packer (merged spans, deduplicated, token budget)
+and reports prompt tokens (mean / p95) and how much of the retrieved text
+(distinct characters) reaches the prompt.
+"""
+
+import argparse
+import random
+import statistics
+
+from app.ai import context_packer
+from app.ai.prompts import build_doc_qa_prompt
+from app.services.ingest import DocumentText, iter_windows, make_chunk
+
+LEGACY_SNIPPET_CHARS = 1200
+
+def synthetic_document(pages: int, words_per_page: int, seed: int = 0) -> DocumentText:
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+             for _ in range(5000)]
+    boilerplate = [
+        "This document is confidential and intended for internal use only.",
+        "All figures are reported in thousands unless otherwise noted.",
+    ]
+    texts = []
+    for _ in range(pages):
+        words, sentences = 0, []
+        while words < words_per_page:
+            if rng.random() < 0.05:
+                sentence = rng.choice(boilerplate)
+            else:
+                n = rng.randint(8, 25)
+                sentence = " ".join(rng.choice(vocab) for _ in range(n)).capitalize() + "."
+            sentences.append(sentence)
+            words += sentence.count(" ") + 1
+        texts.append(" ".join(sentences))
+    starts, pos = [], 0
+    for t in texts:
+        starts.append(pos)
+        pos += len(t) + 1
+    return DocumentText(" ".join(texts), starts, list(range(pages)))
+
+def document_payloads(doc: DocumentText, filename: str):
+    out = []
+    for i, (start, end) in enumerate(iter_windows(doc.text)):
+        chunk = make_chunk(doc, start, end, filename, "bench")
+        out.append({"text": chunk.text, "point_id": f"{filename}:{i}", **chunk.metadata.model_dump()})
+    return out
+
+def simulated_retrieval(chunks, top_k: int, rng: random.Random):
+    best = rng.randrange(len(chunks))
+    run = [i for i in range(best - 2, best + 3) if 0 <= i < len(chunks)]
+    rng.shuffle(run)
+    picked = run[:max(1, top_k // 2)]
+    while len(picked) < min(top_k, len(chunks)):
+        i = rng.randrange(len(chunks))
+        if i not in picked:
+            picked.append(i)
+    return [(chunks[i], 1.0 - rank / top_k) for rank, i in enumerate(picked)]
+
+def cut_contexts(fused):
+    return [{"text": pl["text"][:LEGACY_SNIPPET_CHARS], "filename": pl["filename"], "page": pl["page"]}
+            for pl, _s in fused]
+
+def whole_contexts(fused):
+    return [{"text": pl["text"], "filename": pl["filename"], "page": pl["page"]} for pl, _s in fused]
+
+def _union(intervals) -> int:
+    total, cur_s, cur_e = 0, None, None
+    for s, e in sorted(intervals):
+        if cur_e is None or s > cur_e:
+            if cur_e is not None:
+                total += cur_e - cur_s
+            cur_s, cur_e = s, e
+        else:
+            cur_e = max(cur_e, e)
+    return total + ((cur_e - cur_s) if cur_e is not None else 0)
+
+def coverage(fused, contexts, mode: str) -> float:
+    retrieved = _union((pl["char_start"], pl["char_end"]) for pl, _s in fused)
+    if mode == "cut":
+        sent = _union((pl["char_start"], min(pl["char_end"], pl["char_start"] + LEGACY_SNIPPET_CHARS))
+                      for pl, _s in fused)
+    else:  # packed text has no duplicates (besides dropped boilerplate), so its length is its coverage
+        sent = sum(len(c["text"]) for c in contexts)
+    return min(1.0, sent / retrieved)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--words-per-page", type=int, default=450)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--top-k", type=int, default=4)  # AskReq default
+    ap.add_argument("--budget", type=int, default=context_packer.CONTEXT_TOKEN_BUDGET)
+    ap.add_argument("--gemini", action="store_true", help="count tokens with the Gemini API")
+    args = ap.parse_args()
+
+    count = context_packer.estimate_tokens
+    if args.gemini:
+        import os
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+        count = lambda prompt: model.count_tokens(prompt).total_tokens
+
+    chunks = document_payloads(synthetic_document(args.pages, args.words_per_page), "report.pdf")
+    rng = random.Random(1)
+    question = "What were the main findings of the report?"
+    tokens = {"cut": [], "whole": [], "packed": []}
+    cover = {"cut": [], "packed": []}
+    for _ in range(args.queries):
+        fused = simulated_retrieval(chunks, args.top_k, rng)
+        packs = {
+            "cut": cut_contexts(fused),
+            "whole": whole_contexts(fused),
+            "packed": context_packer.pack_contexts(fused, budget=args.budget),
+        }
+        for mode, contexts in packs.items():
+            tokens[mode].append(count(build_doc_qa_prompt([], question, contexts)))
+        cover["cut"].append(coverage(fused, packs["cut"], "cut"))
+        cover["packed"].append(coverage(fused, packs["packed"], "packed"))
+
+    print(f"chunks={len(chunks)} queries={args.queries} top_k={args.top_k} budget={args.budget} "
+          f"tokens={'gemini' if args.gemini else 'estimated'}")
+    print(f"{'prompt':>8} {'mean tok':>9} {'p95 tok':>8} {'coverage':>9}")
+    for mode, vals in tokens.items():
+        p95 = statistics.quantiles(vals, n=20)[-1] if len(vals) > 1 else vals[0]
+        cov = f"{statistics.fmean(cover[mode]):.1%}" if mode in cover else "100.0%"
+        print(f"{mode:>8} {statistics.fmean(vals):>9.0f} {p95:>8.0f} {cov:>9}")
+
+if __name__ == "__main__":
+    main()
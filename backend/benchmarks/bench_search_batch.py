@@ -0,0 +1,117 @@
+"""
+POST /search/batch vs the same queries sent one by one to GET /search.
+
+Run from backend/:
+    python -m benchmarks.bench_search_batch
+    python -m benchmarks.bench_search_batch --chunks 20000 --queries 500 --batch-size 250
+    python -m benchmarks.bench_search_batch --engine qdrant --qdrant-url http://localhost:6333
+
+Same offline setup as bench_service (fake Gemini backends, in-process Qdrant
+unless --qdrant-url, synthetic namespace of --chunks chunks). Each query
+embedding pays --embed-latency-ms per embed call, standing in for the Gemini
+round trip that dominates a real single search. All caches are cleared before
+each mode, so both do the full work. Reports queries/s of each mode, the
+speedup, how many queries got the same results from both (all of them: BM25
+ties are broken by doc index on both paths, and both fill the same result
+cache), and the time spent per stage (summed Server-Timing) in each mode.
+Exits with status 1 when any query differs.
+
+In-process Qdrant evaluates the namespace filter point by point in Python
+(tens of ms per search at a few thousand chunks), which no batching removes,
+so locally the dense_search stage bounds the end-to-end speedup; the other
+stages show what batching saves. Use --qdrant-url for end-to-end figures.
+"""
+
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.bench_service import (
+    NAMESPACE, make_questions, make_vocab, offline_env, parse_server_timing, write_corpus,
+)
+
+def same_results(a: dict, b: dict) -> bool:
+    def key(resp):
+        return [(r["filename"], r["snippet"], round(r["score"], 3)) for r in resp["results"]]
+    return key(a) == key(b)
+
+async def run(app, queries, k: int, engine: str, batch_size: int):
+    import httpx
+    from app.state import caches
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=600) as http:
+        stages = {"sequential": Counter(), "batch": Counter()}
+        caches.clear_all()
+        t0 = time.perf_counter()
+        single = []
+        for q in queries:
+            resp = await http.get("/search/", params={"namespace": NAMESPACE, "q": q, "k": k, "engine": engine})
+            resp.raise_for_status()
+            single.append(resp.json())
+            stages["sequential"].update(parse_server_timing(resp.headers.get("server-timing", "")))
+        sequential_s = time.perf_counter() - t0
+
+        caches.clear_all()
+        t0 = time.perf_counter()
+        batched = []
+        for i in range(0, len(queries), batch_size):
+            resp = await http.post("/search/batch", json={
+                "namespace": NAMESPACE, "queries": queries[i:i + batch_size], "k": k, "engine": engine,
+            })
+            resp.raise_for_status()
+            batched.extend(resp.json()["results"])
+            stages["batch"].update(parse_server_timing(resp.headers.get("server-timing", "")))
+        batch_s = time.perf_counter() - t0
+    return sequential_s, batch_s, sum(same_results(a, b) for a, b in zip(single, batched)), stages
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chunks", type=int, default=5_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch-size", type=int, default=100, help="queries per POST /search/batch")
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--engine", choices=["local", "qdrant"], default="local")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--embed-latency-ms", type=float, default=100)
+    ap.add_argument("--qdrant-url", default=":memory:")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_search_batch_")
+    offline_env(workdir, args.dim, 0, args.embed_latency_ms, args.qdrant_url)
+    try:
+        from app.main import app
+        from app.db.qdrant_client import ensure_collection, get_client, COLLECTION_NAME
+        from app.services.indexer import index_namespace
+        from app.services.paths import uploads_dir
+
+        vocab = make_vocab(20_000)
+        write_corpus(uploads_dir(NAMESPACE), vocab, args.chunks, 50)
+        ensure_collection()
+        index_namespace(NAMESPACE)
+        queries = make_questions(vocab, args.queries)
+        sequential_s, batch_s, same, stages = asyncio.run(run(app, queries, args.k, args.engine, args.batch_size))
+        if args.qdrant_url != ":memory:":
+            get_client().delete_collection(COLLECTION_NAME)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    n = len(queries)
+    print(f"{n} queries, {args.chunks} chunks, engine={args.engine}, embed latency {args.embed_latency_ms:.0f} ms")
+    print(f"sequential GET /search : {sequential_s:7.2f} s  {n / sequential_s:8.1f} queries/s")
+    print(f"POST /search/batch     : {batch_s:7.2f} s  {n / batch_s:8.1f} queries/s  (batches of {args.batch_size})")
+    print(f"speedup                : {sequential_s / batch_s:7.1f}x")
+    print(f"identical results      : {same}/{n}")
+    print(f"\n{'stage (total ms)':<16} {'sequential':>11} {'batch':>9} {'speedup':>8}")
+    for stage, seq_ms in stages["sequential"].most_common():
+        batch_ms = stages["batch"].get(stage, 0.0)
+        speedup = f"{seq_ms / batch_ms:7.1f}x" if batch_ms else f"{'-':>8}"
+        print(f"{stage:<16} {seq_ms:>11.0f} {batch_ms:>9.0f} {speedup}")
+    if same != n:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
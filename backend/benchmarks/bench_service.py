@@ -0,0 +1,282 @@
+"""
+Offline service benchmark: ingestion throughput and /search, /ask latency
+under concurrent load, with no network and no API keys.
+
+Run from backend/:
+    python -m benchmarks.bench_service --chunks 10000
+    python -m benchmarks.bench_service --chunks 100000 --concurrency 32 --output bench.json
+    python -m benchmarks.bench_service --chunks 10000 --baseline bench.json --tolerance 0.2
+
+Gemini is replaced by the fake backends (EMBED_BACKEND=fake: deterministic
+hashed bag-of-words vectors; GENERATION_BACKEND=fake: a canned answer after
+--gen-latency-ms), and Qdrant runs in-process (QDRANT_URL=":memory:") unless
+--qdrant-url points at a server; use one for the largest corpora, local mode
+holds every vector in this process. Uploads, indexes and caches go to a
+temporary directory.
+
+A synthetic namespace of about --chunks chunks (Zipf-distributed made-up
+words, 600-word chunks as the chunker cuts them) is written as .txt files and
+indexed with index_namespace, timed end to end. Then --requests searches and
+--requests asks (distinct DOC_QA questions) are sent through the ASGI app with
+--concurrency in flight; latencies are client-side, the per-stage breakdown
+comes from Server-Timing.
+
+--output writes the results as JSON. With --baseline (a previous --output
+file) every metric is compared: latency percentiles regress when they grow by
+more than --tolerance, throughputs when they drop by more; the exit status is
+1 on any regression, so the run can gate CI.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+NAMESPACE = "bench"
+STEP_WORDS = 600 - 80  # chunker window minus overlap: new words per chunk
+
+# (section, metric, higher is better)
+COMPARED = [
+    ("ingest", "chunks_per_second", True),
+    *[(ep, m, False) for ep in ("search", "ask") for m in ("p50_ms", "p95_ms", "p99_ms")],
+    ("search", "rps", True),
+    ("ask", "rps", True),
+]
+
+def offline_env(workdir: str, dim: int, gen_latency_ms: float, embed_latency_ms: float, qdrant_url: str):
+    """
+    Fake Gemini backends, Qdrant per qdrant_url, all state under workdir.
+    Call before importing app: it reads its settings at import time.
+    """
+    os.environ.update({
+        "EMBED_BACKEND": "fake",
+        "GENERATION_BACKEND": "fake",
+        "FAKE_GENERATION_LATENCY_MS": str(gen_latency_ms),
+        "FAKE_EMBED_LATENCY_MS": str(embed_latency_ms),
+        "EMBED_DIM": str(dim),
+        "QDRANT_URL": qdrant_url,
+        "COLLECTION_NAME": f"bench_{os.getpid()}",
+        "DATA_DIR": os.path.join(workdir, "data"),
+        "UPLOADS_DIR": os.path.join(workdir, "uploads"),
+    })
+
+def make_vocab(size: int, seed: int = 0) -> List[str]:
+    """
+    Made-up lowercase words. Ones the intent router would take for small talk
+    ("hi", "yo", "file", ...) are left out, so every question is DOC_QA.
+    """
+    from app.routes.intent import detect_intent
+
+    rng = np.random.default_rng(seed)
+    syllables = [c + v for c in "bcdfgklmnprstvz" for v in "aeiou"]
+    vocab, seen = [], set()
+    while len(vocab) < size:
+        word = "".join(rng.choice(syllables, size=rng.integers(2, 5)))
+        if word not in seen and detect_intent(word) == "DOC_QA":
+            seen.add(word)
+            vocab.append(word)
+    return vocab
+
+def write_corpus(folder: str, vocab: List[str], chunks: int, chunks_per_file: int, seed: int = 0) -> int:
+    """
+    .txt files adding up to about `chunks` chunks; returns the number of files.
+    """
+    rng = np.random.default_rng(seed)
+    p = 1.0 / np.arange(1, len(vocab) + 1)
+    p /= p.sum()
+    words = np.array(vocab)
+    os.makedirs(folder, exist_ok=True)
+    n_files = max(1, -(-chunks // chunks_per_file))
+    for i in range(n_files):
+        n_chunks = min(chunks_per_file, chunks - i * chunks_per_file)
+        ids = rng.choice(len(vocab), size=STEP_WORDS * n_chunks, p=p)
+        with open(os.path.join(folder, f"doc_{i:06d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(words[ids]))
+    return n_files
+
+def make_questions(vocab: List[str], n: int, seed: int = 1) -> List[str]:
+    """
+    Distinct questions over mid-frequency words (no cache hits between them).
+    """
+    from app.routes.intent import detect_intent
+
+    rng = np.random.default_rng(seed)
+    lo, hi = min(50, len(vocab) // 4), min(len(vocab), 5000)
+    templates = ["Explain {} and {}", "What is said about {} {}?", "Summarize {} near {}", "Compare {} with {}"]
+    out, seen = [], set()
+    while len(out) < n:
+        a, b = rng.integers(lo, hi, size=2)
+        q = templates[len(out) % len(templates)].format(vocab[a], vocab[b])
+        if q not in seen and detect_intent(q) == "DOC_QA":
+            seen.add(q)
+            out.append(q)
+    return out
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    out = {}
+    for part in header.split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        if dur:
+            out[name] = float(dur)
+    return out
+
+def summarize(latencies: List[float], stages: List[Dict[str, float]], errors: int, wall: float) -> dict:
+    ms = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    names = sorted({s for st in stages for s in st})
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "stages_p50_ms": {
+            s: round(float(np.percentile([st[s] for st in stages if s in st], 50)), 2) for s in names
+        },
+    }
+
+async def run_load(app, method: str, path: str, payloads: List[dict], concurrency: int) -> dict:
+    import httpx
+
+    latencies: List[float] = []
+    stages: List[Dict[str, float]] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for p in payloads:
+        queue.put_nowait(p)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=300) as http:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                payload = queue.get_nowait()
+                t0 = time.perf_counter()
+                if method == "GET":
+                    resp = await http.get(path, params=payload)
+                else:
+                    resp = await http.post(path, json=payload)
+                elapsed = time.perf_counter() - t0
+                if resp.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append(elapsed)
+                stages.append(parse_server_timing(resp.headers.get("server-timing", "")))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return summarize(latencies, stages, errors, wall)
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    Prints current vs baseline per metric; True when nothing regressed.
+    """
+    ok = True
+    print(f"\n{'metric':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for section, metric, higher_better in COMPARED:
+        old = baseline.get(section, {}).get(metric)
+        new = results.get(section, {}).get(metric)
+        if not old or new is None:
+            continue
+        change = new / old - 1
+        bad = change < -tolerance if higher_better else change > tolerance
+        ok &= not bad
+        flag = "  REGRESSION" if bad else ""
+        print(f"{section + '.' + metric:<24} {old:>10.2f} {new:>10.2f} {change:>+7.1%}{flag}")
+    return ok
+
+def print_results(results: dict):
+    ing = results["ingest"]
+    print(f"ingest: {ing['chunks']} chunks in {ing['seconds']:.1f}s = {ing['chunks_per_second']:.0f} chunks/s")
+    for ep in ("search", "ask"):
+        r = results[ep]
+        stages = " ".join(f"{s}={v}" for s, v in r["stages_p50_ms"].items())
+        print(
+            f"{ep:>6}: p50 {r['p50_ms']:.1f} ms  p95 {r['p95_ms']:.1f} ms  p99 {r['p99_ms']:.1f} ms  "
+            f"{r['rps']:.1f} req/s  errors {r['errors']}"
+        )
+        print(f"        stage p50 (ms): {stages}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chunks", type=int, default=10_000, help="corpus size, 1k to 1M")
+    ap.add_argument("--chunks-per-file", type=int, default=50)
+    ap.add_argument("--vocab", type=int, default=20_000)
+    ap.add_argument("--requests", type=int, default=200, help="per endpoint")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--dim", type=int, default=768, help="EMBED_DIM")
+    ap.add_argument("--gen-latency-ms", type=float, default=800)
+    ap.add_argument("--embed-latency-ms", type=float, default=0)
+    ap.add_argument("--qdrant-url", default=":memory:")
+    ap.add_argument("--output", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before a regression")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_service_")
+    offline_env(workdir, args.dim, args.gen_latency_ms, args.embed_latency_ms, args.qdrant_url)
+    try:
+        from app.main import app
+        from app.db.qdrant_client import ensure_collection, get_client, COLLECTION_NAME
+        from app.services.indexer import index_namespace
+        from app.services.paths import uploads_dir
+
+        vocab = make_vocab(args.vocab)
+        n_files = write_corpus(uploads_dir(NAMESPACE), vocab, args.chunks, args.chunks_per_file)
+        ensure_collection()
+
+        t0 = time.perf_counter()
+        summary = index_namespace(NAMESPACE)
+        seconds = time.perf_counter() - t0
+        chunks = summary["points_upserted"]
+
+        questions = make_questions(vocab, 2 * args.requests)
+        searches = [{"namespace": NAMESPACE, "q": q, "k": 8} for q in questions[:args.requests]]
+        asks = [
+            {"namespace": NAMESPACE, "question": q, "session_id": f"s{i % args.concurrency}"}
+            for i, q in enumerate(questions[args.requests:])
+        ]
+
+        async def load():
+            # warm-up: BM25 index load, first Qdrant searches
+            await run_load(app, "GET", "/search/", searches[:4], 1)
+            return (
+                await run_load(app, "GET", "/search/", searches, args.concurrency),
+                await run_load(app, "POST", "/ask/", asks, args.concurrency),
+            )
+        search, ask = asyncio.run(load())
+
+        results = {
+            "config": {**vars(args), "files": n_files, "python": sys.version.split()[0]},
+            "ingest": {
+                "chunks": chunks,
+                "seconds": round(seconds, 3),
+                "chunks_per_second": round(chunks / seconds, 1) if seconds else 0.0,
+            },
+            "search": search,
+            "ask": ask,
+        }
+        if args.qdrant_url != ":memory:":
+            get_client().delete_collection(COLLECTION_NAME)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Quantization / dimensionality evaluation: recall@k and latency of compact
+vector settings against exact full-precision search on a fixed corpus.
+
+Run from backend/ against a Qdrant server (quantization needs the real engine;
+local :memory: mode always searches full vectors, so there only the
+dimensionality columns mean anything):
+    QDRANT_URL=http://localhost:6333 python -m benchmarks.eval_quantization
+    python -m benchmarks.eval_quantization --size 50000 --dims 768 256 --oversampling 2 3
+    python -m benchmarks.eval_quantization --namespace acme   # real vectors from COLLECTION_NAME
+
+Corpus: by default a seeded synthetic one (clustered unit vectors whose
+variance decays along the dimensions, like Matryoshka-trained embeddings, so
+truncation behaves roughly as it does for text-embedding-004). With
+--namespace the stored vectors of that namespace are used instead.
+Queries are noisy copies of random corpus vectors; the ground truth is exact
+cosine top-k over the full-dimensional vectors (numpy), so truncation and
+quantization losses both show up in recall. Each setting gets its own
+temporary collection, dropped afterwards.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from app.db.qdrant_client import quantization_config, search_params
+
+def synthetic_corpus(size: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim) / 32.0)  # leading dims carry most signal
+    centers = rng.standard_normal((clusters, dim)) * scale
+    vecs = centers[rng.integers(0, clusters, size)] + 0.6 * rng.standard_normal((size, dim)) * scale
+    return _unit(vecs.astype(np.float32))
+
+def namespace_corpus(namespace: str) -> np.ndarray:
+    from app.db.qdrant_client import get_client, COLLECTION_NAME
+    flt = rest.Filter(must=[rest.FieldCondition(key="namespace", match=rest.MatchValue(value=namespace))])
+    vecs, offset = [], None
+    while True:
+        points, offset = get_client().scroll(
+            collection_name=COLLECTION_NAME, scroll_filter=flt, limit=512,
+            offset=offset, with_payload=False, with_vectors=[""],
+        )
+        vecs.extend(p.vector[""] if isinstance(p.vector, dict) else p.vector for p in points)
+        if offset is None:
+            break
+    if not vecs:
+        raise SystemExit(f"No points in namespace {namespace!r}")
+    return _unit(np.asarray(vecs, dtype=np.float32))
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+def make_queries(corpus: np.ndarray, n: int, noise: float = 0.5, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    base = corpus[rng.integers(0, len(corpus), n)]
+    # perturbation of norm ~noise around a unit vector
+    return _unit(base + noise * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(base.shape[1]))
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    out = []
+    for i in range(0, len(queries), 256):
+        sims = queries[i:i + 256] @ corpus.T
+        top = np.argpartition(-sims, k, axis=1)[:, :k]
+        out.append(top)
+    return np.vstack(out)
+
+def wait_indexed(qc: QdrantClient, name: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = qc.get_collection(name)
+        if info.status == rest.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    print(f"  warning: {name} still optimizing after {timeout:.0f}s")
+
+def build_collection(qc: QdrantClient, name: str, vecs: np.ndarray, mode: str):
+    if qc.collection_exists(name):
+        qc.delete_collection(name)
+    qc.create_collection(
+        name,
+        vectors_config=rest.VectorParams(size=vecs.shape[1], distance=rest.Distance.COSINE),
+        quantization_config=quantization_config(mode),
+        # index (and quantize) even small corpora instead of brute-forcing them
+        optimizers_config=rest.OptimizersConfigDiff(indexing_threshold=1000),
+    )
+    for i in range(0, len(vecs), 1024):
+        part = vecs[i:i + 1024]
+        qc.upsert(name, points=rest.Batch(ids=list(range(i, i + len(part))), vectors=part.tolist()), wait=True)
+    wait_indexed(qc, name)
+
+def run_queries(qc: QdrantClient, name: str, queries: np.ndarray, k: int, params):
+    found, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        resp = qc.query_points(name, query=q.tolist(), limit=k, search_params=params)
+        lat.append(time.perf_counter() - t0)
+        found.append([p.id for p in resp.points])
+    return found, np.asarray(lat) * 1000
+
+def recall(found, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t.tolist())) / k for f, t in zip(found, truth)]))
+
+def bytes_per_vector(dim: int, mode: str) -> float:
+    # what stays in RAM for search (originals can live on disk when quantized)
+    return {"none": dim * 4, "scalar": dim, "binary": dim / 8}[mode]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=os.getenv("QDRANT_URL"), help="Qdrant server (default QDRANT_URL, else :memory:)")
+    ap.add_argument("--namespace", help="evaluate on the stored vectors of this namespace")
+    ap.add_argument("--size", type=int, default=20000, help="synthetic corpus size")
+    ap.add_argument("--full-dim", type=int, default=768)
+    ap.add_argument("--dims", type=int, nargs="+", default=[768, 256])
+    ap.add_argument("--modes", nargs="+", default=["none", "scalar", "binary"])
+    ap.add_argument("--oversampling", type=float, nargs="+", default=[2.0])
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("-k", type=int, default=10)
+    args = ap.parse_args()
+
+    corpus = namespace_corpus(args.namespace) if args.namespace else synthetic_corpus(args.size, args.full_dim)
+    queries = make_queries(corpus, args.queries)
+    truth = exact_top_k(corpus, queries, args.k)
+
+    if args.url:
+        qc = QdrantClient(url=args.url, api_key=os.getenv("QDRANT_API_KEY"), timeout=60)
+    else:
+        print("No QDRANT_URL: local :memory: mode ignores quantization, only truncation is measured.")
+        qc = QdrantClient(location=":memory:")
+
+    print(f"corpus={len(corpus)}x{corpus.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'dim':>5} {'mode':>7} {'rescore':>8} {'oversmp':>8} {'B/vec':>7} "
+          f"{'recall@k':>9} {'p50 ms':>7} {'p95 ms':>7}")
+    for dim in args.dims:
+        vecs = _unit(corpus[:, :dim])
+        q = _unit(queries[:, :dim])
+        for mode in args.modes:
+            name = f"eval_quant_{mode}_{dim}"
+            build_collection(qc, name, vecs, mode)
+            variants = [(False, None)] if mode == "none" else \
+                [(False, None)] + [(True, o) for o in args.oversampling]
+            for rescore, over in variants:
+                params = search_params(mode, rescore, over) if mode != "none" else None
+                qc.query_points(name, query=q[0].tolist(), limit=args.k, search_params=params)  # warm-up
+                found, lat = run_queries(qc, name, q, args.k, params)
+                print(f"{dim:>5} {mode:>7} {('yes' if rescore else 'no'):>8} "
+                      f"{(over or '-'):>8} {bytes_per_vector(dim, mode):>7g} "
+                      f"{recall(found, truth):>9.4f} {np.percentile(lat, 50):>7.2f} "
+                      f"{np.percentile(lat, 95):>7.2f}")
+            qc.delete_collection(name)
+
+if __name__ == "__main__":
+    main()
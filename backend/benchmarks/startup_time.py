@@ -0,0 +1,147 @@
+"""
+Cold-start benchmark: how long until a fresh worker can answer.
+
+Run from backend/:
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --ref HEAD~1          # compare with an older revision
+    QDRANT_URL=http://localhost:6333 python -m benchmarks.startup_time --runs 10
+
+For the working tree (and, with --ref, the backend/ of that git revision,
+exported to a temporary directory) it measures, as medians over --runs fresh
+processes:
+  import    time to `import app.main`
+  health    process start to the first 200 from GET /health under uvicorn
+  ready     process start to the first 200 from GET /ready (Qdrant collection
+            checked); "-" for revisions without the endpoint, or when Qdrant
+            isn't reachable within --timeout
+
+Qdrant is QDRANT_URL from the environment, else the in-process ":memory:"
+mode (not available in older revisions, which then need a server). A dummy
+Gemini key is set when none is: no Gemini call is made.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+def export_revision(ref: str, dest: str) -> str:
+    """
+    backend/ as of `ref`, extracted under dest; returns its path.
+    """
+    archive = os.path.join(dest, "backend.tar")
+    repo = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], cwd=BACKEND, check=True, capture_output=True, text=True
+    ).stdout.strip()
+    prefix = os.path.relpath(BACKEND, repo)
+    subprocess.run(["git", "archive", "-o", archive, ref, prefix], cwd=repo, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(dest)
+    return os.path.join(dest, prefix)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def status_of(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None  # not listening yet
+
+def time_import(tree: str, env: Dict[str, str]) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=tree, env=env, check=True, capture_output=True, text=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+def time_server(tree: str, env: Dict[str, str], timeout: float):
+    """
+    (seconds to /health 200, seconds to /ready 200) for one uvicorn process; None when not reached.
+    """
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    health = ready = None
+    try:
+        deadline = t0 + timeout
+        while time.perf_counter() < deadline and proc.poll() is None:
+            if health is None and status_of(base + "/health") == 200:
+                health = time.perf_counter() - t0
+            if health is not None:
+                code = status_of(base + "/ready")
+                if code == 200:
+                    ready = time.perf_counter() - t0
+                    break
+                if code == 404:
+                    break  # revision without /ready
+            time.sleep(0.005)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return health, ready
+
+def measure(tree: str, runs: int, timeout: float) -> Dict[str, Optional[float]]:
+    with tempfile.TemporaryDirectory() as data:
+        env = {
+            **os.environ,
+            "DATA_DIR": os.path.join(data, "data"),
+            "UPLOADS_DIR": os.path.join(data, "uploads"),
+        }
+        env.setdefault("QDRANT_URL", ":memory:")
+        if not (env.get("GEMINI_API_KEY") or env.get("GOOGLE_API_KEY")):
+            env["GEMINI_API_KEY"] = "startup-benchmark"
+        imports, healths, readies = [], [], []
+        for _ in range(runs):
+            imports.append(time_import(tree, env))
+            health, ready = time_server(tree, env, timeout)
+            if health is not None:
+                healths.append(health)
+            if ready is not None:
+                readies.append(ready)
+
+    def median(xs):
+        return statistics.median(xs) if xs else None
+    return {"import": median(imports), "health": median(healths), "ready": median(readies)}
+
+def fmt(x: Optional[float]) -> str:
+    return f"{x * 1000:>9.0f}" if x is not None else f"{'-':>9}"
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--ref", help="also measure backend/ at this git revision")
+    ap.add_argument("--timeout", type=float, default=60.0, help="seconds to wait per server start")
+    args = ap.parse_args()
+
+    rows = [("working tree", measure(BACKEND, args.runs, args.timeout))]
+    if args.ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows.append((args.ref, measure(export_revision(args.ref, tmp), args.runs, args.timeout)))
+
+    print(f"{'tree':<16} {'import ms':>9} {'health ms':>9} {'ready ms':>9}")
+    for name, r in rows:
+        print(f"{name:<16} {fmt(r['import'])} {fmt(r['health'])} {fmt(r['ready'])}")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@
 // Change BASE if your backend runs elsewhere.
 export const BASE = "https://gemini-rag-docchat.onrender.com";
 
+// One chat session per browser tab: the backend keeps history per session_id.
+export const SESSION_ID = sessionStorage.getItem("session_id") || (() => {
+  const id = crypto.randomUUID();
+  sessionStorage.setItem("session_id", id);
+  return id;
+})();
+
 export async function uploadFiles({ namespace, files }) {
   const form = new FormData();
   form.append("namespace", namespace || "default");
@@ -11,20 +18,77 @@ export async function uploadFiles({ namespace, files }) {
   return res.json();
 }
 
-export async function indexNamespace(namespace) {
+// POST /index queues a background job; poll it until it finishes and
+// resolve with the index summary. onProgress(job) gets every status update.
+export async function indexNamespace(namespace, { onProgress, intervalMs = 1500 } = {}) {
   const url = new URL(`${BASE}/index/`);
   url.searchParams.set("namespace", namespace || "default");
   const res = await fetch(url, { method: "POST" });
   if (!res.ok) throw new Error(`Index failed: ${res.status}`);
-  return res.json();
+  let job = await res.json();
+  while (job.status === "queued" || job.status === "running") {
+    onProgress?.(job);
+    await new Promise((r) => setTimeout(r, intervalMs));
+    const poll = await fetch(`${BASE}/index/jobs/${job.id}`);
+    if (!poll.ok) throw new Error(`Index status failed: ${poll.status}`);
+    job = await poll.json();
+  }
+  if (job.status !== "completed") throw new Error(`Index ${job.status}: ${job.error || ""}`);
+  return job.summary;
+}
+
+// "retrieve;dur=12.5, generate;dur=830.1" -> { retrieve: 12.5, generate: 830.1 } (ms)
+export function parseServerTiming(header) {
+  const timings = {};
+  for (const part of (header || "").split(",")) {
+    const [name, ...params] = part.trim().split(";");
+    const dur = params.map((p) => p.trim()).find((p) => p.startsWith("dur="));
+    if (name && dur) timings[name] = parseFloat(dur.slice(4));
+  }
+  return timings;
 }
 
-export async function ask({ namespace, question, top_k = 4, alpha = 0.6 }) {
+export async function ask({ namespace, question, top_k = 4, alpha = 0.6, use_cache = false }) {
   const res = await fetch(`${BASE}/ask/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ namespace: namespace || "default", question, top_k, alpha })
+    body: JSON.stringify({ namespace: namespace || "default", question, top_k, alpha, use_cache, session_id: SESSION_ID })
   });
   if (!res.ok) throw new Error(`Ask failed: ${res.status}`);
-  return res.json();
+  return { ...(await res.json()), timings: parseServerTiming(res.headers.get("Server-Timing")) };
+}
+
+// Streaming variant of ask(): POST /ask/stream answers with Server-Sent Events.
+// onCitations({mode, citations, cached}) fires once retrieval is done, onToken(text)
+// for every generated piece, onTimings(ms per stage) at the end; resolves with the
+// full answer when the stream ends.
+export async function askStream({ namespace, question, top_k = 4, alpha = 0.6, use_cache = false, onCitations, onToken, onTimings }) {
+  const res = await fetch(`${BASE}/ask/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ namespace: namespace || "default", question, top_k, alpha, use_cache, session_id: SESSION_ID })
+  });
+  if (!res.ok || !res.body) throw new Error(`Ask failed: ${res.status}`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let answer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      const event = (raw.match(/^event: (.*)$/m) || [])[1];
+      const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || "{}");
+      if (event === "citations") onCitations?.(data);
+      else if (event === "token") { answer += data.text; onToken?.(data.text); }
+      else if (event === "done") { answer = data.answer; onTimings?.(data.timings || {}); }
+      else if (event === "error") throw new Error(data.detail || "Stream failed");
+    }
+  }
+  return answer;
 }
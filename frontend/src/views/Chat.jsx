@@ -1,6 +1,6 @@
 import { useState } from "react";
 import Message from "../components/Message";
-import { ask } from "../api";
+import { askStream } from "../api";
 
 export default function Chat({ namespace }) {
   const [messages, setMessages] = useState([]);
@@ -14,19 +14,36 @@ export default function Chat({ namespace }) {
     setMessages((m) => [...m, { role: "user", text: question }]);
     setQ("");
 
+    // Add an empty assistant bubble and fill it in as tokens stream in
+    let citations = [];
+    let answer = "";
+    let timings = null;
+    const update = () => setMessages((m) => [
+      ...m.slice(0, -1),
+      { role: "assistant", text: formatAnswer({ answer, citations, timings }) }
+    ]);
+    setMessages((m) => [...m, { role: "assistant", text: "…" }]);
+
     try {
-      const res = await ask({ namespace, question, top_k: k, alpha });
-      const answer = formatAnswer(res);
-      setMessages((m) => [...m, { role: "assistant", text: answer }]);
+      answer = await askStream({
+        namespace, question, top_k: k, alpha,
+        onCitations: (res) => { citations = res.citations || []; update(); },
+        onToken: (t) => { answer += t; update(); },
+        onTimings: (t) => { timings = t; }
+      });
+      update();
     } catch (e) {
-      setMessages((m) => [...m, { role: "assistant", text: `Error: ${String(e.message || e)}` }]);
+      setMessages((m) => [...m.slice(0, -1), { role: "assistant", text: `Error: ${String(e.message || e)}` }]);
     }
   }
 
   function formatAnswer(res) {
     // Show the model's answer + list the citations
     const ci = (res.citations || []).map(c => `- ${c.label}`).join("\n");
-    return `${res.answer}\n\nSources:\n${ci || "- (none)"}`
+    const text = `${res.answer}\n\nSources:\n${ci || "- (none)"}`;
+    // Per-stage server timings, e.g. "retrieve 85 ms · generate 912 ms"
+    const stages = Object.entries(res.timings || {}).map(([s, ms]) => `${s} ${Math.round(ms)} ms`);
+    return stages.length ? `${text}\n\n${stages.join(" · ")}` : text;
   }
 
   return (
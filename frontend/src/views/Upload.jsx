@@ -10,8 +10,16 @@ export default function Upload({ namespace, setNamespace, onIndexed }) {
     try {
       setLog("Uploading…");
       const res = await uploadFiles({ namespace, files });
-      setLog(`Uploaded ${res.count} files to ${res.namespace}. Now indexing…`);
-      const idx = await indexNamespace(namespace);
+      const dupes = res.files_skipped?.length ? ` (${res.files_skipped.length} duplicate skipped)` : "";
+      setLog(`Uploaded ${res.count} files to ${res.namespace}${dupes}. Now indexing…`);
+      const idx = await indexNamespace(namespace, {
+        onProgress: (job) => {
+          const p = job.progress;
+          if (!p) return setLog(`Uploaded ${res.count} files. Indexing (${job.status})…`);
+          const eta = job.eta_seconds != null ? `, ~${Math.ceil(job.eta_seconds)}s left` : "";
+          setLog(`Indexing: ${p.files_done}/${p.files_total} files, ${p.chunks_done} chunks${eta}…`);
+        }
+      });
       setLog(
         `Indexed: ${idx.points_upserted} points from ${idx.files_indexed} files.`
       );